@@ -1,8 +1,12 @@
 import psycopg2
 import os
+import sys
 import requests
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tokopedia"))
+from category_tree import CategoryTree
+
 load_dotenv()
 
 # =====================
@@ -19,6 +23,9 @@ conn = psycopg2.connect(
 conn.autocommit = True
 cursor = conn.cursor()
 
+# Nama L1/L2/L3 diambil dari tree di memori, bukan join categories 3x per batch
+category_tree = CategoryTree(lambda: conn)
+
 # =====================
 # OLLAMA CONFIG
 # =====================
@@ -97,13 +104,9 @@ def process_batch():
     select
       p.id as product_id,
       p.name as product_title,
-      c.name as category_level_3,
-      c2.name as category_level_2,
-      c3.name as category_level_1
+      p.category_id
     from products p 
-    inner join categories c on c.id = p.category_id
-    inner join categories c2 on c.parent_id = c2.id
-    inner join categories c3 on c2.parent_id = c3.id
+    where p.category_id is not null
     order by p.created_at asc
     limit %s;
   """, (BATCH_SIZE,))
@@ -115,7 +118,11 @@ def process_batch():
 
   print(f"Processing {len(rows)} rows...")
 
-  for product_id, title, l3, l2, l1 in rows:
+  for product_id, title, category_id in rows:
+    lineage = category_tree.ancestors(category_id)
+    if len(lineage) != 3:
+      continue
+    l1, l2, l3 = (c.name for c in lineage)
     print(f"title: {title}")
 
     cleaned = clean_title_with_phi3(title, l1, l2, l3)
@@ -0,0 +1,195 @@
+"""
+HTTP API pencarian produk (FastAPI)
+
+Jalankan (dari folder tokopedia/):
+  uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoint:
+  GET /search?q=...&top_k=&recall=&hybrid=&per_group=   semantic_search (router kategori + vektor)
+  GET /products?category_id=&q=&color=&harga_max=...    filter saja, tanpa vektor
+  GET /parse?q=...                                      hasil parser kueri (filter + semantic_query)
+  GET /health
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import decimal
+import datetime
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import Response
+from psycopg2 import OperationalError
+from psycopg2.extensions import QueryCanceledError
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+from db_pool import DB_POOL_MAX_CONN, get_pool, pooled_connection
+from category_tree import get_category_tree
+from query_parser import merge_filters, parse_query
+from semantic import filter_products, semantic_search
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+SEARCH_API_TIMEOUT_SECONDS = float(os.getenv("SEARCH_API_TIMEOUT_SECONDS", 15))
+SEARCH_API_MAX_TOP_K = int(os.getenv("SEARCH_API_MAX_TOP_K", 200))
+# Request yang boleh jalan bersamaan per worker; sisanya antre di event loop
+SEARCH_API_CONCURRENCY = int(os.getenv("SEARCH_API_CONCURRENCY", DB_POOL_MAX_CONN))
+
+_slots = asyncio.Semaphore(SEARCH_API_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  # Pool dan tree kategori disiapkan sebelum request pertama
+  await asyncio.to_thread(get_pool)
+  await asyncio.to_thread(get_category_tree().refresh)
+  yield
+  get_pool().closeall()
+
+
+app = FastAPI(title="Ecommerce Semantic Search", lifespan=lifespan)
+
+
+# ------------------------------------------------------------
+# HELPER
+# - psycopg2 dan klien OpenAI blocking: dijalankan lewat asyncio.to_thread,
+#   dibatasi semaphore seukuran pool supaya thread tidak menumpuk menunggu koneksi
+# - Slot semaphore dilepas saat thread benar-benar selesai (done-callback),
+#   bukan saat request menyerah: thread yang ditinggal timeout masih memegang
+#   koneksi pool, jadi request baru tetap antre di sini, bukan di pool.getconn
+# - Timeout per request -> 504; statement_timeout pool (DB_STATEMENT_TIMEOUT_MS)
+#   menghentikan query yang ditinggal
+# - Error DB/LLM dari fn -> 5xx lewat error_status (bukan 200 dengan hasil kosong)
+# ------------------------------------------------------------
+def _release_slot(task: asyncio.Future):
+  _slots.release()
+  if not task.cancelled():
+    # Error thread yang ditinggal timeout tetap "diambil" supaya tidak jadi warning asyncio
+    task.exception()
+
+
+async def run_blocking(fn, *args, **kwargs):
+  await _slots.acquire()
+  task = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+  task.add_done_callback(_release_slot)
+  try:
+    # shield: timeout hanya menghentikan penantian, task (dan slotnya) tetap hidup sampai thread selesai
+    return await asyncio.wait_for(asyncio.shield(task), SEARCH_API_TIMEOUT_SECONDS)
+  except Exception as e:
+    if not task.done():
+      raise HTTPException(status_code=504, detail=f"Pencarian melebihi {SEARCH_API_TIMEOUT_SECONDS:.0f} detik.")
+    logger.exception(f"{fn.__name__} gagal: {e}")
+    raise HTTPException(status_code=error_status(e), detail="Pencarian gagal, coba lagi nanti.") from e
+
+
+def error_status(error: Exception) -> int:
+  """Status HTTP untuk error dari fungsi blocking (DB/LLM), bukan hasil kosong 200."""
+  if isinstance(error, QueryCanceledError):
+    # statement_timeout pool (DB_STATEMENT_TIMEOUT_MS)
+    return 504
+  if isinstance(error, (TimeoutError, OperationalError)):
+    # Pool habis / koneksi DB putus
+    return 503
+  return 500
+
+
+def _default(value):
+  if isinstance(value, decimal.Decimal):
+    return int(value) if value == value.to_integral_value() else float(value)
+  if isinstance(value, (datetime.date, datetime.datetime)):
+    return value.isoformat()
+  if isinstance(value, uuid.UUID):
+    return str(value)
+  raise TypeError(f"Tipe tidak bisa di-JSON-kan: {type(value).__name__}")
+
+
+def json_response(meta: Dict, rows: List[Dict]) -> Response:
+  """
+  {...meta, "results": [...]} di-encode langsung dengan _default (Decimal,
+  tanggal), tanpa lewat jsonable_encoder FastAPI yang jauh lebih lambat.
+  Baris hasil sudah lengkap di memori (fetchall), jadi tidak perlu streaming.
+  """
+  return Response(json.dumps({**meta, "results": rows}, default=_default), media_type="application/json")
+
+
+# ------------------------------------------------------------
+# ENDPOINT
+# ------------------------------------------------------------
+@app.get("/health")
+async def health():
+  return {"status": "ok"}
+
+
+@app.get("/parse")
+async def parse(q: str = Query(..., min_length=1)):
+  return parse_query(q)
+
+
+@app.get("/search")
+async def search(
+  q: str = Query(..., min_length=1),
+  top_k: int = Query(50, ge=1),
+  recall: Optional[str] = Query(None, pattern="^(fast|balanced|accurate)$"),
+  hybrid: Optional[bool] = None,
+  per_group: Optional[int] = Query(None, ge=0)
+):
+  start = time.perf_counter()
+  rows = await run_blocking(semantic_search, q, min(top_k, SEARCH_API_MAX_TOP_K), recall, hybrid, per_group, raise_errors=True)
+  meta = {"query": q, "count": len(rows), "took_ms": round((time.perf_counter() - start) * 1000, 1)}
+  return json_response(meta, rows)
+
+
+@app.get("/products")
+async def products(
+  category_id: Optional[str] = None,
+  q: Optional[str] = None,
+  color: Optional[str] = None,
+  location: Optional[str] = None,
+  condition: Optional[str] = None,
+  storage: Optional[str] = None,
+  ram: Optional[str] = None,
+  harga_min: Optional[int] = Query(None, ge=0),
+  harga_max: Optional[int] = Query(None, ge=0),
+  limit: int = Query(50, ge=1),
+  offset: int = Query(0, ge=0)
+):
+  # Filter eksplisit menang atas filter yang dibaca dari teks q
+  explicit = {
+    "harga_min": harga_min,
+    "harga_max": harga_max,
+    "storage": storage,
+    "ram": ram,
+    "color": color,
+    "location": location,
+    "condition": condition,
+  }
+  explicit = {k: v for k, v in explicit.items() if v not in (None, "")}
+  filters = merge_filters(explicit, parse_query(q)["filters"] if q else {})
+  if not filters and not category_id:
+    raise HTTPException(status_code=400, detail="Minimal satu filter atau category_id.")
+
+  def run():
+    with pooled_connection() as conn:
+      with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        return filter_products(cur, category_id, filters, min(limit, SEARCH_API_MAX_TOP_K), offset)
+
+  start = time.perf_counter()
+  rows = await run_blocking(run)
+  meta = {
+    "category_id": category_id,
+    "filters": filters,
+    "count": len(rows),
+    "took_ms": round((time.perf_counter() - start) * 1000, 1)
+  }
+  return json_response(meta, rows)
@@ -0,0 +1,77 @@
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+# Hasil resolve yang tidak ketemu: read-only, jadi aman dibagi antar halaman/memo
+EMPTY: Mapping = MappingProxyType({})
+
+
+# ------------------------------------------------------------
+# ApolloCache
+# - Bungkus dict window.__cache (normalized Apollo cache) satu halaman
+# - Index prefix ROOT_QUERY (nama field sebelum argumen "(...)"), dibangun
+#   sekali per halaman saat pertama dipakai
+# - resolve() ref {"id": ...} secara lazy + memo, dipakai semua extractor
+# ------------------------------------------------------------
+class ApolloCache:
+  def __init__(self, data: Dict):
+    self.data = data
+    self.root: Dict = data.get("ROOT_QUERY", {}) or {}
+    self._root_index: Optional[Dict[str, List[str]]] = None
+    self._prefix_memo: Dict[str, Optional[str]] = {}
+    self._resolved: Dict[str, Mapping] = {}
+
+  # ---------------- references ----------------
+  def resolve(self, ref: Any) -> Mapping:
+    """Resolve ref (`{"id": ...}` atau id string) ke object di cache; EMPTY (read-only) kalau tidak ada."""
+    if isinstance(ref, dict):
+      ref = ref.get("id")
+    if not ref:
+      return EMPTY
+
+    obj = self._resolved.get(ref)
+    if obj is None:
+      obj = self.data.get(ref)
+      if not isinstance(obj, dict):
+        obj = EMPTY
+      self._resolved[ref] = obj
+    return obj
+
+  def resolve_field(self, obj: Mapping, field: str) -> Mapping:
+    return self.resolve(obj.get(field))
+
+  def resolve_list(self, refs: Optional[List]) -> List[Mapping]:
+    if not refs:
+      return []
+    return [self.resolve(ref) for ref in refs]
+
+  # ---------------- ROOT_QUERY ----------------
+  def _build_root_index(self) -> Dict[str, List[str]]:
+    index: Dict[str, List[str]] = {}
+    for key in self.root:
+      name = key.split("(", 1)[0]
+      index.setdefault(name, []).append(key)
+    self._root_index = index
+    return index
+
+  def root_key(self, prefix: str) -> Optional[str]:
+    """Key ROOT_QUERY pertama yang diawali `prefix` (urutan sama dengan dict aslinya)."""
+    if prefix in self._prefix_memo:
+      return self._prefix_memo[prefix]
+
+    index = self._root_index if self._root_index is not None else self._build_root_index()
+    keys = index.get(prefix)
+    if keys:
+      key = keys[0]
+    else:
+      # Prefix bukan nama field utuh, jatuh ke scan (hasil tetap di-memo)
+      key = next((k for k in self.root if k.startswith(prefix)), None)
+    self._prefix_memo[prefix] = key
+    return key
+
+  def root_field(self, prefix: str) -> Mapping:
+    """Object hasil resolve dari field ROOT_QUERY dengan prefix tertentu."""
+    key = self.root_key(prefix)
+    if key is None:
+      return EMPTY
+    return self.resolve(self.root[key])
+
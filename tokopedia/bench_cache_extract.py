@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: regex lama vs CacheLocator untuk ekstraksi window.__cache
+
+Jalankan (dari folder tokopedia/):
+  python bench_cache_extract.py [path_html] [jumlah_iterasi]
+"""
+
+import re
+import sys
+import time
+from cache_extract import extract_cache_json, read_cache_json
+
+DEFAULT_HTML = "../tokopedia_product.html"
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def regex_extract(html: str):
+  # Path lama di TokopediaScraper.scrape / scrape_page
+  pattern = r'window.__cache\s*=\s*(\{.*?\})\s*;'
+  match = re.search(pattern, html, re.DOTALL)
+  if not match:
+    match = re.search(r'window.__cache\s*=\s*(\{.*\})\s*', html, re.DOTALL)
+  return match.group(1).strip() if match else None
+
+
+def stream_extract(html: str):
+  chunks = (html[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(html), STREAM_CHUNK_SIZE))
+  return read_cache_json(chunks)
+
+
+def bench(name, fn, html, iterations):
+  fn(html)
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn(html)
+  elapsed = (time.perf_counter() - start) / iterations
+  print(f"  {name:<28} {elapsed * 1000:8.3f} ms/halaman")
+  return elapsed
+
+
+def main():
+  path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HTML
+  iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  with open(path, encoding="utf-8") as f:
+    html = f.read()
+
+  # Variasi tanpa `;` setelah objek: regex lazy gagal dan jatuh ke pola greedy
+  no_semicolon = re.sub(r'(window\.__cache\s*=\s*\{.*?\})\s*;', r'\1', html, count=1, flags=re.DOTALL)
+
+  cases = [("dokumen asli", html), ("tanpa ';' (fallback greedy)", no_semicolon)]
+  for label, doc in cases:
+    expected = extract_cache_json(doc)
+    assert expected is not None, "window.__cache tidak ditemukan"
+    assert stream_extract(doc) == expected
+
+    print(f"\n=== {label} ({len(doc) / 1024:.0f} KB HTML, cache {len(expected) / 1024:.0f} KB) ===")
+    print(f"  regex sama dengan locator: {regex_extract(doc) == expected}")
+    base = bench("regex (lazy + greedy)", regex_extract, doc, iterations)
+    fast = bench("CacheLocator (utuh)", extract_cache_json, doc, iterations)
+    bench(f"CacheLocator (stream {STREAM_CHUNK_SIZE // 1024}KB)", stream_extract, doc, iterations)
+    print(f"  speedup utuh: {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+  main()
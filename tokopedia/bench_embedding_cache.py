@@ -0,0 +1,78 @@
+"""
+Benchmark + cek EmbeddingCache (SQLite lokal, tanpa Postgres/Ollama)
+
+Jalankan (dari folder tokopedia/):
+  python bench_embedding_cache.py [jumlah_teks]
+
+Yang dicek:
+  - embed() dari dua thread sekaligus (jalur asyncio.to_thread di crawler/API)
+  - counter ukuran tidak ikut bertambah untuk key yang sudah ada
+  - waktu embed() untuk batch yang semuanya hit
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from embedding_cache import EmbeddingCache
+
+DIM = 768
+
+
+def fake_fetch(texts):
+  # Vektor deterministik per teks, pengganti panggilan model embedding
+  return [[float(len(text) % 7)] * DIM for text in texts]
+
+
+def check_threads(cache, texts):
+  results, errors = {}, []
+
+  def run(name):
+    try:
+      results[name] = cache.embed("bench", texts, fake_fetch)
+    except Exception as e:
+      errors.append(f"{name}: {e!r}")
+
+  threads = [threading.Thread(target=run, args=(f"thread-{i}",)) for i in range(2)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert not errors, errors
+  expected = fake_fetch(texts)
+  assert all(results[name] == expected for name in results), "hasil embed antar thread berbeda"
+
+
+def check_size(cache, texts):
+  before = cache.stats()["bytes"]
+  cache.embed("bench", texts, fake_fetch)
+  cache.put_many("bench", dict(zip([f"ulang-{i}" for i in range(3)], fake_fetch(texts[:3]))))
+  cache.put_many("bench", dict(zip([f"ulang-{i}" for i in range(3)], fake_fetch(texts[:3]))))
+  actual = cache._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings;").fetchone()[0]
+  assert cache.stats()["bytes"] == actual, (cache.stats()["bytes"], actual)
+  assert actual == before + 3 * DIM * 4, (before, actual)
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  texts = [f"produk nomor {i} warna hitam ukuran {i % 40}" for i in range(count)]
+
+  with tempfile.TemporaryDirectory() as tmp:
+    cache = EmbeddingCache(path=os.path.join(tmp, "cache.sqlite3"))
+
+    check_threads(cache, texts)
+    print("  embed() dari 2 thread          ok")
+    check_size(cache, texts)
+    print("  counter ukuran = SUM(size)     ok")
+
+    start = time.perf_counter()
+    cache.embed("bench", texts, fake_fetch)
+    ms = (time.perf_counter() - start) * 1000
+    print(f"  {count} teks, semua hit        {ms:8.1f} ms")
+    print(f"  stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,146 @@
+"""
+Benchmark pencarian vektor dengan filter kategori (seperti semantic_search
+yang selalu memfilter L3): jalur ANN (VectorIndexManager.search) vs exact,
+plus berapa query yang benar-benar dilayani index ANN tanpa fallback exact
+
+Jalankan (dari folder tokopedia/):
+  python bench_filtered_search.py [jumlah_produk] [jumlah_kategori] [dimensi]
+
+Butuh DB dari .env dengan extension vector. Data dibuat di schema sementara
+bench_filtered_search (tabel products/product_chunks tiruan), lalu di-drop.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+from pgvector_adapter import copy_vectors, register_vector, to_vector
+from vector_index import VectorIndexManager
+
+load_dotenv()
+
+SCHEMA = "bench_filtered_search"
+CHUNK_TYPES = ["name", "detail"]
+TOP_K = 10
+
+SELECT_SQL = """
+  pc.product_id,
+  p.name AS product_name,
+  pc.distance
+"""
+WHERE_SQL = " WHERE 1=1 AND p.category_id = %s "
+
+
+def setup(conn, products, categories, dim):
+  rng = np.random.default_rng(42)
+  with conn.cursor() as cur:
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+    cur.execute(f"CREATE SCHEMA {SCHEMA};")
+    cur.execute(f"SET search_path = {SCHEMA}, public;")
+    cur.execute("""
+      CREATE TABLE products (
+        id          SERIAL PRIMARY KEY,
+        parent_id   INTEGER,
+        category_id TEXT,
+        name        TEXT
+      );
+    """)
+    cur.execute(f"""
+      CREATE TABLE product_chunks (
+        id         SERIAL PRIMARY KEY,
+        product_id INTEGER,
+        chunk_type TEXT,
+        chunk_text TEXT,
+        embedding  VECTOR({dim})
+      );
+    """)
+    cur.execute("""
+      INSERT INTO products (category_id, name)
+      SELECT 'c' || (i %% %s), 'produk ' || i FROM generate_series(1, %s) AS i;
+    """, (categories, products))
+
+    # Satu chunk per chunk_type per produk; vektor dari COPY binary lewat staging
+    cur.execute(f"CREATE TEMP TABLE stage_vectors (idx INTEGER, embedding VECTOR({dim}));")
+    rows = products * len(CHUNK_TYPES)
+    copy_vectors(cur, "stage_vectors", ["idx", "embedding"], enumerate(rng.standard_normal((rows, dim), dtype=np.float32)))
+    cur.execute("""
+      INSERT INTO product_chunks (product_id, chunk_type, chunk_text, embedding)
+      SELECT s.idx / %s + 1, (%s::text[])[s.idx %% %s + 1], 'chunk ' || s.idx, s.embedding
+      FROM stage_vectors s;
+    """, (len(CHUNK_TYPES), CHUNK_TYPES, len(CHUNK_TYPES)))
+  conn.commit()
+
+  manager = VectorIndexManager(conn, dimensions=dim)
+  start = time.perf_counter()
+  manager.ensure_indexes(CHUNK_TYPES)
+  manager.ensure_filter_index()
+  with conn.cursor() as cur:
+    cur.execute("ANALYZE products; ANALYZE product_chunks;")
+  conn.commit()
+  print(f"Data: {products} produk, {categories} kategori, {rows} chunk {dim}-d "
+        f"(index {time.perf_counter() - start:.1f}s, pgvector {'.'.join(map(str, manager.pgvector_version()))})\n")
+  return manager
+
+
+def exact_ids(cur, manager, vector, category_id):
+  cur.execute(manager.ann_query(SELECT_SQL, WHERE_SQL, None), [vector, category_id, TOP_K])
+  return [row[0] for row in cur.fetchall()]
+
+
+def main():
+  products = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  categories = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+  dim = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+
+  try:
+    conn = psycopg2.connect(
+      host=os.getenv("DB_HOST"),
+      port=os.getenv("DB_PORT"),
+      user=os.getenv("DB_USER"),
+      password=os.getenv("DB_PASSWORD"),
+      dbname=os.getenv("DB_NAME"),
+      connect_timeout=5
+    )
+  except Exception as e:
+    print(f"DB tidak tersedia: {e}")
+    return
+
+  register_vector(conn)
+  try:
+    manager = setup(conn, products, categories, dim)
+    rng = np.random.default_rng(7)
+    queries = [(to_vector(rng.standard_normal(dim)), f"c{i % categories}") for i in range(50)]
+
+    served, recall, ann_ms, exact_ms = 0, 0.0, 0.0, 0.0
+    with conn.cursor() as cur:
+      for vector, category_id in queries:
+        start = time.perf_counter()
+        rows = manager.search(cur, SELECT_SQL, WHERE_SQL, vector, [category_id], TOP_K)
+        ann_ms += (time.perf_counter() - start) * 1000
+        conn.commit()
+        served += manager.last_path == "ann"
+
+        start = time.perf_counter()
+        expected = exact_ids(cur, manager, vector, category_id)
+        exact_ms += (time.perf_counter() - start) * 1000
+        conn.commit()
+        recall += len({row[0] for row in rows} & set(expected)) / max(1, len(expected))
+
+    n = len(queries)
+    print(f"Query top-{TOP_K} dengan filter kategori ({n} query, ~{products // categories} produk/kategori):")
+    print(f"  dilayani ANN (tanpa fallback exact)  {served}/{n}")
+    print(f"  recall@{TOP_K} vs exact                 {recall / n:.3f}")
+    print(f"  search()                             {ann_ms / n:8.2f} ms/query")
+    print(f"  exact (produk terfilter)             {exact_ms / n:8.2f} ms/query")
+  finally:
+    conn.rollback()
+    with conn.cursor() as cur:
+      cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+  main()
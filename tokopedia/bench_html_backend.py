@@ -0,0 +1,82 @@
+"""
+Benchmark parse halaman kategori (https://www.tokopedia.com/p) untuk setiap
+HTML backend yang terpasang, plus cek hasilnya identik dengan bs4
+
+Jalankan (dari folder tokopedia/):
+  python bench_html_backend.py [path_html] [jumlah_iterasi]
+
+Tanpa path_html dipakai fixture sintetis dengan struktur kelas yang sama
+(ukuran mendekati halaman asli). Simpan halaman asli untuk angka yang representatif:
+  curl -s https://www.tokopedia.com/p > ../tokopedia_category.html
+"""
+
+import os
+import sys
+import time
+import html_backend
+from category_parser import parse_category_tree
+
+DEFAULT_HTML = "../tokopedia_category.html"
+
+
+def synthetic_category_page(masters=30, subs=18, children=12):
+  """Fixture: master block -> detail block -> sub block -> child link, plus markup pengisi."""
+  parts = ["<html><head><title>Kategori</title></head><body>"]
+  for m in range(masters):
+    parts.append('<div class="css-s7tck8"><div class="css-2wmm3i">')
+    parts.append(f'<a href="/p/master-{m}"><span>Master {m}</span></a></div>')
+    parts.append(f'<div class="css-16mwuw1"><div class="css-1s2l3k"><span class="css-38r5l3 e13h6i9f1">Master {m}</span></div>')
+    for s in range(subs):
+      parts.append(f'<div class="css-cdv2tj e13h6i9f2"><a href="/p/master-{m}/sub-{s}">Sub {m}.{s}</a>')
+      parts.append('<div class="css-79elbk e13h6i9f3">')
+      for c in range(children):
+        parts.append(
+          f'<div class="css-1f4mp12"><a href="/p/master-{m}/sub-{s}/child-{c}" data-testid="lnkCategory">'
+          f'<img alt="" src="https://images.tokopedia.net/img/{m}/{s}/{c}.png"/> Child {m}.{s}.{c} </a></div>'
+        )
+      parts.append("</div></div>")
+    parts.append("</div></div>")
+  parts.append("</body></html>")
+  return "".join(parts)
+
+
+def timed(fn, iterations):
+  fn()
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+  path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HTML
+  iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+  if os.path.exists(path):
+    with open(path, encoding="utf-8") as f:
+      html = f.read()
+    source = path
+  else:
+    html = synthetic_category_page()
+    source = "fixture sintetis"
+
+  expected = parse_category_tree(html, html_backend.load_backend("bs4"))
+  counts = {level: sum(node["level"] == level for node in expected) for level in (1, 2, 3)}
+  print(f"Halaman {len(html) / 1024:.0f} KB ({source}), L1/L2/L3 = {counts[1]}/{counts[2]}/{counts[3]}\n")
+  print(f"  {'backend':<12} {'parse ms':>10} {'sama?':>6}")
+
+  results = {}
+  for name in html_backend.available_backends():
+    backend = html_backend.load_backend(name)
+    same = parse_category_tree(html, backend) == expected
+    results[name] = timed(lambda: parse_category_tree(html, backend), iterations)
+    print(f"  {name:<12} {results[name]:10.2f} {'ya' if same else 'TIDAK':>6}")
+
+  if "bs4" in results:
+    print()
+    for name, ms in results.items():
+      print(f"  {name:<12} {results['bs4'] / ms:5.1f}x vs bs4")
+
+
+if __name__ == "__main__":
+  main()
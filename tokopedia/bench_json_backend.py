@@ -0,0 +1,57 @@
+"""
+Benchmark decode/encode JSON per halaman untuk setiap backend yang terpasang
+
+Jalankan (dari folder tokopedia/):
+  python bench_json_backend.py [path_html] [jumlah_iterasi]
+"""
+
+import sys
+import time
+import json_backend
+from cache_extract import extract_cache_json
+from product import TokopediaScraper
+
+DEFAULT_HTML = "../tokopedia_product.html"
+JSON_COLUMNS = ["variant_spec", "product_detail", "product_media", "product_reviews"]
+
+
+def timed(fn, iterations):
+  fn()
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+  path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HTML
+  iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  with open(path, encoding="utf-8") as f:
+    json_str = extract_cache_json(f.read())
+  products = TokopediaScraper().parse_cache_json(json_str)
+
+  def encode_rows():
+    for product in products:
+      for column in JSON_COLUMNS:
+        json_backend.dumps(product.get(column, {}))
+
+  print(f"Cache {len(json_str) / 1024:.0f} KB, {len(products)} baris x {len(JSON_COLUMNS)} kolom JSON\n")
+  print(f"  {'backend':<10} {'decode ms':>10} {'encode ms':>10}")
+
+  results = {}
+  for name in json_backend.available_backends():
+    json_backend.use_backend(name)
+    decode_ms = timed(lambda: json_backend.loads(json_str), iterations)
+    encode_ms = timed(encode_rows, iterations)
+    results[name] = decode_ms + encode_ms
+    print(f"  {name:<10} {decode_ms:10.3f} {encode_ms:10.3f}")
+
+  if "json" in results:
+    print()
+    for name, total in results.items():
+      print(f"  {name:<10} {results['json'] / total:5.1f}x vs stdlib")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,115 @@
+"""
+Benchmark kirim vektor ke pgvector: literal teks (cara lama) vs adapter
+numpy float32 (COPY binary untuk insert, literal float32 untuk query)
+
+Jalankan (dari folder tokopedia/):
+  python bench_pgvector.py [jumlah_vektor] [dimensi]
+
+Bagian encode selalu jalan; bagian insert/query butuh DB dari .env
+(pakai temp table, tidak menyentuh tabel asli).
+"""
+
+import os
+import sys
+import time
+import random
+import psycopg2
+from dotenv import load_dotenv
+from pgvector_adapter import copy_vectors, register_vector, to_vector, vector_binary, vector_text
+
+load_dotenv()
+
+
+def old_literal(embedding):
+  return f"[{','.join(map(str, embedding))}]"
+
+
+def timed(fn, repeat=1):
+  fn()
+  start = time.perf_counter()
+  for _ in range(repeat):
+    fn()
+  return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_encode(embeddings):
+  n = len(embeddings)
+  print(f"Encode {n} vektor ({len(embeddings[0])}-d):")
+  print(f"  {'cara':<22} {'ms/vektor':>10} {'byte/vektor':>12}")
+  for name, fn in [
+    ("teks (lama)", old_literal),
+    ("teks float32", vector_text),
+    ("binary float32", vector_binary),
+  ]:
+    ms = timed(lambda: [fn(e) for e in embeddings]) / n
+    size = sum(len(fn(e)) for e in embeddings[:50]) / min(n, 50)
+    print(f"  {name:<22} {ms:10.4f} {size:12.0f}")
+
+
+def bench_db(embeddings, dim):
+  try:
+    conn = psycopg2.connect(
+      host=os.getenv("DB_HOST"),
+      port=os.getenv("DB_PORT"),
+      user=os.getenv("DB_USER"),
+      password=os.getenv("DB_PASSWORD"),
+      dbname=os.getenv("DB_NAME"),
+      connect_timeout=5
+    )
+  except Exception as e:
+    print(f"\nDB tidak tersedia, lewati benchmark insert/query: {e}")
+    return
+
+  register_vector(conn)
+  n = len(embeddings)
+  vectors = [to_vector(e) for e in embeddings]
+  with conn.cursor() as cur:
+    cur.execute(f"CREATE TEMP TABLE bench_vectors (idx INT, embedding VECTOR({dim}));")
+
+    def insert_text():
+      cur.execute("TRUNCATE bench_vectors;")
+      for idx, e in enumerate(embeddings):
+        cur.execute("INSERT INTO bench_vectors VALUES (%s, %s::VECTOR);", (idx, old_literal(e)))
+
+    def insert_binary():
+      cur.execute("TRUNCATE bench_vectors;")
+      copy_vectors(cur, "bench_vectors", ["idx", "embedding"], enumerate(vectors))
+
+    print(f"\nInsert {n} vektor:")
+    for name, fn in [("teks per baris (lama)", insert_text), ("COPY binary", insert_binary)]:
+      ms = timed(fn)
+      print(f"  {name:<22} {ms:10.1f} ms  ({n / ms * 1000:,.0f} vektor/detik)")
+
+    queries = vectors[:min(n, 50)]
+    sql = "SELECT idx FROM bench_vectors ORDER BY embedding <=> %s::vector LIMIT 10;"
+
+    def query_text():
+      for q in queries:
+        cur.execute(sql, (old_literal(q.tolist()),))
+        cur.fetchall()
+
+    def query_adapter():
+      for q in queries:
+        cur.execute(sql, (q,))
+        cur.fetchall()
+
+    print(f"\nQuery top-10 ({len(queries)} query):")
+    for name, fn in [("teks (lama)", query_text), ("adapter float32", query_adapter)]:
+      ms = timed(fn) / len(queries)
+      print(f"  {name:<22} {ms:10.2f} ms/query")
+
+  conn.rollback()
+  conn.close()
+
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  dim = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+  embeddings = [[random.uniform(-0.1, 0.1) for _ in range(dim)] for _ in range(n)]
+
+  bench_encode(embeddings)
+  bench_db(embeddings, dim)
+
+
+if __name__ == "__main__":
+  main()
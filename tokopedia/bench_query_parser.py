@@ -0,0 +1,102 @@
+"""
+Benchmark parser kueri berbasis aturan (query_parser.parse_query) terhadap
+set kueri berlabel: akurasi per filter + latensi per kueri
+
+Jalankan (dari folder tokopedia/):
+  python bench_query_parser.py [jumlah_iterasi] [--llm]
+
+--llm ikut mengukur ai_understand (butuh OPENAI_API_KEY, satu panggilan per kueri)
+untuk perbandingan akurasi dan latensi.
+"""
+
+import sys
+import time
+from query_parser import FILTER_KEYS, parse_query
+
+# (kueri, filter yang diharapkan)
+LABELLED_QUERIES = [
+  ("hp samsung di bawah 5 juta", {"harga_max": 5_000_000}),
+  ("iphone 13 128gb bekas", {"storage": "128GB", "condition": "bekas"}),
+  ("redmi note 12 8/256 hitam", {"ram": "8GB", "storage": "256GB", "color": "hitam"}),
+  ("laptop asus ram 16gb ssd 512gb", {"ram": "16GB", "storage": "512GB"}),
+  ("sepatu lari pria warna putih jakarta", {"color": "putih", "location": "jakarta"}),
+  ("tas wanita merah muda murah", {"color": "merah muda"}),
+  ("kemeja batik di solo", {"location": "surakarta"}),
+  ("gitar solo", {}),
+  ("palu besi 1kg", {}),
+  ("hp oppo 1-2 juta", {"harga_min": 1_000_000, "harga_max": 2_000_000}),
+  ("monitor 4k 27 inch", {}),
+  ("headset gaming rp 150.000", {"harga_max": 150_000}),
+  ("sepeda lipat antara 2jt sampai 3,5jt", {"harga_min": 2_000_000, "harga_max": 3_500_000}),
+  ("powerbank 20000mah diatas 200rb", {"harga_min": 200_000}),
+  ("kamera mirrorless second kisaran 5 juta", {"condition": "bekas", "harga_min": 4_250_000, "harga_max": 5_750_000}),
+  ("sepatu new balance 530 original", {}),
+  ("xiaomi 13t 12/512 biru new", {"ram": "12GB", "storage": "512GB", "color": "biru", "condition": "baru"}),
+  ("meja kayu jati jepara", {"location": "jepara"}),
+  ("hijab voal 50k", {"harga_max": 50_000}),
+  ("ssd nvme 1tb", {"storage": "1TB"}),
+  ("flashdisk sandisk 64gb", {"storage": "64GB"}),
+  ("hp 2 jutaan ram 8", {"harga_min": 2_000_000, "harga_max": 2_999_999, "ram": "8GB"}),
+  ("nasi padang frozen", {}),
+  ("jam tangan pria gold di surabaya", {"color": "gold", "location": "surabaya"}),
+  ("kursi gaming maksimal 1,5 juta jogja", {"harga_max": 1_500_000, "location": "yogyakarta"}),
+  ("rtx 3060 bekas jaksel", {"condition": "bekas", "location": "jakarta selatan"}),
+  ("iphone 15 pro max 256gb natural titanium", {"storage": "256GB"}),
+  ("kulkas 2 pintu lebih dari 3 juta", {"harga_min": 3_000_000}),
+  ("baju anak ratusan ribu", {"harga_min": 100_000, "harga_max": 999_999}),
+  ("laptop bekas di cikarang", {"condition": "bekas"}),
+]
+
+
+def accuracy(predict, iterations=1):
+  """Return (exact_match, per_field_correct, latencies_ms)."""
+  exact = 0
+  per_field = {key: [0, 0] for key in FILTER_KEYS}
+  latencies = []
+  for query, expected in LABELLED_QUERIES:
+    predict(query)
+    start = time.perf_counter()
+    for _ in range(iterations):
+      got = predict(query)
+    latencies.append((time.perf_counter() - start) / iterations * 1000)
+
+    got = {k: v for k, v in got.items() if k in FILTER_KEYS and v not in (None, "", 0)}
+    if {k: str(v).lower() for k, v in got.items()} == {k: str(v).lower() for k, v in expected.items()}:
+      exact += 1
+    else:
+      print(f"  ✗ {query!r}\n      harap: {expected}\n      dapat: {got}")
+    for key in FILTER_KEYS:
+      if key in expected or key in got:
+        per_field[key][1] += 1
+        if str(expected.get(key, "")).lower() == str(got.get(key, "")).lower():
+          per_field[key][0] += 1
+  return exact, per_field, latencies
+
+
+def report(name, exact, per_field, latencies):
+  n = len(LABELLED_QUERIES)
+  latencies = sorted(latencies)
+  print(f"\n{name}:")
+  print(f"  exact match      {exact}/{n} ({exact / n:.0%})")
+  for key, (ok, total) in per_field.items():
+    if total:
+      print(f"  {key:<16} {ok}/{total}")
+  print(f"  latensi/kueri    rata2 {sum(latencies) / n:.3f} ms, p50 {latencies[n // 2]:.3f} ms, "
+        f"p95 {latencies[min(n - 1, int(n * 0.95))]:.3f} ms, maks {latencies[-1]:.3f} ms")
+
+
+def main():
+  args = [a for a in sys.argv[1:] if not a.startswith("--")]
+  iterations = int(args[0]) if args else 200
+
+  print(f"Parser aturan ({len(LABELLED_QUERIES)} kueri, {iterations} iterasi):")
+  report("Parser aturan", *accuracy(lambda q: parse_query(q)["filters"], iterations))
+
+  if "--llm" in sys.argv:
+    from semantic import ai_understand
+    print("\nLLM (ai_understand):")
+    report("LLM", *accuracy(lambda q: ai_understand(q, []).get("filters") or {}))
+
+
+if __name__ == "__main__":
+  main()
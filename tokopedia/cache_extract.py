@@ -0,0 +1,128 @@
+import re
+from typing import Iterable, Optional
+
+CACHE_MARKER = "window.__cache"
+
+# Satu match regex menelan semua teks non-brace, termasuk string JSON utuh
+# (escape-aware, possessive sehingga tidak ada backtracking). Python hanya
+# memproses karakter `{` / `}` sehingga loop sebanding jumlah objek, bukan
+# jumlah karakter/string. String yang terpotong di batas chunk membuat match
+# berhenti di tanda kutip pembukanya.
+_FILLER = re.compile(r'(?:[^{}"]++|"[^"\\]*+(?:\\.[^"\\]*+)*+")*+')
+_WHITESPACE = " \t\r\n"
+
+
+# ------------------------------------------------------------
+# CacheLocator
+# - Cari marker `window.__cache =` dengan substring search biasa
+# - Lalu brace-matching (sadar string & escape) sampai akhir objek
+# - Bisa di-feed per chunk (streaming) maupun satu dokumen utuh
+# ------------------------------------------------------------
+class CacheLocator:
+  def __init__(self, marker: str = CACHE_MARKER):
+    self.marker = marker
+    self.result: Optional[str] = None
+    self._buf = ""
+    self._found = False
+    self._pos = 0
+    self._depth = 0
+
+  @property
+  def done(self) -> bool:
+    return self.result is not None
+
+  def feed(self, chunk: str) -> Optional[str]:
+    """Tambahkan potongan HTML; return string JSON cache begitu objeknya lengkap."""
+    if self.result is not None:
+      return self.result
+    self._buf += chunk
+
+    if not self._found and not self._find_object_start():
+      return None
+
+    end = self._scan()
+    if end < 0:
+      return None
+
+    self.result = self._buf[:end]
+    self._buf = ""
+    return self.result
+
+  def _find_object_start(self) -> bool:
+    buf = self._buf
+    search_from = 0
+    while True:
+      idx = buf.find(self.marker, search_from)
+      if idx < 0:
+        # Simpan ekor buffer, siapa tahu marker terpotong di batas chunk
+        keep = len(self.marker) - 1
+        self._buf = buf[-keep:] if len(buf) > keep else buf
+        return False
+
+      pos = idx + len(self.marker)
+      while pos < len(buf) and buf[pos] in _WHITESPACE:
+        pos += 1
+      if pos < len(buf) and buf[pos] == "=":
+        pos += 1
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+          pos += 1
+
+        if pos >= len(buf):
+          # Belum cukup data untuk tahu karakter sesudah "="
+          self._buf = buf[idx:]
+          return False
+        if buf[pos] == "{":
+          self._buf = buf[pos:]
+          self._found = True
+          self._pos = 0
+          return True
+      elif pos >= len(buf):
+        self._buf = buf[idx:]
+        return False
+
+      # Bukan assignment objek (mis. `window.__cacheX`), cari marker berikutnya
+      search_from = idx + 1
+
+  def _scan(self) -> int:
+    buf = self._buf
+    buf_len = len(buf)
+    pos = self._pos
+    depth = self._depth
+    filler = _FILLER.match
+
+    while True:
+      pos = filler(buf, pos).end()
+      if pos >= buf_len:
+        break
+      ch = buf[pos]
+      if ch == '"':
+        # String belum lengkap, tunggu chunk berikutnya
+        break
+      pos += 1
+      if ch == "{":
+        depth += 1
+      else:
+        depth -= 1
+        if depth == 0:
+          return pos
+
+    self._pos = pos
+    self._depth = depth
+    return -1
+
+
+def extract_cache_json(html: str) -> Optional[str]:
+  """String JSON `window.__cache` dari satu dokumen HTML utuh, atau None."""
+  return CacheLocator().feed(html)
+
+
+def read_cache_json(chunks: Iterable[str]) -> Optional[str]:
+  """Sama seperti extract_cache_json tapi dari iterator chunk (mis. resp.iter_text()).
+
+  Berhenti membaca begitu objek cache lengkap; sisa iterator tidak disentuh.
+  """
+  locator = CacheLocator()
+  for chunk in chunks:
+    if locator.feed(chunk) is not None:
+      break
+  return locator.result
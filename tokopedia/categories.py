@@ -1,23 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
 import psycopg2
 import uuid
 import time
 import os
+import sys
 from dotenv import load_dotenv
+from http_client import fetch
+from category_parser import parse_category_tree
+from embedding import OPENAI_MAX_BATCH_SIZE, OPENAI_MAX_BATCH_TOKENS, EmbeddingBatcher, openai_embed_batch
+from pgvector_adapter import copy_vectors, register_vector, to_vector
 
 load_dotenv()
 
-from openai import OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-HEADERS = {
-  "User-Agent": (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
-  )
-}
-
 # ------------------------------------------------------------
 # POSTGRES CONNECTION
 # ------------------------------------------------------------
@@ -74,21 +67,10 @@ def ensure_table():
 
 # ------------------------------------------------------------
 # generate_embedding
-# - Calls Ollama embedding API
+# - Calls OpenAI embedding API (lewat embedding cache)
 # ------------------------------------------------------------
 def generate_embedding(text):
-  try:
-    response  = client.embeddings.create(
-      model="text-embedding-3-small",
-      input=text
-    )
-
-    embedding = response.data[0].embedding
-    return embedding
-
-  except Exception as e:
-    print("Embedding error:", e)
-    return None
+  return openai_embed_batch([text])[0]
 
 # ------------------------------------------------------------
 # get_or_create_category
@@ -131,7 +113,7 @@ def get_or_create_category(name, url, level, parent_id=None):
       UPDATE categories
       SET embedding = %s
       WHERE id = %s
-    """, (embedding, new_id))
+    """, (to_vector(embedding), new_id))
 
   if parent_id is None:
     cur.execute("""
@@ -149,81 +131,183 @@ def get_or_create_category(name, url, level, parent_id=None):
   row = cur.fetchone()
   return row[0] if row else None
 
+
+LEVEL_NAMES = {1: "master", 2: "sub", 3: "child"}
+
+
+def fetch_category_tree(url="https://www.tokopedia.com/p"):
+  r = fetch(url, timeout=20)
+  nodes = parse_category_tree(r.text)
+  print("Master blocks found:", sum(node["level"] == 1 for node in nodes))
+  return nodes
+
+
 # ------------------------------------------------------------
-# Improved scraping logic:
-# - More tolerant to nested divs
-# - Finds the first anchor that looks like the subcategory
-# - Skips empty anchors
-# - Logs counts
+# Mode serial (lama): get_or_create_category per node, embedding satu per satu
 # ------------------------------------------------------------
 def scrape_and_insert_categories(url="https://www.tokopedia.com/p"):
   ensure_table()
-
-  r = requests.get(url, headers=HEADERS, timeout=20)
-  soup = BeautifulSoup(r.text, "html.parser")
+  register_vector(conn)
 
   created_counts = {"master": 0, "sub": 0, "child": 0}
+  ids = {}
+
+  for node in fetch_category_tree(url):
+    parent_id = ids.get(node["path"][:-1])
+    if node["level"] > 1 and parent_id is None:
+      continue
+    ids[node["path"]] = get_or_create_category(node["name"], node["url"], node["level"], parent_id)
+    created_counts[LEVEL_NAMES[node["level"]]] += 1
 
-  master_blocks = soup.select("div.css-s7tck8")
-  print("Master blocks found:", len(master_blocks))
-
-  for master in master_blocks:
-    master_els = master.select("div.css-2wmm3i a")    
-    master_map = {}
-    for master_el in master_els:
-      master_name = master_el.get_text(strip=True)
-      master_url = master_el.get("href")
-      if master_url and not master_url.startswith("http"):
-        master_url = "https://www.tokopedia.com" + master_url
-      
-      master_map[master_name] = master_url
-
-    detail_blocks = master.select("div.css-16mwuw1")
-    for detail_block in detail_blocks:
-      master_span = detail_block.select_one("span.css-38r5l3.e13h6i9f1")
-      if not master_span:
-        continue
-      current_master_name = master_span.get_text(strip=True)
-      current_master_url = master_map.get(current_master_name)
-      master_id = get_or_create_category(current_master_name, current_master_url, 1, None)
-      created_counts["master"] += 1
-
-      print(f"\nMASTER DITEMUKAN: {current_master_name}")
-      sub_blocks = detail_block.select("div.css-cdv2tj.e13h6i9f2") 
-
-      for sb in sub_blocks:
-        sub_a = sb.find("a", recursive=False)         
-        if not sub_a:
-          continue
-
-        subcat_name = sub_a.get_text(strip=True)
-        subcat_url = sub_a.get("href")
-        
-        if subcat_url and not subcat_url.startswith("http"):
-          subcat_url = "https://www.tokopedia.com" + subcat_url
-
-        sub_id = get_or_create_category(subcat_name, subcat_url, 2, master_id)
-        created_counts["sub"] += 1
-        print(f"  SUB: {subcat_name}")
-
-        child_links = sb.select("div.css-79elbk.e13h6i9f3 a")
-        for ch in child_links:
-          child_name = ch.get_text(strip=True)
-          child_url = ch.get("href")
-          
-          if child_url and not child_url.startswith("http"):
-            child_url = "https://www.tokopedia.com" + child_url
-
-          get_or_create_category(child_name, child_url, 3, sub_id)
-          created_counts["child"] += 1
-
-    time.sleep(0.2)
+    if node["level"] == 1:
+      print(f"\nMASTER DITEMUKAN: {node['name']}")
+    elif node["level"] == 2:
+      print(f"  SUB: {node['name']}")
 
   print("\n== DONE INSERT ==")
   print("Created counts:", created_counts)
 
+
+# ------------------------------------------------------------
+# Mode batch
+# - Seluruh tree di-parse dulu, lalu upsert per level (L1, L2, L3):
+#   satu statement per level, id dikembalikan untuk jadi parent level berikutnya
+# - Kategori yang sudah ada hanya di-update url-nya kalau berubah
+# - Embedding hanya untuk kategori baru / yang embedding-nya masih NULL
+#   (nama adalah bagian identitas, jadi nama berubah = baris baru),
+#   dikirim per batch lewat EmbeddingBatcher lalu ditulis COPY binary + UPDATE join
+# ------------------------------------------------------------
+UPSERT_CATEGORY_LEVEL = """
+  WITH input AS (
+    SELECT * FROM unnest(%(names)s::text[], %(urls)s::text[], %(parents)s::uuid[]) AS t(name, url, parent_id)
+  ),
+  refreshed AS (
+    UPDATE categories c SET url = i.url, updated_at = NOW()
+    FROM input i
+    WHERE c.ecommerce = %(ecommerce)s AND c.level = %(level)s
+      AND c.name = i.name AND c.parent_id IS NOT DISTINCT FROM i.parent_id
+      AND i.url IS NOT NULL AND c.url IS DISTINCT FROM i.url
+    RETURNING c.id
+  ),
+  inserted AS (
+    INSERT INTO categories (ecommerce, name, url, level, parent_id)
+    SELECT %(ecommerce)s, i.name, i.url, %(level)s, i.parent_id
+    FROM input i
+    WHERE NOT EXISTS (
+      SELECT 1 FROM categories c
+      WHERE c.ecommerce = %(ecommerce)s AND c.level = %(level)s
+        AND c.name = i.name AND c.parent_id IS NOT DISTINCT FROM i.parent_id
+    )
+    ON CONFLICT (ecommerce, name, level, parent_id) DO NOTHING
+    RETURNING id, name, parent_id, TRUE AS is_new, TRUE AS needs_embedding
+  )
+  SELECT c.id, c.name, c.parent_id, FALSE AS is_new, c.embedding IS NULL AS needs_embedding
+  FROM categories c
+  JOIN input i ON c.name = i.name AND c.parent_id IS NOT DISTINCT FROM i.parent_id
+  WHERE c.ecommerce = %(ecommerce)s AND c.level = %(level)s
+  UNION ALL
+  SELECT * FROM inserted;
+"""
+
+CREATE_STAGE_CATEGORY_VECTORS = """
+  CREATE TEMP TABLE stage_category_vectors ON COMMIT DROP AS
+    SELECT 0 AS idx, embedding FROM categories WITH NO DATA;
+"""
+
+# idx di stage = posisi id di array (WITH ORDINALITY mulai dari 1)
+UPDATE_CATEGORY_EMBEDDINGS = """
+  UPDATE categories c SET embedding = v.embedding
+  FROM unnest(%s::uuid[]) WITH ORDINALITY AS t(id, idx)
+  JOIN stage_category_vectors v ON v.idx = t.idx
+  WHERE c.id = t.id;
+"""
+
+
+def upsert_category_levels(nodes, ecommerce="tokopedia"):
+  """Upsert semua node per level; return (ids per path, [(id, name)] yang perlu embedding, jumlah baru per level)."""
+  ids, pending, created = {}, [], {name: 0 for name in LEVEL_NAMES.values()}
+
+  for level in sorted(LEVEL_NAMES):
+    rows = [node for node in nodes if node["level"] == level and (level == 1 or node["path"][:-1] in ids)]
+    if not rows:
+      continue
+
+    cur.execute(UPSERT_CATEGORY_LEVEL, {
+      "names": [node["name"] for node in rows],
+      "urls": [node["url"] for node in rows],
+      "parents": [ids.get(node["path"][:-1]) for node in rows],
+      "ecommerce": ecommerce,
+      "level": level
+    })
+    by_key = {}
+    for category_id, name, parent_id, is_new, needs_embedding in cur.fetchall():
+      by_key[(name, str(parent_id) if parent_id else None)] = category_id
+      created[LEVEL_NAMES[level]] += is_new
+      if needs_embedding:
+        pending.append((category_id, name))
+
+    for node in rows:
+      category_id = by_key.get((node["name"], ids.get(node["path"][:-1])))
+      if category_id is not None:
+        ids[node["path"]] = str(category_id)
+
+    print(f"Level {level}: {len(rows)} kategori, {created[LEVEL_NAMES[level]]} baru.")
+
+  return ids, pending, created
+
+
+def write_category_embeddings(results):
+  """Sink EmbeddingBatcher: [(category_id, embedding)] -> COPY binary + satu UPDATE join."""
+  results = [(category_id, embedding) for category_id, embedding in results if embedding is not None]
+  if not results:
+    return
+  cur.execute(CREATE_STAGE_CATEGORY_VECTORS)
+  copy_vectors(cur, "stage_category_vectors", ["idx", "embedding"],
+               ((i, to_vector(embedding)) for i, (_, embedding) in enumerate(results, start=1)))
+  cur.execute(UPDATE_CATEGORY_EMBEDDINGS, ([category_id for category_id, _ in results],))
+  conn.commit()
+
+
+def ingest_categories_batched(url="https://www.tokopedia.com/p"):
+  ensure_table()
+  register_vector(conn)
+
+  start = time.perf_counter()
+  nodes = fetch_category_tree(url)
+  print(f"Tree: {len(nodes)} node di-parse dalam {time.perf_counter() - start:.2f}s")
+
+  # Upsert seluruh tree dalam satu transaksi; embedding per batch di transaksi sendiri
+  conn.autocommit = False
+  try:
+    ids, pending, created = upsert_category_levels(nodes)
+    conn.commit()
+
+    batcher = EmbeddingBatcher(
+      openai_embed_batch,
+      write_category_embeddings,
+      max_batch_size=OPENAI_MAX_BATCH_SIZE,
+      max_batch_tokens=OPENAI_MAX_BATCH_TOKENS,
+      flush_interval=float("inf")
+    )
+    for category_id, name in pending:
+      batcher.submit(str(category_id), name)
+    batcher.flush()
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    conn.autocommit = True
+
+  print("\n== DONE INSERT ==")
+  print("Created counts:", created)
+  print(f"Embedding: {len(pending)} kategori, total {time.perf_counter() - start:.2f}s")
+
+
 if __name__ == "__main__":
   try:
-    scrape_and_insert_categories()
+    if "--serial" in sys.argv:
+      scrape_and_insert_categories()
+    else:
+      ingest_categories_batched()
   finally:
     conn.close()
@@ -0,0 +1,71 @@
+from html_backend import get_backend
+
+# ------------------------------------------------------------
+# parse_category_tree
+# - More tolerant to nested divs
+# - Finds the first anchor that looks like the subcategory
+# - Skips empty anchors
+# - Hasil: list node {"level", "name", "url", "path"} urut L1 -> L2 -> L3,
+#   path = tuple nama dari L1 sampai node itu (kunci parent = path[:-1]);
+#   node dengan path sama hanya diambil sekali
+# - Parser HTML dari html_backend (selectolax/lxml kalau terpasang),
+#   selector di-compile sekali dan dipakai ulang di semua blok
+# ------------------------------------------------------------
+def _absolute(url):
+  url = url.strip() if url else None
+  if url and not url.startswith("http"):
+    url = "https://www.tokopedia.com" + url
+  return url or None
+
+
+CATEGORY_SELECTORS = {
+  "master_block": "div.css-s7tck8",
+  "master_link": "div.css-2wmm3i a",
+  "detail_block": "div.css-16mwuw1",
+  "master_span": "span.css-38r5l3.e13h6i9f1",
+  "sub_block": "div.css-cdv2tj.e13h6i9f2",
+  "child_link": "div.css-79elbk.e13h6i9f3 a",
+}
+
+
+def parse_category_tree(html, backend=None):
+  backend = backend or get_backend()
+  sel = {key: backend.compile(selector) for key, selector in CATEGORY_SELECTORS.items()}
+  nodes, seen = [], set()
+
+  def add(level, name, url, parent_path):
+    name = name.strip() if name else None
+    if not name:
+      return None
+    path = parent_path + (name,)
+    if path not in seen:
+      seen.add(path)
+      nodes.append({"level": level, "name": name, "url": _absolute(url), "path": path})
+    return path
+
+  for master in sel["master_block"].all(backend.parse(html)):
+    master_map = {}
+    for master_el in sel["master_link"].all(master):
+      master_map[backend.text(master_el)] = backend.attr(master_el, "href")
+
+    for detail_block in sel["detail_block"].all(master):
+      master_span = sel["master_span"].first(detail_block)
+      if master_span is None:
+        continue
+      master_name = backend.text(master_span)
+      master_path = add(1, master_name, master_map.get(master_name), ())
+      if master_path is None:
+        continue
+
+      for sb in sel["sub_block"].all(detail_block):
+        sub_a = backend.child(sb, "a")
+        if sub_a is None:
+          continue
+        sub_path = add(2, backend.text(sub_a), backend.attr(sub_a, "href"), master_path)
+        if sub_path is None:
+          continue
+
+        for ch in sel["child_link"].all(sb):
+          add(3, backend.text(ch), backend.attr(ch, "href"), sub_path)
+
+  return nodes
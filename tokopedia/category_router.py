@@ -0,0 +1,136 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from category_tree import CategoryTree, get_category_tree
+from pgvector_adapter import parse_vector
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Di bawah ambang ini (skor kosinus gabungan / selisih dengan kandidat kedua)
+# hasil router dianggap ragu dan pemanggil jatuh ke LLM
+CATEGORY_ROUTER_MIN_SCORE = float(os.getenv("CATEGORY_ROUTER_MIN_SCORE", 0.45))
+CATEGORY_ROUTER_MIN_MARGIN = float(os.getenv("CATEGORY_ROUTER_MIN_MARGIN", 0.02))
+# Bobot kemiripan parent L2 di skor L3 (nama L3 sering ambigu tanpa parent-nya)
+CATEGORY_ROUTER_PARENT_WEIGHT = float(os.getenv("CATEGORY_ROUTER_PARENT_WEIGHT", 0.3))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+  norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+  norms[norms == 0] = 1.0
+  return matrix / norms
+
+
+# ------------------------------------------------------------
+# CategoryRouter
+# - Embedding kategori L2 & L3 (kolom categories.embedding) dimuat sekali
+#   jadi matriks float32 ternormalisasi, dimuat ulang kalau tree berubah
+# - route(query_vector): satu perkalian matriks per level, tanpa LLM
+#   skor L3 = (1 - w) * sim(L3) + w * sim(parent L2)
+# ------------------------------------------------------------
+class CategoryRouter:
+  def __init__(self, tree: CategoryTree, parent_weight: float = CATEGORY_ROUTER_PARENT_WEIGHT):
+    self.tree = tree
+    self.parent_weight = parent_weight
+    self._lock = threading.Lock()
+    self._watermark = None
+    self._l2_ids: List[str] = []
+    self._l2_matrix: Optional[np.ndarray] = None
+    self._l3_ids: List[str] = []
+    self._l3_matrix: Optional[np.ndarray] = None
+    self._l3_parent_idx: Optional[np.ndarray] = None
+
+  def _ensure_loaded(self):
+    watermark = self.tree.watermark
+    if watermark == self._watermark and self._l3_matrix is not None:
+      return
+    with self._lock:
+      if watermark == self._watermark and self._l3_matrix is not None:
+        return
+
+      with self.tree.get_conn() as conn:
+        with conn.cursor() as cur:
+          cur.execute("""
+            SELECT id, level, embedding::text
+            FROM categories
+            WHERE ecommerce = %s AND level IN (2, 3) AND embedding IS NOT NULL;
+          """, (self.tree.ecommerce,))
+          rows = cur.fetchall()
+
+      vectors: Dict[int, Dict[str, np.ndarray]] = {2: {}, 3: {}}
+      for category_id, level, embedding in rows:
+        vectors[level][str(category_id)] = parse_vector(embedding)
+
+      self._l2_ids = list(vectors[2])
+      self._l3_ids = list(vectors[3])
+      self._l2_matrix = _normalize(np.stack(list(vectors[2].values()))) if vectors[2] else np.zeros((0, 0), np.float32)
+      self._l3_matrix = _normalize(np.stack(list(vectors[3].values()))) if vectors[3] else np.zeros((0, 0), np.float32)
+
+      l2_pos = {category_id: i for i, category_id in enumerate(self._l2_ids)}
+      parents = []
+      for category_id in self._l3_ids:
+        category = self.tree.get(category_id)
+        parents.append(l2_pos.get(category.parent_id, -1) if category else -1)
+      self._l3_parent_idx = np.array(parents, dtype=np.int64)
+
+      self._watermark = watermark
+      logger.info(f"Category router: {len(self._l2_ids)} L2, {len(self._l3_ids)} L3 embedding dimuat.")
+
+  def route(self, query_vector, top_n: int = 5) -> Dict:
+    """
+    Return dict:
+      l3           : Category terbaik (atau None)
+      score/margin : skor L3 terbaik dan selisihnya dengan kandidat kedua
+      l3_candidates: [(Category, skor)] top_n
+      l2_candidates: [(Category, skor)] top_n
+      confident    : True kalau skor & margin di atas ambang
+    """
+    self._ensure_loaded()
+    result = {"l3": None, "score": 0.0, "margin": 0.0, "l3_candidates": [], "l2_candidates": [], "confident": False}
+    if not self._l3_ids:
+      return result
+
+    q = _normalize(np.asarray(query_vector, dtype=np.float32))
+    l2_scores = self._l2_matrix @ q if self._l2_ids else np.zeros(0, np.float32)
+    l3_scores = self._l3_matrix @ q
+
+    if len(l2_scores):
+      parent_scores = np.where(self._l3_parent_idx >= 0, l2_scores[np.maximum(self._l3_parent_idx, 0)], l3_scores)
+      l3_scores = (1 - self.parent_weight) * l3_scores + self.parent_weight * parent_scores
+
+    l3_top = np.argsort(-l3_scores)[:top_n]
+    l2_top = np.argsort(-l2_scores)[:top_n]
+    result["l3_candidates"] = [(self.tree.get(self._l3_ids[i]), float(l3_scores[i])) for i in l3_top]
+    result["l2_candidates"] = [(self.tree.get(self._l2_ids[i]), float(l2_scores[i])) for i in l2_top]
+
+    best, score = result["l3_candidates"][0]
+    second = result["l3_candidates"][1][1] if len(result["l3_candidates"]) > 1 else 0.0
+    result.update({
+      "l3": best,
+      "score": score,
+      "margin": score - second,
+      "confident": best is not None and score >= CATEGORY_ROUTER_MIN_SCORE and score - second >= CATEGORY_ROUTER_MIN_MARGIN
+    })
+    return result
+
+
+_router: Optional[CategoryRouter] = None
+_router_pid: Optional[int] = None
+
+
+def get_category_router() -> CategoryRouter:
+  """Router per proses di atas get_category_tree()."""
+  global _router, _router_pid
+  if _router is None or _router_pid != os.getpid():
+    _router = CategoryRouter(get_category_tree())
+    _router_pid = os.getpid()
+  return _router
@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Setelah TTL lewat, hanya watermark (MAX(updated_at), COUNT) yang dicek;
+# tree dimuat ulang kalau watermark berubah
+CATEGORY_TREE_TTL_SECONDS = float(os.getenv("CATEGORY_TREE_TTL_SECONDS", 600))
+
+
+class Category:
+  __slots__ = ("id", "name", "url", "level", "parent_id", "children", "path")
+
+  def __init__(self, id, name, url, level, parent_id):
+    self.id = id
+    self.name = name
+    self.url = url
+    self.level = level
+    self.parent_id = parent_id
+    self.children: List["Category"] = []
+    self.path: Tuple[str, ...] = ()
+
+  def as_row(self) -> Tuple:
+    """Bentuk (id, name, url) yang sama dengan hasil query get_categories."""
+    return (self.id, self.name, self.url)
+
+  def __repr__(self):
+    return f"Category({' > '.join(self.path)!r}, id={self.id!r})"
+
+
+# ------------------------------------------------------------
+# CategoryTree
+# - Semua kategori satu ecommerce dimuat sekali ke memori
+# - Index: id -> Category, level -> list, parent -> children (urut nama),
+#   path lengkap "L1 > L2 > L3" -> Category
+# - get_conn: callable yang mengembalikan context manager koneksi
+#   (koneksi psycopg2 biasa, atau db_pool.pooled_connection)
+# ------------------------------------------------------------
+class CategoryTree:
+  def __init__(self, get_conn: Callable, ecommerce: str = "tokopedia", ttl: float = CATEGORY_TREE_TTL_SECONDS):
+    self.get_conn = get_conn
+    self.ecommerce = ecommerce
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    self._checked_at: Optional[float] = None
+    self._watermark: Optional[Tuple] = None
+    self._by_id: Dict[str, Category] = {}
+    self._by_level: Dict[int, List[Category]] = {}
+    self._by_path: Dict[str, Category] = {}
+
+  # ---------------- refresh ----------------
+  def refresh(self, force: bool = False):
+    with self._lock:
+      now = time.monotonic()
+      if not force and self._checked_at is not None and now - self._checked_at < self.ttl:
+        return
+
+      with self.get_conn() as conn:
+        with conn.cursor() as cur:
+          cur.execute("""
+            SELECT MAX(updated_at), COUNT(*) FROM categories WHERE ecommerce = %s;
+          """, (self.ecommerce,))
+          watermark = tuple(cur.fetchone())
+          if force or watermark != self._watermark:
+            cur.execute("""
+              SELECT id, name, url, level, parent_id
+              FROM categories
+              WHERE ecommerce = %s;
+            """, (self.ecommerce,))
+            self._build(cur.fetchall())
+            self._watermark = watermark
+            logger.info(f"Category tree dimuat: {len(self._by_id)} kategori ({self.ecommerce}).")
+
+      self._checked_at = now
+
+  @property
+  def watermark(self) -> Optional[Tuple]:
+    """(MAX(updated_at), COUNT) saat terakhir dimuat; berubah = isi tree berubah."""
+    self.refresh()
+    return self._watermark
+
+  def invalidate(self):
+    """Paksa cek watermark di akses berikutnya (mis. setelah scraper kategori jalan)."""
+    with self._lock:
+      self._checked_at = None
+
+  def _build(self, rows):
+    by_id = {str(row[0]): Category(str(row[0]), row[1], row[2], row[3], str(row[4]) if row[4] else None) for row in rows}
+    by_level: Dict[int, List[Category]] = {}
+    for category in by_id.values():
+      by_level.setdefault(category.level, []).append(category)
+      parent = by_id.get(category.parent_id) if category.parent_id else None
+      if parent is not None:
+        parent.children.append(category)
+
+    for categories in by_level.values():
+      categories.sort(key=lambda c: c.name)
+    for category in by_id.values():
+      category.children.sort(key=lambda c: c.name)
+
+    by_path: Dict[str, Category] = {}
+    for level in sorted(by_level):
+      for category in by_level[level]:
+        parent = by_id.get(category.parent_id) if category.parent_id else None
+        category.path = (parent.path if parent else ()) + (category.name,)
+        by_path[" > ".join(category.path)] = category
+
+    self._by_id, self._by_level, self._by_path = by_id, by_level, by_path
+
+  # ---------------- lookup ----------------
+  def get(self, category_id) -> Optional[Category]:
+    self.refresh()
+    return self._by_id.get(str(category_id)) if category_id else None
+
+  def level(self, level: int) -> List[Category]:
+    self.refresh()
+    return self._by_level.get(level, [])
+
+  def children(self, parent_id) -> List[Category]:
+    parent = self.get(parent_id)
+    return parent.children if parent else []
+
+  def by_path(self, path: str) -> Optional[Category]:
+    self.refresh()
+    return self._by_path.get(path)
+
+  def ancestors(self, category_id) -> List[Category]:
+    """[L1, L2, ..., kategori itu sendiri]."""
+    chain = []
+    category = self.get(category_id)
+    while category is not None:
+      chain.append(category)
+      category = self._by_id.get(category.parent_id) if category.parent_id else None
+    return chain[::-1]
+
+  def full_path(self, category_id, sep: str = " > ") -> str:
+    category = self.get(category_id)
+    return sep.join(category.path) if category else ""
+
+  def rows(self, level: int, parent_id=None) -> List[Tuple]:
+    """Pengganti query get_categories: list (id, name, url) urut nama."""
+    categories = self.children(parent_id) if parent_id else self.level(level)
+    return [c.as_row() for c in categories if c.level == level]
+
+
+_tree: Optional[CategoryTree] = None
+_tree_pid: Optional[int] = None
+
+
+def get_category_tree() -> CategoryTree:
+  """Tree per proses, memakai connection pool."""
+  global _tree, _tree_pid
+  if _tree is None or _tree_pid != os.getpid():
+    from db_pool import pooled_connection
+    _tree = CategoryTree(pooled_connection)
+    _tree_pid = os.getpid()
+  return _tree
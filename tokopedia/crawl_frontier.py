@@ -0,0 +1,400 @@
+"""
+Crawl frontier persisten di Postgres: halaman pencarian per kategori L3 dan
+URL produk, lengkap dengan state, jumlah percobaan dan waktu fetch terakhir.
+Crawler meng-claim pekerjaan dari sini, checkpoint setelah data tersimpan,
+dan bisa dilanjutkan setelah proses mati tanpa mengulang dari halaman 1.
+
+Jalankan (dari folder tokopedia/):
+  python crawl_frontier.py status                 # jumlah halaman/produk per state
+  python crawl_frontier.py retry                  # halaman/produk 'failed' dicoba lagi
+  python crawl_frontier.py release                # lepas semua claim (mis. setelah semua worker mati)
+  python crawl_frontier.py reset [category_id]    # crawl ulang semua halaman (atau satu kategori)
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Claim yang tidak di-checkpoint selama ini dianggap milik proses yang mati
+CRAWL_FRONTIER_LEASE_SECONDS = int(os.getenv("CRAWL_FRONTIER_LEASE_SECONDS", 900))
+CRAWL_FRONTIER_MAX_ATTEMPTS = int(os.getenv("CRAWL_FRONTIER_MAX_ATTEMPTS", 3))
+# Halaman/produk yang sudah 'done' boleh di-crawl lagi setelah sekian jam (0 = tidak pernah)
+CRAWL_FRONTIER_REFRESH_HOURS = float(os.getenv("CRAWL_FRONTIER_REFRESH_HOURS", 24))
+
+# Satu statement per item
+ENSURE_FRONTIER_SCHEMA = [
+  """
+  CREATE TABLE IF NOT EXISTS crawl_pages (
+    category_id   TEXT NOT NULL,
+    page          INTEGER NOT NULL,
+    url           TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    claimed_by    TEXT,
+    claimed_at    TIMESTAMP,
+    last_fetched  TIMESTAMP,
+    product_count INTEGER,
+    last_error    TEXT,
+    PRIMARY KEY (category_id, page)
+  );
+  """,
+  """
+  CREATE TABLE IF NOT EXISTS crawl_products (
+    url          TEXT PRIMARY KEY,
+    category_id  TEXT,
+    page         INTEGER,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    claimed_by   TEXT,
+    claimed_at   TIMESTAMP,
+    last_fetched TIMESTAMP,
+    last_error   TEXT
+  );
+  """,
+  "CREATE INDEX IF NOT EXISTS crawl_pages_state_idx ON crawl_pages (state, category_id, page);",
+  "CREATE INDEX IF NOT EXISTS crawl_products_queue_idx ON crawl_products (state, claimed_at) WHERE state IN ('pending', 'claimed');",
+]
+
+
+def _stale(alias: str) -> str:
+  return f"""({alias}.state = 'done'
+        AND %(refresh)s > 0
+        AND {alias}.last_fetched < NOW() - %(refresh)s * INTERVAL '1 hour')"""
+
+
+def _claimable(alias: str, refresh: bool = True) -> str:
+  """
+  Baris boleh di-claim kalau: pending; claim-nya basi (lease habis) dan masih
+  ada jatah percobaan; atau (refresh=True) sudah done tapi lebih tua dari jendela refresh.
+  Claim basi yang jatahnya habis dipindah ke 'failed' oleh EXPIRE_CLAIMS.
+  """
+  return f"""(
+    {alias}.state = 'pending'
+    OR ({alias}.state = 'claimed'
+        AND {alias}.claimed_at < NOW() - %(lease)s * INTERVAL '1 second'
+        AND {alias}.attempts < %(max_attempts)s)
+    {f"OR {_stale(alias)}" if refresh else ""}
+  )"""
+
+
+def _claim_set(alias: str) -> str:
+  # Claim ulang halaman/produk yang sudah 'done' (refresh) mulai dari percobaan pertama lagi
+  return f"""
+    state = 'claimed',
+    attempts = CASE WHEN {alias}.state = 'done' THEN 1 ELSE {alias}.attempts + 1 END,
+    claimed_by = %(worker)s,
+    claimed_at = NOW()
+  """
+
+
+# Halaman 1..max_pages untuk banyak kategori sekaligus, url = base_url + page=N
+SEED_PAGES = """
+  INSERT INTO crawl_pages (category_id, page, url)
+  SELECT c.category_id, p.page,
+    c.base_url || CASE WHEN strpos(c.base_url, '?') > 0 THEN '&' ELSE '?' END || 'page=' || p.page
+  FROM unnest(%(category_ids)s::text[], %(base_urls)s::text[]) AS c(category_id, base_url)
+  CROSS JOIN generate_series(1, %(max_pages)s) AS p(page)
+  ON CONFLICT (category_id, page) DO NOTHING;
+"""
+
+CLAIM_PAGE = f"""
+  UPDATE crawl_pages p SET {_claim_set("p")}
+  WHERE (p.category_id, p.page) = (
+    SELECT c.category_id, c.page FROM crawl_pages c
+    WHERE (%(category_ids)s::text[] IS NULL OR c.category_id = ANY(%(category_ids)s::text[]))
+      AND {_claimable("c")}
+    ORDER BY c.category_id, c.page
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING p.category_id, p.page, p.url;
+"""
+
+# URL yang sedang/sudah di-claim proses lain (atau done dan masih segar) tidak
+# dikembalikan: produk yang muncul di banyak halaman pencarian hanya di-fetch sekali
+CLAIM_PRODUCTS = f"""
+  INSERT INTO crawl_products AS p (url, category_id, page, state, attempts, claimed_by, claimed_at)
+  SELECT url, %(category_id)s, %(page)s, 'claimed', 1, %(worker)s, NOW()
+  FROM unnest(%(urls)s::text[]) AS url
+  ON CONFLICT (url) DO UPDATE SET {_claim_set("p")}
+  WHERE {_claimable("p")}
+  RETURNING p.url;
+"""
+
+# Mode antrean: URL produk dari halaman masuk sebagai task 'pending' untuk
+# worker mana pun; yang sudah ada hanya dibuka lagi kalau done dan basi
+ENQUEUE_PRODUCTS = f"""
+  INSERT INTO crawl_products AS p (url, category_id, page)
+  SELECT url, %(category_id)s, %(page)s
+  FROM unnest(%(urls)s::text[]) AS url
+  ON CONFLICT (url) DO UPDATE SET state = 'pending', attempts = 0
+  WHERE {_stale("p")};
+"""
+
+CLAIM_PRODUCT_BATCH = f"""
+  UPDATE crawl_products p SET {_claim_set("p")}
+  WHERE p.url IN (
+    SELECT c.url FROM crawl_products c
+    WHERE (%(category_ids)s::text[] IS NULL OR c.category_id = ANY(%(category_ids)s::text[]))
+      AND {_claimable("c", refresh=False)}
+    ORDER BY c.category_id, c.page
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING p.url, p.category_id;
+"""
+
+FINISH_PAGE = """
+  UPDATE crawl_pages SET
+    state = 'done', last_fetched = NOW(), product_count = %(product_count)s,
+    claimed_by = NULL, claimed_at = NULL, last_error = NULL
+  WHERE category_id = %(category_id)s AND page = %(page)s;
+"""
+
+FAIL_PAGE = """
+  UPDATE crawl_pages SET
+    state = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    claimed_by = NULL, claimed_at = NULL, last_error = %(error)s
+  WHERE category_id = %(category_id)s AND page = %(page)s;
+"""
+
+# Halaman kosong = hasil kategori sudah habis; halaman setelahnya tidak perlu di-fetch
+EXHAUST_PAGES = """
+  UPDATE crawl_pages SET state = 'done', last_fetched = NOW(), product_count = 0
+  WHERE category_id = %(category_id)s AND page > %(page)s AND state IN ('pending', 'failed');
+"""
+
+FINISH_PRODUCTS = """
+  UPDATE crawl_products SET
+    state = 'done', last_fetched = NOW(),
+    claimed_by = NULL, claimed_at = NULL, last_error = NULL
+  WHERE url = ANY(%(urls)s::text[]);
+"""
+
+FAIL_PRODUCTS = """
+  UPDATE crawl_products SET
+    state = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    claimed_by = NULL, claimed_at = NULL, last_error = %(error)s
+  WHERE url = ANY(%(urls)s::text[]);
+"""
+
+
+# Claim basi (pemiliknya mati) tanpa sisa percobaan: tidak bisa di-claim lagi,
+# jadi ditandai failed supaya tidak tertahan di 'claimed' selamanya
+EXPIRE_CLAIMS = """
+  UPDATE {table} SET
+    state = 'failed', claimed_by = NULL, claimed_at = NULL,
+    last_error = 'lease habis setelah ' || attempts || ' percobaan'
+  WHERE state = 'claimed'
+    AND claimed_at < NOW() - %(lease)s * INTERVAL '1 second'
+    AND attempts >= %(max_attempts)s;
+"""
+
+
+def worker_id() -> str:
+  return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ------------------------------------------------------------
+# CrawlFrontier
+# - Halaman: (category_id, page) di-seed dulu, lalu di-claim satu per satu
+#   (FOR UPDATE SKIP LOCKED, aman dipakai banyak proses di banyak mesin)
+# - Produk, dua mode:
+#   - claim_products: URL dari satu halaman langsung di-claim oleh pemilik halaman
+#   - enqueue_products + claim_product_batch: URL jadi task antrean yang
+#     diambil worker mana pun (work stealing lintas kategori)
+#   URL yang sudah done / sedang dikerjakan proses lain dilewati
+# - Checkpoint (finish_*) dipanggil setelah data benar-benar tersimpan,
+#   jadi proses yang mati di tengah halaman hanya mengulang produk yang belum selesai
+# - get_conn: callable yang mengembalikan context manager koneksi
+#   (koneksi psycopg2 biasa, atau db_pool.pooled_connection)
+# ------------------------------------------------------------
+class CrawlFrontier:
+  def __init__(
+    self,
+    get_conn: Callable,
+    worker: Optional[str] = None,
+    lease_seconds: int = CRAWL_FRONTIER_LEASE_SECONDS,
+    max_attempts: int = CRAWL_FRONTIER_MAX_ATTEMPTS,
+    refresh_hours: float = CRAWL_FRONTIER_REFRESH_HOURS
+  ):
+    self.get_conn = get_conn
+    self._worker = worker
+    self.lease_seconds = lease_seconds
+    self.max_attempts = max_attempts
+    self.refresh_hours = refresh_hours
+    self._schema_ready = False
+    self._expired_at = 0.0
+
+  @property
+  def worker(self) -> str:
+    # Dihitung saat dipakai: objek yang dibuat sebelum fork tetap punya id per proses
+    return self._worker or worker_id()
+
+  def _execute(self, sql: str, params: Dict, fetch: bool = False):
+    params = {
+      "worker": self.worker,
+      "lease": self.lease_seconds,
+      "max_attempts": self.max_attempts,
+      "refresh": self.refresh_hours,
+      **params
+    }
+    with self.get_conn() as conn:
+      with conn.cursor() as cur:
+        if not self._schema_ready:
+          for statement in ENSURE_FRONTIER_SCHEMA:
+            cur.execute(statement)
+          self._schema_ready = True
+        cur.execute(sql, params)
+        return cur.fetchall() if fetch else cur.rowcount
+
+  def _expire_claims(self):
+    # Cukup sesekali (lease dihitung dalam menit), bukan di setiap claim
+    if time.monotonic() - self._expired_at < min(60, self.lease_seconds):
+      return
+    self._expired_at = time.monotonic()
+    expired = sum(self._execute(EXPIRE_CLAIMS.format(table=table), {}) for table in ("crawl_pages", "crawl_products"))
+    if expired:
+      logger.warning(f"Crawl frontier: {expired} claim basi tanpa sisa percobaan ditandai failed.")
+
+  # ---------------- halaman ----------------
+  def seed_pages(self, categories: Iterable[Tuple], max_pages: int) -> int:
+    """Daftarkan halaman 1..max_pages untuk [(category_id, base_url)]; halaman yang sudah ada tidak diubah."""
+    categories = [(str(category_id), base_url) for category_id, base_url in categories if base_url]
+    if not categories:
+      return 0
+    return self._execute(SEED_PAGES, {
+      "category_ids": [category_id for category_id, _ in categories],
+      "base_urls": [base_url for _, base_url in categories],
+      "max_pages": max_pages
+    })
+
+  def claim_page(self, category_ids: Optional[Iterable] = None) -> Optional[Tuple[str, int, str]]:
+    """(category_id, page, url) berikutnya, atau None kalau tidak ada yang bisa dikerjakan."""
+    self._expire_claims()
+    ids = [str(category_id) for category_id in category_ids] if category_ids is not None else None
+    rows = self._execute(CLAIM_PAGE, {"category_ids": ids}, fetch=True)
+    return tuple(rows[0]) if rows else None
+
+  def finish_page(self, category_id, page: int, product_count: int):
+    self._execute(FINISH_PAGE, {"category_id": str(category_id), "page": page, "product_count": product_count})
+    if product_count == 0:
+      self._execute(EXHAUST_PAGES, {"category_id": str(category_id), "page": page})
+
+  def fail_page(self, category_id, page: int, error: str):
+    self._execute(FAIL_PAGE, {"category_id": str(category_id), "page": page, "error": str(error)[:1000]})
+
+  # ---------------- produk ----------------
+  def claim_products(self, category_id, page: int, urls: Iterable[str]) -> List[str]:
+    """URL produk yang perlu di-fetch halaman ini (urutan asli, duplikat dibuang)."""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+      return []
+    self._expire_claims()
+    rows = self._execute(CLAIM_PRODUCTS, {"category_id": str(category_id), "page": page, "urls": urls}, fetch=True)
+    claimed = {row[0] for row in rows}
+    return [url for url in urls if url in claimed]
+
+  def enqueue_products(self, category_id, page: int, urls: Iterable[str]) -> int:
+    """Masukkan URL produk ke antrean; return jumlah task baru / dibuka lagi."""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+      return 0
+    return self._execute(ENQUEUE_PRODUCTS, {"category_id": str(category_id), "page": page, "urls": urls})
+
+  def claim_product_batch(self, limit: int, category_ids: Optional[Iterable] = None) -> List[Tuple[str, str]]:
+    """Sampai `limit` task produk [(url, category_id)] dari antrean."""
+    self._expire_claims()
+    ids = [str(category_id) for category_id in category_ids] if category_ids is not None else None
+    rows = self._execute(CLAIM_PRODUCT_BATCH, {"category_ids": ids, "limit": limit}, fetch=True)
+    return [tuple(row) for row in rows]
+
+  def finish_products(self, urls: Iterable[str]):
+    urls = list(urls)
+    if urls:
+      self._execute(FINISH_PRODUCTS, {"urls": urls})
+
+  def fail_products(self, urls: Iterable[str], error: str):
+    urls = list(urls)
+    if urls:
+      self._execute(FAIL_PRODUCTS, {"urls": urls, "error": str(error)[:1000]})
+
+  # ---------------- pemeliharaan ----------------
+  def release(self, worker: Optional[str] = None) -> int:
+    """Kembalikan claim milik worker ini (atau semua worker kalau worker='*') ke pending."""
+    worker = self.worker if worker is None else worker
+    released = 0
+    for table in ("crawl_pages", "crawl_products"):
+      released += self._execute(f"""
+        UPDATE {table} SET state = 'pending', claimed_by = NULL, claimed_at = NULL
+        WHERE state = 'claimed' AND (%(target)s = '*' OR claimed_by = %(target)s);
+      """, {"target": worker})
+    return released
+
+  def retry_failed(self) -> int:
+    retried = 0
+    for table in ("crawl_pages", "crawl_products"):
+      retried += self._execute(f"UPDATE {table} SET state = 'pending', attempts = 0 WHERE state = 'failed';", {})
+    return retried
+
+  def reset(self, category_id=None) -> int:
+    return self._execute("""
+      UPDATE crawl_pages SET state = 'pending', attempts = 0, claimed_by = NULL, claimed_at = NULL
+      WHERE %(category_id)s::text IS NULL OR category_id = %(category_id)s::text;
+    """, {"category_id": str(category_id) if category_id else None})
+
+  def status(self) -> Dict[str, Dict[str, int]]:
+    result = {}
+    for table in ("crawl_pages", "crawl_products"):
+      rows = self._execute(f"SELECT state, COUNT(*) FROM {table} GROUP BY state ORDER BY state;", {}, fetch=True)
+      result[table] = {state: count for state, count in rows}
+    return result
+
+
+def connect_db():
+  conn = psycopg2.connect(
+    host=os.getenv("DB_HOST"),
+    port=os.getenv("DB_PORT"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    dbname=os.getenv("DB_NAME")
+  )
+  conn.autocommit = True
+  return conn
+
+
+def main():
+  command = sys.argv[1] if len(sys.argv) > 1 else "status"
+  conn = connect_db()
+  try:
+    frontier = CrawlFrontier(lambda: conn)
+    if command == "status":
+      for table, states in frontier.status().items():
+        print(f"{table}: " + (", ".join(f"{state}={count}" for state, count in states.items()) or "kosong"))
+    elif command == "retry":
+      print(f"{frontier.retry_failed()} baris 'failed' dikembalikan ke pending.")
+    elif command == "release":
+      print(f"{frontier.release('*')} claim dilepas.")
+    elif command == "reset":
+      print(f"{frontier.reset(sys.argv[2] if len(sys.argv) > 2 else None)} halaman di-reset.")
+    else:
+      print(__doc__)
+  finally:
+    conn.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+import httpx
+
+from product import TokopediaScraper
+from http_client import get_async_client
+from cache_extract import CacheLocator
+from rate_limiter import HTTP_MAX_RETRIES, backoff_delay, get_rate_limiter, is_transient, retry_after_seconds
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Maksimal request produk yang berjalan bersamaan ke satu host
+CRAWL_CONCURRENCY_PER_HOST = int(os.getenv("CRAWL_CONCURRENCY_PER_HOST", 8))
+CRAWL_TIMEOUT_SECONDS = 20
+
+_scraper = TokopediaScraper()
+
+
+# ------------------------------------------------------------
+# ASYNC CRAWLER
+# - Fetch halaman produk secara concurrent (dibatasi per host), tiap
+#   request lewat rate limiter bersama; 429/5xx/timeout di-retry dengan backoff
+# - Parse memakai TokopediaScraper.parse (hasil sama dengan scrape(url))
+# - Hasil dikirim ke tahap save begitu selesai, satu per satu
+# ------------------------------------------------------------
+class AsyncTokopediaCrawler:
+  def __init__(
+    self,
+    concurrency_per_host: int = CRAWL_CONCURRENCY_PER_HOST,
+    timeout: float = CRAWL_TIMEOUT_SECONDS,
+    scraper: Optional[TokopediaScraper] = None,
+    max_retries: int = HTTP_MAX_RETRIES
+  ):
+    self.scraper = scraper or TokopediaScraper()
+    self.max_retries = max_retries
+    self.concurrency_per_host = max(1, concurrency_per_host)
+    self.timeout = timeout
+    self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+  def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = self._semaphores.get(host)
+    if semaphore is None:
+      semaphore = asyncio.Semaphore(self.concurrency_per_host)
+      self._semaphores[host] = semaphore
+    return semaphore
+
+  async def _fetch_cache(self, url: str) -> str:
+    limiter = get_rate_limiter()
+    for attempt in range(self.max_retries + 1):
+      locator = CacheLocator()
+      retry_delay = None
+      try:
+        # Semaphore dulu, baru pesan slot rate limiter dan mulai ukur latensi:
+        # waktu antre semaphore tidak boleh terhitung sebagai respons lambat,
+        # dan slot tidak hangus selama request masih menunggu giliran
+        async with self._host_semaphore(url):
+          await limiter.acquire_async(url)
+          start = time.perf_counter()
+          async with get_async_client().stream("GET", url, timeout=self.timeout) as resp:
+            retry_after = retry_after_seconds(resp)
+            limiter.record(url, status=resp.status_code, latency=time.perf_counter() - start, retry_after=retry_after)
+            if is_transient(resp.status_code) and attempt < self.max_retries:
+              retry_delay = max(backoff_delay(attempt), retry_after or 0)
+              logger.warning(f"HTTP {resp.status_code} pada {url}, retry {attempt + 1}/{self.max_retries} dalam {retry_delay:.1f}s.")
+            else:
+              resp.raise_for_status()
+              async for chunk in resp.aiter_text():
+                if locator.done:
+                  # HTTP/1.1: habiskan sisa body agar koneksi keep-alive bisa dipakai ulang
+                  continue
+                locator.feed(chunk)
+                if locator.done and resp.http_version == "HTTP/2":
+                  break
+        if retry_delay is None:
+          return locator.result
+
+      except httpx.TransportError as e:
+        limiter.record(url, error=e)
+        if attempt >= self.max_retries:
+          raise
+        retry_delay = backoff_delay(attempt)
+        logger.warning(f"{type(e).__name__} pada {url}, retry {attempt + 1}/{self.max_retries} dalam {retry_delay:.1f}s.")
+
+      # Tunggu di luar semaphore supaya slot host dipakai URL lain
+      await asyncio.sleep(retry_delay)
+
+  async def scrape(self, url: str) -> List[Dict]:
+    logger.info(f"URL: {url}")
+    try:
+      return self.scraper.parse_cache_json(await self._fetch_cache(url))
+
+    except Exception as e:
+      logger.error(f"Error scraping {url}: {str(e)}")
+      return []
+
+  async def crawl(self, urls: Iterable[str], on_result: Callable[[str, List[Dict]], None]) -> int:
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def fetch(url):
+      results = await self.scrape(url)
+      await queue.put((url, results))
+
+    # Tahap save (DB + embedding) blocking, jalankan di thread terpisah
+    # tapi tetap berurutan agar koneksi DB tidak dipakai bersamaan.
+    async def save():
+      saved = 0
+      while True:
+        item = await queue.get()
+        if item is None:
+          return saved
+        url, results = item
+        try:
+          await asyncio.to_thread(on_result, url, results)
+          saved += 1
+        except Exception as e:
+          logger.error(f"Gagal menyimpan hasil {url}: {e}")
+
+    saver = asyncio.create_task(save())
+    await asyncio.gather(*(fetch(url) for url in urls))
+    await queue.put(None)
+    return await saver
+
+
+# Event loop dipertahankan per proses supaya AsyncClient (dan koneksi
+# keep-alive di dalamnya) bisa dipakai ulang antar halaman.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+  global _loop, _loop_pid
+  if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+    _loop = asyncio.new_event_loop()
+    _loop_pid = os.getpid()
+  return _loop
+
+
+def crawl_products(
+  urls: Iterable[str],
+  on_result: Callable[[str, List[Dict]], None],
+  concurrency_per_host: int = CRAWL_CONCURRENCY_PER_HOST
+) -> int:
+  """Entry point sinkron untuk scrape_page: fetch semua URL produk lalu panggil on_result(url, results)."""
+  urls = [url for url in urls if url]
+  if not urls:
+    return 0
+
+  crawler = AsyncTokopediaCrawler(concurrency_per_host=concurrency_per_host, scraper=_scraper)
+  return _get_loop().run_until_complete(crawler.crawl(urls, on_result))
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import psycopg2
+from psycopg2.extensions import AsIs, encodings, connection as PGConnection
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+from pgvector_adapter import register_vector
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", 1))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", 10))
+# Lama menunggu koneksi kosong sebelum menyerah (detik)
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+# Batas waktu per statement di koneksi pool (ms, 0 = tanpa batas). Default =
+# timeout request API, supaya query milik request yang sudah 504 ikut dihentikan
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv(
+  "DB_STATEMENT_TIMEOUT_MS",
+  int(float(os.getenv("SEARCH_API_TIMEOUT_SECONDS", 15)) * 1000)
+))
+# Prepared statement maksimal per koneksi; yang paling lama tidak dipakai di-DEALLOCATE
+DB_PREPARED_MAX = int(os.getenv("DB_PREPARED_MAX", 64))
+
+
+# ------------------------------------------------------------
+# PooledConnection
+# - Koneksi psycopg2 yang mengingat prepared statement miliknya
+#   (prepared statement hidup per sesi Postgres), urut dari yang terlama dipakai
+# ------------------------------------------------------------
+class PooledConnection(PGConnection):
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.prepared: "OrderedDict[str, None]" = OrderedDict()
+    self.vector_registered = False
+
+
+class ConnectionPool:
+  """ThreadedConnectionPool yang menunggu (bukan error) saat semua koneksi terpakai."""
+
+  def __init__(self, minconn: int = DB_POOL_MIN_CONN, maxconn: int = DB_POOL_MAX_CONN, **connect_kwargs):
+    self._pool = ThreadedConnectionPool(minconn, maxconn, connection_factory=PooledConnection, **connect_kwargs)
+    self._slots = threading.BoundedSemaphore(maxconn)
+
+  def getconn(self, timeout: float = DB_POOL_TIMEOUT_SECONDS) -> PooledConnection:
+    if not self._slots.acquire(timeout=timeout):
+      raise TimeoutError(f"Tidak ada koneksi DB kosong dalam {timeout:.0f} detik.")
+    try:
+      conn = self._pool.getconn()
+      if not conn.vector_registered:
+        register_vector(conn)
+        conn.commit()
+        conn.vector_registered = True
+      return conn
+    except Exception:
+      self._slots.release()
+      raise
+
+  def putconn(self, conn: PooledConnection, close: bool = False):
+    try:
+      self._pool.putconn(conn, close=close or bool(conn.closed))
+    finally:
+      self._slots.release()
+
+  def closeall(self):
+    self._pool.closeall()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+  """Pool per proses (koneksi tidak boleh dibawa lintas fork)."""
+  global _pool, _pool_pid
+  with _pool_lock:
+    if _pool is None or _pool_pid != os.getpid():
+      _pool = ConnectionPool(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "admin"),
+        password=os.getenv("DB_PASSWORD", "admin"),
+        dbname=os.getenv("DB_NAME", "db_ecommerce"),
+        connect_timeout=5,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+      )
+      _pool_pid = os.getpid()
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+  """
+  Pinjam koneksi dari pool. Transaksi selalu diakhiri (commit kalau sukses,
+  rollback kalau error) supaya SET LOCAL dsb tidak bocor ke peminjam berikutnya.
+  Koneksi yang putus dibuang dari pool.
+  """
+  pool = get_pool()
+  conn = pool.getconn()
+  broken = False
+  try:
+    yield conn
+    conn.commit()
+  except (psycopg2.OperationalError, psycopg2.InterfaceError):
+    broken = True
+    raise
+  except Exception:
+    if not conn.closed:
+      conn.rollback()
+    raise
+  finally:
+    pool.putconn(conn, close=broken)
+
+
+# ------------------------------------------------------------
+# PREPARED STATEMENTS
+# - SQL yang sama di-PREPARE sekali per koneksi, selanjutnya cukup EXECUTE
+#   (parse + plan tidak diulang, teks SQL tidak dikirim ulang)
+# - Placeholder $1..$n dibuat oleh psycopg2 sendiri (mogrify), jadi aturan
+#   %s / %% persis sama dengan cur.execute; parameter tetap di-adapt psycopg2
+# - Maksimal DB_PREPARED_MAX per koneksi (LRU): SQL dengan nilai tertanam
+#   (mis. LIMIT kandidat ANN, kombinasi filter) tidak menumpuk di sesi
+# ------------------------------------------------------------
+def statement_name(sql: str) -> str:
+  return "ps_" + hashlib.md5(sql.encode("utf-8")).hexdigest()[:20]
+
+
+def numbered_sql(cur, sql: str, count: int) -> str:
+  """SQL gaya psycopg2 (%s, %%) -> SQL Postgres dengan $1..$count."""
+  numbered = cur.mogrify(sql, tuple(AsIs(f"${i}") for i in range(1, count + 1)))
+  return numbered.decode(encodings.get(cur.connection.encoding, "utf-8"))
+
+
+def execute_prepared(cur, sql: str, params: Sequence = ()):
+  conn = cur.connection
+  prepared = getattr(conn, "prepared", None)
+  if prepared is None:
+    # Bukan koneksi dari pool: jalankan biasa
+    cur.execute(sql, tuple(params))
+    return
+
+  name = statement_name(sql)
+  if name in prepared:
+    prepared.move_to_end(name)
+  else:
+    pg_sql = numbered_sql(cur, sql, len(params))
+    while len(prepared) >= DB_PREPARED_MAX:
+      evicted, _ = prepared.popitem(last=False)
+      cur.execute(f"DEALLOCATE {evicted};")
+    cur.execute(f"PREPARE {name} AS {pg_sql.strip().rstrip(';')};")
+    prepared[name] = None
+
+  if params:
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", tuple(params))
+  else:
+    cur.execute(f"EXECUTE {name};")
@@ -0,0 +1,476 @@
+import io
+import os
+import time
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from embedding import Embedding, EmbeddingBatcher
+from facets import FACET_COLUMNS, ensure_schema as ensure_facet_schema
+from pgvector_adapter import copy_vectors, to_vector
+from search_cache import CREATE_GENERATION_TABLE, invalidate_categories
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Jumlah produk (beserta variannya) yang ditampung sebelum ditulis sekaligus
+BULK_WRITE_MAX_PRODUCTS = int(os.getenv("BULK_WRITE_MAX_PRODUCTS", 60))
+BULK_WRITE_FLUSH_SECONDS = float(os.getenv("BULK_WRITE_FLUSH_SECONDS", 30))
+
+PRODUCT_COLUMNS = [
+  "ecommerce", "category_id", "shop_name", "shop_location", "name", "url",
+  "price", "stock", "sold", "variant_spec", "detail", "media", "reviews", "is_parent",
+  "content_hash"
+] + FACET_COLUMNS
+PRODUCT_UPDATE_COLUMNS = [
+  "shop_name", "shop_location", "name", "price", "stock", "sold",
+  "variant_spec", "detail", "media", "reviews", "content_hash"
+] + FACET_COLUMNS
+# Kolom yang boleh berubah tanpa mengubah fingerprint (tidak memicu re-embedding)
+NUMERIC_COLUMNS = ["price", "stock", "sold"]
+STAGE_PRODUCT_EXTRA = ["seq", "parent_url", "search_text", "full_write"]
+CHUNK_COLUMNS = ["chunk_text", "chunk_type", "embedding", "chunk_meta", "content_hash"]
+# Embedding tidak lewat CSV: dikirim terpisah via COPY binary ke stage_vectors
+STAGE_CHUNK_COPY_COLUMNS = ["chunk_text", "chunk_type", "chunk_meta", "content_hash", "url", "chunk_id", "op", "vector_idx"]
+
+# Sekali per proses: kolom fingerprint di products & product_chunks
+ENSURE_FINGERPRINT_COLUMNS = """
+  ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash TEXT;
+  ALTER TABLE product_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+"""
+
+# Tabel staging meniru tipe kolom tabel asli (vector, jsonb, dst) tanpa constraint
+CREATE_STAGE_PRODUCTS = f"""
+  CREATE TEMP TABLE stage_products ON COMMIT DROP AS
+    SELECT {", ".join(PRODUCT_COLUMNS)} FROM products WITH NO DATA;
+  ALTER TABLE stage_products
+    ADD COLUMN seq INT,
+    ADD COLUMN parent_url TEXT,
+    ADD COLUMN search_text TEXT,
+    ADD COLUMN full_write BOOLEAN;
+"""
+
+# op: insert (chunk baru, sudah di-embed), update (fingerprint sama, teks/meta
+# saja yang berubah), delete (chunk lama yang tidak ada lagi)
+CREATE_STAGE_CHUNKS = f"""
+  CREATE TEMP TABLE stage_chunks ON COMMIT DROP AS
+    SELECT {", ".join(CHUNK_COLUMNS)}, id AS chunk_id FROM product_chunks WITH NO DATA;
+  ALTER TABLE stage_chunks
+    ADD COLUMN url TEXT,
+    ADD COLUMN op TEXT,
+    ADD COLUMN vector_idx INT;
+"""
+
+CREATE_STAGE_VECTORS = """
+  CREATE TEMP TABLE stage_vectors ON COMMIT DROP AS
+    SELECT 0 AS idx, embedding FROM product_chunks WITH NO DATA;
+"""
+
+# Fingerprint yang tersimpan, diambil sebelum embedding supaya chunk yang
+# tidak berubah tidak dikirim ke API sama sekali
+SELECT_PRODUCT_FINGERPRINTS = """
+  SELECT url, id, content_hash FROM products WHERE url = ANY(%s);
+"""
+
+SELECT_CHUNK_FINGERPRINTS = """
+  SELECT p.url, pc.id, pc.chunk_type, pc.content_hash, md5(pc.chunk_text)
+  FROM product_chunks pc
+  JOIN products p ON p.id = pc.product_id
+  WHERE p.url = ANY(%s);
+"""
+
+# Parent/produk tunggal di-merge dulu, lalu varian (parent_id dicari lewat URL parent).
+# DISTINCT ON (url): kalau URL yang sama muncul dua kali di batch, ambil yang terakhir.
+MERGE_PRODUCTS = """
+  INSERT INTO products (
+    {columns}, parent_id, search_tsv, updated_at
+  )
+  SELECT DISTINCT ON (s.url)
+    {stage_columns}, parent.id, to_tsvector('indonesian', s.search_text), NOW()
+  FROM stage_products s
+  LEFT JOIN products parent ON parent.url = s.parent_url
+  WHERE s.full_write AND s.parent_url IS {parent_filter}
+  ORDER BY s.url, s.seq DESC
+  ON CONFLICT (url) DO UPDATE SET
+    {updates},
+    search_tsv = COALESCE(EXCLUDED.search_tsv, products.search_tsv),
+    updated_at = NOW()
+  RETURNING id, url;
+"""
+
+def _merge_query(parent_filter: str) -> str:
+  return MERGE_PRODUCTS.format(
+    columns=", ".join(PRODUCT_COLUMNS),
+    stage_columns=", ".join(f"s.{col}" for col in PRODUCT_COLUMNS),
+    parent_filter=parent_filter,
+    updates=",\n    ".join(f"{col} = EXCLUDED.{col}" for col in PRODUCT_UPDATE_COLUMNS)
+  )
+
+MERGE_PARENTS = _merge_query("NULL")
+MERGE_CHILDREN = _merge_query("NOT NULL")
+
+# Fingerprint sama: hanya harga/stok/terjual, dan hanya kalau memang berubah
+UPDATE_NUMERIC_PRODUCTS = f"""
+  UPDATE products p SET
+    {", ".join(f"{col} = s.{col}" for col in NUMERIC_COLUMNS)},
+    updated_at = NOW()
+  FROM (
+    SELECT DISTINCT ON (url) * FROM stage_products
+    WHERE NOT full_write
+    ORDER BY url, seq DESC
+  ) s
+  WHERE p.url = s.url
+    AND ({", ".join(f"p.{col}" for col in NUMERIC_COLUMNS)})
+      IS DISTINCT FROM ({", ".join(f"s.{col}" for col in NUMERIC_COLUMNS)})
+  RETURNING p.url;
+"""
+
+DELETE_STAGED_CHUNKS = """
+  DELETE FROM product_chunks pc
+  USING stage_chunks c
+  WHERE c.op = 'delete' AND pc.id = c.chunk_id;
+"""
+
+UPDATE_STAGED_CHUNKS = """
+  UPDATE product_chunks pc SET
+    chunk_text = c.chunk_text,
+    chunk_meta = c.chunk_meta
+  FROM stage_chunks c
+  WHERE c.op = 'update' AND pc.id = c.chunk_id;
+"""
+
+INSERT_STAGED_CHUNKS = f"""
+  INSERT INTO product_chunks (product_id, {", ".join(CHUNK_COLUMNS)})
+  SELECT p.id, {", ".join("v.embedding" if col == "embedding" else f"c.{col}" for col in CHUNK_COLUMNS)}
+  FROM stage_chunks c
+  JOIN products p ON p.url = c.url
+  JOIN stage_vectors v ON v.idx = c.vector_idx
+  WHERE c.op = 'insert';
+"""
+
+
+def _fingerprint(*parts) -> str:
+  digest = hashlib.sha256()
+  for part in parts:
+    digest.update(b"" if part is None else str(part).encode("utf-8"))
+    digest.update(b"\x1f")
+  return digest.hexdigest()
+
+
+def product_fingerprint(row: Dict) -> str:
+  """Fingerprint konten produk, tanpa kolom numerik (harga/stok/terjual)."""
+  return _fingerprint(
+    *(row.get(col) for col in PRODUCT_COLUMNS if col not in NUMERIC_COLUMNS and col != "content_hash"),
+    row.get("parent_url"),
+    row.get("search_text")
+  )
+
+
+def chunk_fingerprint(chunk: Dict) -> str:
+  """Fingerprint teks yang di-embed; `fingerprint_text` (kalau ada) = bagian teks yang stabil."""
+  return _fingerprint(chunk.get("chunk_type"), chunk.get("fingerprint_text", chunk["chunk_text"]))
+
+
+def _csv_field(value) -> str:
+  if value is None:
+    return ""
+  if isinstance(value, bool):
+    return "true" if value else "false"
+  if isinstance(value, float) and value.is_integer():
+    return str(int(value))
+  if isinstance(value, (int, float)):
+    return str(value)
+  text = str(value).replace("\x00", "")
+  return '"' + text.replace('"', '""') + '"'
+
+
+def _csv_buffer(rows: List[List]) -> io.StringIO:
+  buf = io.StringIO()
+  for row in rows:
+    buf.write(",".join(_csv_field(value) for value in row))
+    buf.write("\n")
+  buf.seek(0)
+  return buf
+
+
+# ------------------------------------------------------------
+# ProductBulkWriter
+# - Tampung produk + chunk dari satu halaman (atau N produk)
+# - Fingerprint produk & chunk dibandingkan dengan yang tersimpan:
+#   * produk sama (selain harga/stok/terjual) -> hanya kolom numerik di-update
+#   * chunk sama -> tidak dihapus & tidak di-embed ulang (teks/meta di-update
+#     kalau hanya bagian volatile-nya yang berubah)
+# - Embedding chunk baru/berubah dibuat per batch SEBELUM transaksi dibuka
+# - Satu transaksi: COPY ke temp table -> merge ke products (RETURNING id)
+#   -> delete/update/insert chunk set-based
+#
+# Baris produk: dict berisi PRODUCT_COLUMNS + parent_url (None untuk
+# parent/produk tunggal) + search_text (None = search_tsv tidak diubah).
+# Baris chunk: dict berisi url, chunk_text, chunk_type, chunk_meta, dan
+# opsional fingerprint_text.
+#
+# add(..., key=url_sumber) mencatat key yang ikut flush; take_committed()
+# mengembalikan key yang transaksinya sudah commit (untuk checkpoint frontier).
+# Flush yang gagal mengembalikan isi buffer, jadi dicoba lagi di flush berikutnya.
+# ------------------------------------------------------------
+class ProductBulkWriter:
+  def __init__(
+    self,
+    get_conn: Callable,
+    embed_batch: Callable[[List[str]], List[Embedding]],
+    max_batch_size: int,
+    max_batch_tokens: int,
+    max_products: int = BULK_WRITE_MAX_PRODUCTS,
+    flush_interval: float = BULK_WRITE_FLUSH_SECONDS
+  ):
+    self.get_conn = get_conn
+    self.embed_batch = embed_batch
+    self.max_batch_size = max_batch_size
+    self.max_batch_tokens = max_batch_tokens
+    self.max_products = max_products
+    self.flush_interval = flush_interval
+    self._product_rows: List[Dict] = []
+    self._chunk_rows: List[Dict] = []
+    self._pending_products = 0
+    self._oldest: Optional[float] = None
+    self._keys: List[str] = []
+    self._committed: List[str] = []
+    self._schema_ready = False
+
+  def __len__(self):
+    return self._pending_products
+
+  def add(self, product_rows: List[Dict], chunk_rows: List[Dict], key: Optional[str] = None):
+    if not product_rows:
+      return
+    if self._oldest is None:
+      self._oldest = time.monotonic()
+
+    # Produk yang sama di-scrape ulang sebelum flush: versi lama dibuang
+    urls = {row["url"] for row in product_rows}
+    if any(row["url"] in urls for row in self._product_rows):
+      self._product_rows = [row for row in self._product_rows if row["url"] not in urls]
+      self._chunk_rows = [chunk for chunk in self._chunk_rows if chunk["url"] not in urls]
+
+    self._product_rows.extend(product_rows)
+    self._chunk_rows.extend(chunk_rows)
+    self._pending_products += 1
+    if key:
+      self._keys.append(key)
+
+    if self._pending_products >= self.max_products or time.monotonic() - self._oldest >= self.flush_interval:
+      try:
+        self.flush()
+      except Exception as e:
+        # Buffer sudah dikembalikan oleh flush(); produk ini tetap tertampung
+        logger.error(f"Bulk write otomatis gagal, dicoba lagi di flush berikutnya: {e}")
+
+  def take_committed(self) -> List[str]:
+    """Key dari add() yang sudah commit sejak panggilan sebelumnya."""
+    committed, self._committed = list(dict.fromkeys(self._committed)), []
+    return committed
+
+  def flush(self) -> Dict[str, object]:
+    """Tulis semua yang tertampung; return mapping url -> product id."""
+    buffered = (self._product_rows, self._chunk_rows, self._pending_products, self._oldest, self._keys)
+    product_rows, chunk_rows, _, _, keys = buffered
+    self._product_rows, self._chunk_rows, self._keys = [], [], []
+    self._pending_products = 0
+    self._oldest = None
+    if not product_rows:
+      return {}
+
+    try:
+      ids = self._flush(product_rows, chunk_rows)
+    except Exception:
+      self._restore(*buffered)
+      raise
+    self._committed.extend(keys)
+    return ids
+
+  def _restore(self, product_rows, chunk_rows, pending, oldest, keys):
+    # Produk yang ditambahkan sejak flush dimulai (versi lebih baru) menang
+    urls = {row["url"] for row in self._product_rows}
+    self._product_rows = [row for row in product_rows if row["url"] not in urls] + self._product_rows
+    self._chunk_rows = [chunk for chunk in chunk_rows if chunk["url"] not in urls] + self._chunk_rows
+    self._pending_products += pending
+    self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+    self._keys = keys + self._keys
+
+  def _flush(self, product_rows: List[Dict], chunk_rows: List[Dict]) -> Dict[str, object]:
+    start = time.perf_counter()
+    conn = self.get_conn()
+    self._ensure_schema(conn)
+
+    for row in product_rows:
+      row["content_hash"] = product_fingerprint(row)
+    for chunk in chunk_rows:
+      chunk["content_hash"] = chunk_fingerprint(chunk)
+
+    stored_products, stored_chunks = self._load_fingerprints(conn, [row["url"] for row in product_rows])
+    for row in product_rows:
+      stored = stored_products.get(row["url"])
+      row["full_write"] = stored is None or stored[1] != row["content_hash"]
+
+    new_chunks, staged_chunks = self._diff_chunks(product_rows, chunk_rows, stored_chunks)
+    embedded_chunks, vectors = self._embed_chunks(new_chunks)
+    staged_chunks.extend(embedded_chunks)
+
+    ids = {url: product_id for url, (product_id, _) in stored_products.items()}
+    ids.update(self._write(conn, product_rows, staged_chunks, vectors))
+
+    written = sum(1 for row in product_rows if row["full_write"])
+    logger.info(
+      f"Bulk write: {written}/{len(product_rows)} produk ditulis penuh, "
+      f"{len(new_chunks)}/{len(chunk_rows)} chunk di-embed "
+      f"dalam {time.perf_counter() - start:.2f}s"
+    )
+    return ids
+
+  def _ensure_schema(self, conn):
+    if self._schema_ready:
+      return
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+      with conn.cursor() as cur:
+        cur.execute(ENSURE_FINGERPRINT_COLUMNS)
+        cur.execute(CREATE_GENERATION_TABLE)
+    finally:
+      conn.autocommit = autocommit
+    ensure_facet_schema(conn)
+    self._schema_ready = True
+
+  def _load_fingerprints(self, conn, urls: List[str]) -> Tuple[Dict, Dict]:
+    with conn.cursor() as cur:
+      cur.execute(SELECT_PRODUCT_FINGERPRINTS, (urls,))
+      stored_products = {url: (product_id, content_hash) for url, product_id, content_hash in cur.fetchall()}
+
+      stored_chunks: Dict[str, List[Tuple]] = {}
+      if stored_products:
+        cur.execute(SELECT_CHUNK_FINGERPRINTS, (list(stored_products),))
+        for url, chunk_id, chunk_type, content_hash, text_md5 in cur.fetchall():
+          stored_chunks.setdefault(url, []).append((chunk_id, chunk_type, content_hash, text_md5))
+    return stored_products, stored_chunks
+
+  def _diff_chunks(self, product_rows: List[Dict], chunk_rows: List[Dict], stored_chunks: Dict[str, List[Tuple]]) -> Tuple[List[Dict], List[List]]:
+    """Pisahkan chunk yang perlu di-embed; sisanya jadi baris staging update/delete."""
+    new_chunks, staged = [], []
+    by_url: Dict[str, List[Dict]] = {row["url"]: [] for row in product_rows}
+    for chunk in chunk_rows:
+      by_url.setdefault(chunk["url"], []).append(chunk)
+
+    for url, chunks in by_url.items():
+      available: Dict[Tuple, List[Tuple]] = {}
+      for stored in stored_chunks.get(url, []):
+        chunk_id, chunk_type, content_hash, _ = stored
+        if content_hash:
+          available.setdefault((chunk_type, content_hash), []).append(stored)
+
+      kept_ids = set()
+      for chunk in chunks:
+        matches = available.get((chunk.get("chunk_type"), chunk["content_hash"]))
+        if not matches:
+          new_chunks.append(chunk)
+          continue
+        chunk_id, _, _, text_md5 = matches.pop(0)
+        kept_ids.add(chunk_id)
+        if text_md5 != hashlib.md5(chunk["chunk_text"].encode("utf-8")).hexdigest():
+          staged.append(self._stage_chunk(chunk, None, chunk_id, "update"))
+
+      for chunk_id, chunk_type, content_hash, _ in stored_chunks.get(url, []):
+        if chunk_id not in kept_ids:
+          staged.append([None, chunk_type, None, content_hash, url, chunk_id, "delete", None])
+
+    return new_chunks, staged
+
+  @staticmethod
+  def _stage_chunk(chunk: Dict, vector_idx: Optional[int], chunk_id, op: str) -> List:
+    return [
+      chunk["chunk_text"],
+      chunk.get("chunk_type"),
+      chunk.get("chunk_meta"),
+      chunk["content_hash"],
+      chunk["url"],
+      chunk_id,
+      op,
+      vector_idx
+    ]
+
+  def _embed_chunks(self, chunk_rows: List[Dict]) -> Tuple[List[List], List]:
+    results = []
+    batcher = EmbeddingBatcher(
+      self.embed_batch,
+      results.extend,
+      max_batch_size=self.max_batch_size,
+      max_batch_tokens=self.max_batch_tokens,
+      flush_interval=float("inf")
+    )
+    for chunk in chunk_rows:
+      batcher.submit(chunk, chunk["chunk_text"])
+    batcher.flush()
+
+    staged, vectors = [], []
+    for chunk, embedding in results:
+      if embedding:
+        staged.append(self._stage_chunk(chunk, len(vectors), None, "insert"))
+        vectors.append((len(vectors), to_vector(embedding)))
+      else:
+        print(f"   ❌ Gagal membuat embedding untuk '{chunk.get('chunk_type') or 'name'}'.")
+    return staged, vectors
+
+  def _write(self, conn, product_rows: List[Dict], staged_chunks: List[List], vectors: List) -> Dict[str, object]:
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+      with conn.cursor() as cur:
+        cur.execute(CREATE_STAGE_PRODUCTS)
+        stage_rows = [
+          [row.get(col) for col in PRODUCT_COLUMNS]
+          + [seq, row.get("parent_url"), row.get("search_text"), row["full_write"]]
+          for seq, row in enumerate(product_rows)
+        ]
+        cur.copy_expert(
+          f"COPY stage_products ({', '.join(PRODUCT_COLUMNS + STAGE_PRODUCT_EXTRA)}) FROM STDIN WITH (FORMAT csv)",
+          _csv_buffer(stage_rows)
+        )
+
+        ids = {}
+        cur.execute(MERGE_PARENTS)
+        ids.update({url: product_id for product_id, url in cur.fetchall()})
+        cur.execute(MERGE_CHILDREN)
+        ids.update({url: product_id for product_id, url in cur.fetchall()})
+        cur.execute(UPDATE_NUMERIC_PRODUCTS)
+        changed_urls = set(ids) | {url for (url,) in cur.fetchall()}
+
+        if staged_chunks:
+          cur.execute(CREATE_STAGE_CHUNKS)
+          cur.copy_expert(
+            f"COPY stage_chunks ({', '.join(STAGE_CHUNK_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            _csv_buffer(staged_chunks)
+          )
+          cur.execute(DELETE_STAGED_CHUNKS)
+          cur.execute(UPDATE_STAGED_CHUNKS)
+          if vectors:
+            cur.execute(CREATE_STAGE_VECTORS)
+            copy_vectors(cur, "stage_vectors", ["idx", "embedding"], vectors)
+            cur.execute(INSERT_STAGED_CHUNKS)
+          changed_urls.update(chunk[4] for chunk in staged_chunks)
+
+        # Cache hasil pencarian kategori yang produknya berubah jadi basi
+        invalidate_categories(cur, {row.get("category_id") for row in product_rows if row["url"] in changed_urls})
+
+      conn.commit()
+      return ids
+
+    except Exception:
+      conn.rollback()
+      raise
+    finally:
+      conn.autocommit = autocommit
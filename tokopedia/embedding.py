@@ -0,0 +1,188 @@
+import os
+import time
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from http_client import get_session
+from embedding_cache import get_embedding_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+Embedding = Optional[List[float]]
+
+OLLAMA_EMBED_URL = os.getenv("OLLAMA_EMBED_URL", "http://localhost:11434/api/embed")
+OLLAMA_EMBED_MODEL = "all-minilm:l6-v2"
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+
+# Batas per request. Token diestimasi ~4 karakter per token (cukup untuk
+# membatasi ukuran request, tidak perlu tokenizer).
+OLLAMA_MAX_BATCH_SIZE = 64
+OLLAMA_MAX_BATCH_TOKENS = 8000
+OPENAI_MAX_BATCH_SIZE = 256
+OPENAI_MAX_BATCH_TOKENS = 100000
+EMBED_FLUSH_INTERVAL_SECONDS = float(os.getenv("EMBED_FLUSH_INTERVAL_SECONDS", 2))
+
+_openai_client = None
+
+
+def estimate_tokens(text: str) -> int:
+  return max(1, len(text) // 4)
+
+
+# ------------------------------------------------------------
+# PROVIDER: satu request untuk banyak teks, urutan output = urutan input
+# - Selalu lewat embedding cache (kalau aktif); hanya teks yang miss
+#   yang benar-benar dikirim ke API
+# ------------------------------------------------------------
+def _cached(model: str, texts: List[str], fetch) -> List[Embedding]:
+  cache = get_embedding_cache()
+  if cache is None:
+    return fetch(texts)
+  return cache.embed(model, texts, fetch)
+
+
+def ollama_embed_batch(texts: List[str], model: str = OLLAMA_EMBED_MODEL) -> List[Embedding]:
+  return _cached(model, texts, lambda missing: _ollama_request(missing, model))
+
+
+def _ollama_request(texts: List[str], model: str) -> List[Embedding]:
+  try:
+    response = get_session().post(
+      OLLAMA_EMBED_URL,
+      json={"model": model, "input": texts},
+      timeout=60
+    )
+    if response.status_code != 200:
+      print("HTTP Error:", response.status_code)
+      return [None] * len(texts)
+
+    res = response.json()
+    embeddings = res.get("embeddings")
+    if isinstance(embeddings, list) and len(embeddings) == len(texts):
+      return embeddings
+
+    print("Respons embedding tidak valid.")
+    return [None] * len(texts)
+
+  except Exception as e:
+    print(f"Embedding error: {e}")
+    return [None] * len(texts)
+
+
+def get_openai_client():
+  global _openai_client
+  if _openai_client is None:
+    from openai import OpenAI
+    _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+  return _openai_client
+
+
+def openai_embed_batch(texts: List[str], model: str = OPENAI_EMBED_MODEL) -> List[Embedding]:
+  return _cached(model, texts, lambda missing: _openai_request(missing, model))
+
+
+def _openai_request(texts: List[str], model: str) -> List[Embedding]:
+  try:
+    response = get_openai_client().embeddings.create(model=model, input=texts)
+    embeddings: List[Embedding] = [None] * len(texts)
+    for item in response.data:
+      embeddings[item.index] = item.embedding
+    return embeddings
+
+  except Exception as e:
+    print("Embedding error:", e)
+    return [None] * len(texts)
+
+
+# ------------------------------------------------------------
+# EmbeddingBatcher
+# - Kumpulkan teks (lintas produk/varian) beserta payload baris tujuannya
+# - Kirim per batch (dibatasi jumlah teks & estimasi token)
+# - Hasil dikembalikan ke sink sebagai list (payload, embedding)
+# - Flush otomatis saat batch penuh atau item tertua melewati deadline;
+#   pemanggil tetap wajib flush() di akhir unit kerja (mis. satu halaman)
+# ------------------------------------------------------------
+class EmbeddingBatcher:
+  def __init__(
+    self,
+    embed_batch: Callable[[List[str]], List[Embedding]],
+    sink: Callable[[List[Tuple[Any, Embedding]]], None],
+    max_batch_size: int,
+    max_batch_tokens: int,
+    flush_interval: float = EMBED_FLUSH_INTERVAL_SECONDS
+  ):
+    self.embed_batch = embed_batch
+    self.sink = sink
+    self.max_batch_size = max_batch_size
+    self.max_batch_tokens = max_batch_tokens
+    self.flush_interval = flush_interval
+    self._pending: List[Tuple[Any, str, int]] = []
+    self._pending_tokens = 0
+    self._oldest: Optional[float] = None
+
+  def __len__(self):
+    return len(self._pending)
+
+  def submit(self, payload: Any, text: str):
+    tokens = estimate_tokens(text)
+    if self._pending and (
+      len(self._pending) >= self.max_batch_size
+      or self._pending_tokens + tokens > self.max_batch_tokens
+    ):
+      self._send(self._take_batch())
+
+    if self._oldest is None:
+      self._oldest = time.monotonic()
+    self._pending.append((payload, text, tokens))
+    self._pending_tokens += tokens
+
+    if len(self._pending) >= self.max_batch_size:
+      self._send(self._take_batch())
+    else:
+      self.flush_if_due()
+
+  def discard(self, predicate: Callable[[Any], bool]):
+    """Buang item pending yang payload-nya cocok (mis. produk yang baru di-reset)."""
+    kept = [item for item in self._pending if not predicate(item[0])]
+    if len(kept) != len(self._pending):
+      self._pending = kept
+      self._pending_tokens = sum(item[2] for item in kept)
+      if not kept:
+        self._oldest = None
+
+  def flush_if_due(self):
+    if self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval:
+      self.flush()
+
+  def flush(self):
+    while self._pending:
+      self._send(self._take_batch())
+
+  def _take_batch(self) -> List[Tuple[Any, str, int]]:
+    batch, tokens = [], 0
+    while self._pending and len(batch) < self.max_batch_size:
+      item = self._pending[0]
+      if batch and tokens + item[2] > self.max_batch_tokens:
+        break
+      batch.append(self._pending.pop(0))
+      tokens += item[2]
+
+    self._pending_tokens -= tokens
+    if not self._pending:
+      self._oldest = None
+    return batch
+
+  def _send(self, batch: List[Tuple[Any, str, int]]):
+    if not batch:
+      return
+    texts = [text for _, text, _ in batch]
+    start = time.perf_counter()
+    embeddings = self.embed_batch(texts)
+    cache = get_embedding_cache()
+    cache_info = f" (cache {cache.stats()['hit_rate']:.0%} hit)" if cache else ""
+    logger.info(f"Embedding batch: {len(texts)} teks dalam {time.perf_counter() - start:.2f}s{cache_info}")
+    self.sink([(payload, embedding) for (payload, _, _), embedding in zip(batch, embeddings)])
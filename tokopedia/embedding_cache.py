@@ -0,0 +1,276 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+Embedding = Optional[List[float]]
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embedding_cache.sqlite3")
+EMBED_CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", 512))
+# Tabel embedding_cache di Postgres, dipakai bersama antar mesin (opsional)
+EMBED_CACHE_PG = os.getenv("EMBED_CACHE_PG", "0") == "1"
+
+
+def normalize_text(text: str) -> str:
+  text = unicodedata.normalize("NFC", text or "")
+  return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+  return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _pack(embedding: List[float]) -> bytes:
+  return array("f", embedding).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+  values = array("f")
+  values.frombytes(blob)
+  return values.tolist()
+
+
+# ------------------------------------------------------------
+# EmbeddingCache
+# - key = sha256(model + teks ternormalisasi) -> vektor float32
+# - Store lokal SQLite dengan eviction LRU berdasarkan total ukuran
+# - Opsional: tabel Postgres sebagai layer kedua (hasilnya ditulis balik ke lokal)
+# ------------------------------------------------------------
+class EmbeddingCache:
+  def __init__(self, path: str = EMBED_CACHE_PATH, max_bytes: int = int(EMBED_CACHE_MAX_MB * 1024 * 1024), pg_conn_factory: Optional[Callable] = None):
+    self.path = path
+    self.max_bytes = max_bytes
+    self.pg_conn_factory = pg_conn_factory
+    self._pg_conn = None
+    self.hits = 0
+    self.pg_hits = 0
+    self.misses = 0
+
+    # Koneksi SQLite per thread (sqlite3 menolak koneksi dipakai lintas thread);
+    # counter dan ukuran total dijaga lock
+    self._lock = threading.Lock()
+    self._thread = threading.local()
+
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    self._db.execute("""
+      CREATE TABLE IF NOT EXISTS embeddings (
+        key       TEXT PRIMARY KEY,
+        model     TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        size      INTEGER NOT NULL,
+        last_used REAL NOT NULL
+      );
+    """)
+    self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used);")
+    self._db.commit()
+    self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings;").fetchone()[0]
+
+  @property
+  def _db(self) -> sqlite3.Connection:
+    db = getattr(self._thread, "db", None)
+    if db is None:
+      db = self._thread.db = sqlite3.connect(self.path, timeout=30)
+      db.execute("PRAGMA journal_mode=WAL;")
+      db.execute("PRAGMA synchronous=NORMAL;")
+    return db
+
+  def stats(self) -> Dict:
+    lookups = self.hits + self.pg_hits + self.misses
+    return {
+      "hits": self.hits,
+      "pg_hits": self.pg_hits,
+      "misses": self.misses,
+      "hit_rate": (self.hits + self.pg_hits) / lookups if lookups else 0.0,
+      "bytes": self._total_bytes
+    }
+
+  # ---------------- lookup ----------------
+  def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+    if not keys:
+      return {}
+    found: Dict[str, List[float]] = {}
+    unique_keys = list(dict.fromkeys(keys))
+
+    for start in range(0, len(unique_keys), 500):
+      part = unique_keys[start:start + 500]
+      placeholders = ",".join("?" * len(part))
+      rows = self._db.execute(f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders});", part).fetchall()
+      for key, blob in rows:
+        found[key] = _unpack(blob)
+
+    if found:
+      now = time.time()
+      self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?;", [(now, key) for key in found])
+      self._db.commit()
+
+    local_hits = len(found)
+    missing = [key for key in unique_keys if key not in found]
+    pg_found = self._pg_get_many(missing) if missing and self.pg_conn_factory else {}
+    if pg_found:
+      self._local_put(pg_found)
+      found.update({key: vec for key, (_, vec) in pg_found.items()})
+
+    with self._lock:
+      self.hits += local_hits
+      self.pg_hits += len(pg_found)
+      self.misses += len(unique_keys) - len(found)
+    return found
+
+  # ---------------- store ----------------
+  def put_many(self, model: str, entries: Dict[str, List[float]]):
+    if not entries:
+      return
+    self._local_put({key: (model, vec) for key, vec in entries.items()})
+    if self.pg_conn_factory:
+      self._pg_put_many(model, entries)
+
+  def _local_put(self, entries: Dict):
+    now = time.time()
+    db = self._db
+    inserted_bytes, existing = 0, []
+    # Hanya baris yang benar-benar baru menambah ukuran; key yang sudah ada cukup di-touch
+    for key, (model, vec) in entries.items():
+      blob = _pack(vec)
+      cur = db.execute("""
+        INSERT INTO embeddings (key, model, embedding, size, last_used)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(key) DO NOTHING;
+      """, (key, model, blob, len(blob), now))
+      if cur.rowcount == 1:
+        inserted_bytes += len(blob)
+      else:
+        existing.append((now, key))
+    if existing:
+      db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?;", existing)
+    db.commit()
+
+    with self._lock:
+      self._total_bytes += inserted_bytes
+      over = self._total_bytes > self.max_bytes
+    if over:
+      self._evict()
+
+  def _evict(self):
+    # Hitung ulang (proses lain bisa ikut menulis), lalu buang yang paling lama tidak dipakai
+    db = self._db
+    with self._lock:
+      total = db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings;").fetchone()[0]
+      target = int(self.max_bytes * 0.9)
+      evicted = 0
+      while total > target:
+        rows = db.execute("SELECT key, size FROM embeddings ORDER BY last_used LIMIT 1000;").fetchall()
+        if not rows:
+          break
+        drop, freed = [], 0
+        for key, size in rows:
+          drop.append((key,))
+          freed += size
+          if total - freed <= target:
+            break
+        db.executemany("DELETE FROM embeddings WHERE key = ?;", drop)
+        total -= freed
+        evicted += len(drop)
+      db.commit()
+      self._total_bytes = total
+    logger.info(f"Embedding cache: {evicted} entri di-evict (LRU).")
+
+  # ---------------- postgres (opsional) ----------------
+  def _pg(self):
+    # Koneksi psycopg2 aman dipakai lintas thread; yang perlu dijaga hanya pembuatannya
+    with self._lock:
+      if self._pg_conn is None or self._pg_conn.closed:
+        self._pg_conn = self.pg_conn_factory()
+        self._pg_conn.autocommit = True
+        with self._pg_conn.cursor() as cur:
+          cur.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+              key         TEXT PRIMARY KEY,
+              model       TEXT NOT NULL,
+              embedding   BYTEA NOT NULL,
+              created_at  TIMESTAMP DEFAULT NOW()
+            );
+          """)
+      return self._pg_conn
+
+  def _pg_get_many(self, keys: List[str]) -> Dict:
+    try:
+      with self._pg().cursor() as cur:
+        cur.execute("SELECT key, model, embedding FROM embedding_cache WHERE key = ANY(%s);", (keys,))
+        return {key: (model, _unpack(bytes(blob))) for key, model, blob in cur.fetchall()}
+    except Exception as e:
+      logger.warning(f"Embedding cache Postgres tidak bisa dibaca: {e}")
+      return {}
+
+  def _pg_put_many(self, model: str, entries: Dict[str, List[float]]):
+    from psycopg2.extras import execute_values
+    try:
+      with self._pg().cursor() as cur:
+        execute_values(cur, """
+          INSERT INTO embedding_cache (key, model, embedding) VALUES %s
+          ON CONFLICT (key) DO NOTHING;
+        """, [(key, model, _pack(vec)) for key, vec in entries.items()])
+    except Exception as e:
+      logger.warning(f"Embedding cache Postgres tidak bisa ditulis: {e}")
+
+  # ---------------- wrapper ----------------
+  def embed(self, model: str, texts: List[str], fetch: Callable[[List[str]], List[Embedding]]) -> List[Embedding]:
+    """Ambil embedding dari cache; hanya teks unik yang miss yang dikirim ke `fetch`."""
+    keys = [cache_key(model, text) for text in texts]
+    found = self.get_many(keys)
+
+    miss_texts: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+      if key not in found and key not in miss_texts:
+        miss_texts[key] = text
+
+    if miss_texts:
+      fetched = fetch(list(miss_texts.values()))
+      new_entries = {key: vec for key, vec in zip(miss_texts.keys(), fetched) if vec}
+      self.put_many(model, new_entries)
+      found.update(new_entries)
+
+    return [found.get(key) for key in keys]
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_pid: Optional[int] = None
+
+
+def _pg_connect():
+  import psycopg2
+  return psycopg2.connect(
+    host=os.getenv("DB_HOST"),
+    port=os.getenv("DB_PORT"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    dbname=os.getenv("DB_NAME"),
+    connect_timeout=5
+  )
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+  """Cache per proses (koneksi SQLite/Postgres tidak dibawa lintas fork); None kalau dimatikan."""
+  global _cache, _cache_pid
+  if not EMBED_CACHE_ENABLED:
+    return None
+  if _cache is None or _cache_pid != os.getpid():
+    _cache = EmbeddingCache(pg_conn_factory=_pg_connect if EMBED_CACHE_PG else None)
+    _cache_pid = os.getpid()
+  return _cache
@@ -0,0 +1,191 @@
+"""
+Kolom facet produk (color, storage_gb, ram_gb, condition, city) untuk filter
+pencarian, diturunkan dari variant_spec / detail / shop_location
+
+Jalankan (dari folder tokopedia/):
+  python facets.py ensure            # tambah kolom + index facet
+  python facets.py backfill [batch]  # isi facet produk lama dari JSON-nya
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+from typing import Dict, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+from query_parser import COLOR_RE, CONDITIONS, parse_query
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FACET_COLUMNS = ["color", "storage_gb", "ram_gb", "condition", "city"]
+
+# Satu statement per item: CREATE INDEX CONCURRENTLY tidak boleh digabung
+ENSURE_FACET_SCHEMA = [
+  """
+  ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS color TEXT,
+    ADD COLUMN IF NOT EXISTS storage_gb INTEGER,
+    ADD COLUMN IF NOT EXISTS ram_gb INTEGER,
+    ADD COLUMN IF NOT EXISTS condition TEXT,
+    ADD COLUMN IF NOT EXISTS city TEXT;
+  """,
+  "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+  # ILIKE '%hitam%' / '%jakarta%' bisa memakai index trigram
+  "CREATE INDEX CONCURRENTLY IF NOT EXISTS products_color_trgm_idx ON products USING gin (color gin_trgm_ops);",
+  "CREATE INDEX CONCURRENTLY IF NOT EXISTS products_city_trgm_idx ON products USING gin (city gin_trgm_ops);",
+  "CREATE INDEX CONCURRENTLY IF NOT EXISTS products_facets_idx ON products (category_id, condition, storage_gb, ram_gb);",
+]
+
+COLOR_KEYS = ("warna", "color", "colour")
+CITY_PREFIX = re.compile(r"^(?:kota|kab\.?|kabupaten)\s+")
+
+
+# ------------------------------------------------------------
+# NORMALISASI
+# - Dipakai dua sisi: writer (isi kolom) dan pencarian (nilai filter),
+#   jadi nilai yang dibandingkan selalu sudah dalam bentuk yang sama
+# ------------------------------------------------------------
+def size_gb(value) -> Optional[int]:
+  """'128GB' -> 128, '1TB' -> 1024, 8 -> 8; None kalau tidak bisa dibaca."""
+  if isinstance(value, int):
+    return value
+  match = re.fullmatch(r"\s*(\d+)\s*(gb|tb|g)?\s*", str(value or ""), re.IGNORECASE)
+  if not match:
+    return None
+  n = int(match.group(1))
+  return n * 1024 if (match.group(2) or "").lower() == "tb" else n
+
+
+def normalize_condition(value) -> Optional[str]:
+  value = " ".join(str(value or "").lower().split())
+  return CONDITIONS.get(value, value) or None
+
+
+def normalize_city(value) -> Optional[str]:
+  value = " ".join(str(value or "").lower().split())
+  return CITY_PREFIX.sub("", value) or None
+
+
+def _as_dict(value) -> Dict:
+  if isinstance(value, str):
+    try:
+      value = json.loads(value)
+    except ValueError:
+      return {}
+  return value if isinstance(value, dict) else {}
+
+
+def extract_facets(variant_spec, detail, shop_location) -> Dict:
+  """Facet satu baris produk; variant_spec/detail boleh dict atau string JSON."""
+  variant_spec, detail = _as_dict(variant_spec), _as_dict(detail)
+  values = [str(v).strip() for v in variant_spec.values() if v]
+
+  color = next((str(variant_spec[k]) for k in COLOR_KEYS if variant_spec.get(k)), None)
+  if color is None:
+    color = next((v for v in values if COLOR_RE.search(v.lower())), None)
+
+  # "8/256GB", "128GB", "RAM 8GB" dibaca dengan pola yang sama dengan parser kueri
+  memory = parse_query(" ".join(values))["filters"] if values else {}
+
+  return {
+    "color": " ".join(color.lower().split()) if color else None,
+    "storage_gb": size_gb(memory.get("storage")),
+    "ram_gb": size_gb(memory.get("ram")),
+    "condition": normalize_condition(detail.get("kondisi")),
+    "city": normalize_city(shop_location),
+  }
+
+
+# ------------------------------------------------------------
+# SCHEMA & BACKFILL
+# ------------------------------------------------------------
+def ensure_schema(conn):
+  autocommit = conn.autocommit
+  conn.autocommit = True
+  try:
+    with conn.cursor() as cur:
+      for statement in ENSURE_FACET_SCHEMA:
+        cur.execute(statement)
+  finally:
+    conn.autocommit = autocommit
+
+
+def backfill(conn, batch_size: int = 5000):
+  """Hitung ulang facet semua produk (keyset per id), tulis lewat COPY + UPDATE join."""
+  from db_writer import _csv_buffer
+
+  last_id, total = None, 0
+  while True:
+    with conn.cursor() as cur:
+      cur.execute(f"""
+        SELECT id, variant_spec, detail, shop_location
+        FROM products
+        {"WHERE id > %s" if last_id is not None else ""}
+        ORDER BY id
+        LIMIT %s;
+      """, ((last_id, batch_size) if last_id is not None else (batch_size,)))
+      rows = cur.fetchall()
+      if not rows:
+        break
+
+      stage = []
+      for product_id, variant_spec, detail, shop_location in rows:
+        facets = extract_facets(variant_spec, detail, shop_location)
+        stage.append([product_id] + [facets[col] for col in FACET_COLUMNS])
+
+      cur.execute(f"""
+        CREATE TEMP TABLE stage_facets ON COMMIT DROP AS
+          SELECT id, {", ".join(FACET_COLUMNS)} FROM products WITH NO DATA;
+      """)
+      cur.copy_expert(
+        f"COPY stage_facets (id, {', '.join(FACET_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _csv_buffer(stage)
+      )
+      cur.execute(f"""
+        UPDATE products p SET {", ".join(f"{col} = s.{col}" for col in FACET_COLUMNS)}
+        FROM stage_facets s
+        WHERE p.id = s.id
+          AND ({", ".join(f"p.{col}" for col in FACET_COLUMNS)})
+            IS DISTINCT FROM ({", ".join(f"s.{col}" for col in FACET_COLUMNS)});
+      """)
+      updated = cur.rowcount
+    conn.commit()
+
+    last_id = rows[-1][0]
+    total += len(rows)
+    print(f"Backfill facet: {total} produk diproses ({updated} berubah di batch ini).")
+
+
+def connect_db():
+  return psycopg2.connect(
+    host=os.getenv("DB_HOST"),
+    port=os.getenv("DB_PORT"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    dbname=os.getenv("DB_NAME")
+  )
+
+
+def main():
+  command = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+  conn = connect_db()
+  try:
+    if command == "ensure":
+      ensure_schema(conn)
+    elif command == "backfill":
+      ensure_schema(conn)
+      backfill(conn, int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    else:
+      print(__doc__)
+  finally:
+    conn.close()
+
+
+if __name__ == "__main__":
+  main()
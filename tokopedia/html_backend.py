@@ -0,0 +1,185 @@
+import os
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# HTML BACKEND
+# - auto: selectolax -> lxml -> bs4 (html.parser), mana yang terpasang
+# - Bisa dipaksa lewat env HTML_BACKEND=selectolax|lxml|bs4
+# - Selector CSS di-compile sekali per backend (compile() di-memo),
+#   jadi selector yang sama dipakai ulang untuk ribuan blok tanpa di-parse lagi
+# - Node dibaca lewat text() / attr() / child() supaya pemanggil tidak
+#   bergantung pada API masing-masing library
+# ------------------------------------------------------------
+HTML_BACKEND = os.getenv("HTML_BACKEND", "auto")
+BACKEND_PRIORITY = ["selectolax", "lxml", "bs4"]
+
+
+class Selector:
+  def __init__(self, select_all: Callable[[Any], List[Any]], select_first: Callable[[Any], Optional[Any]]):
+    self.all = select_all
+    self.first = select_first
+
+
+class HtmlBackend:
+  name = ""
+
+  def __init__(self):
+    self._compiled: Dict[str, Selector] = {}
+
+  def compile(self, selector: str) -> Selector:
+    compiled = self._compiled.get(selector)
+    if compiled is None:
+      compiled = self._compiled[selector] = self._compile(selector)
+    return compiled
+
+  def select(self, node, selector: str) -> List[Any]:
+    return self.compile(selector).all(node)
+
+  def select_one(self, node, selector: str) -> Optional[Any]:
+    return self.compile(selector).first(node)
+
+  def parse(self, html: str):
+    raise NotImplementedError
+
+  def _compile(self, selector: str) -> Selector:
+    raise NotImplementedError
+
+  def text(self, node) -> str:
+    """Teks node, tiap potongan di-strip lalu digabung (= get_text(strip=True))."""
+    raise NotImplementedError
+
+  def attr(self, node, name: str) -> Optional[str]:
+    raise NotImplementedError
+
+  def child(self, node, tag: str) -> Optional[Any]:
+    """Anak langsung pertama dengan tag tertentu (= find(tag, recursive=False))."""
+    raise NotImplementedError
+
+
+class SelectolaxBackend(HtmlBackend):
+  name = "selectolax"
+
+  def __init__(self):
+    super().__init__()
+    from selectolax.lexbor import LexborHTMLParser
+    self._parser = LexborHTMLParser
+
+  def parse(self, html: str):
+    return self._parser(html)
+
+  def _compile(self, selector: str) -> Selector:
+    # Tidak ada API compile publik; selector sudah diproses di C per panggilan
+    return Selector(lambda node: node.css(selector), lambda node: node.css_first(selector))
+
+  def text(self, node) -> str:
+    return node.text(strip=True)
+
+  def attr(self, node, name: str) -> Optional[str]:
+    return node.attributes.get(name)
+
+  def child(self, node, tag: str) -> Optional[Any]:
+    return next((c for c in node.iter() if c.tag == tag), None)
+
+
+class LxmlBackend(HtmlBackend):
+  name = "lxml"
+
+  def __init__(self):
+    super().__init__()
+    from lxml import html as lxml_html
+    from lxml.cssselect import CSSSelector
+    self._document = lxml_html.document_fromstring
+    self._selector = CSSSelector
+
+  def parse(self, html: str):
+    return self._document(html)
+
+  def _compile(self, selector: str) -> Selector:
+    # CSS -> XPath sekali, hasilnya objek XPath yang ter-compile
+    xpath = self._selector(selector, translator="html")
+    return Selector(xpath, lambda node: next(iter(xpath(node)), None))
+
+  def text(self, node) -> str:
+    return "".join(part.strip() for part in node.itertext())
+
+  def attr(self, node, name: str) -> Optional[str]:
+    return node.get(name)
+
+  def child(self, node, tag: str) -> Optional[Any]:
+    return next((c for c in node if c.tag == tag), None)
+
+
+class Bs4Backend(HtmlBackend):
+  name = "bs4"
+
+  def __init__(self):
+    super().__init__()
+    from bs4 import BeautifulSoup
+    import soupsieve
+    self._soup = BeautifulSoup
+    self._soupsieve = soupsieve
+
+  def parse(self, html: str):
+    return self._soup(html, "html.parser")
+
+  def _compile(self, selector: str) -> Selector:
+    pattern = self._soupsieve.compile(selector)
+    return Selector(pattern.select, pattern.select_one)
+
+  def text(self, node) -> str:
+    return node.get_text(strip=True)
+
+  def attr(self, node, name: str) -> Optional[str]:
+    return node.get(name)
+
+  def child(self, node, tag: str) -> Optional[Any]:
+    return node.find(tag, recursive=False)
+
+
+BACKENDS = {"selectolax": SelectolaxBackend, "lxml": LxmlBackend, "bs4": Bs4Backend}
+
+
+def load_backend(name: str) -> HtmlBackend:
+  if name not in BACKENDS:
+    raise ValueError(f"HTML backend tidak dikenal: {name}")
+  return BACKENDS[name]()
+
+
+def available_backends():
+  names = []
+  for name in BACKEND_PRIORITY:
+    try:
+      load_backend(name)
+      names.append(name)
+    except ImportError:
+      continue
+  return names
+
+
+def use_backend(name: str = "auto") -> str:
+  global BACKEND, _backend
+  candidates = BACKEND_PRIORITY if name == "auto" else [name]
+  for candidate in candidates:
+    try:
+      _backend = load_backend(candidate)
+      BACKEND = candidate
+      return BACKEND
+    except ImportError:
+      if name != "auto":
+        logger.warning(f"HTML backend '{name}' tidak terpasang, pakai bs4.")
+        break
+  _backend = load_backend("bs4")
+  BACKEND = "bs4"
+  return BACKEND
+
+
+def get_backend() -> HtmlBackend:
+  return _backend
+
+
+BACKEND = "bs4"
+_backend: HtmlBackend = load_backend("bs4")
+use_backend(HTML_BACKEND)
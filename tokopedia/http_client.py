@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from rate_limiter import HTTP_MAX_RETRIES, backoff_delay, get_rate_limiter, is_transient, retry_after_seconds
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+  "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+  "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+}
+
+# ------------------------------------------------------------
+# KONFIGURASI POOL
+# ------------------------------------------------------------
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", 60))
+HTTP_TIMEOUT_SECONDS = 20
+
+# HTTP/2 butuh paket `h2`, decoding br butuh `brotli` (httpx[http2,brotli]);
+# httpx otomatis mengirim Accept-Encoding sesuai decoder yang terpasang.
+# Kalau tidak terpasang tetap jalan dengan HTTP/1.1 keep-alive + gzip.
+try:
+  import h2  # noqa: F401
+  HTTP2_ENABLED = True
+except ImportError:
+  HTTP2_ENABLED = False
+
+_session: Optional[httpx.Client] = None
+_session_pid: Optional[int] = None
+_async_clients: Dict[Tuple[int, int], httpx.AsyncClient] = {}
+
+
+def _limits() -> httpx.Limits:
+  return httpx.Limits(
+    max_connections=HTTP_POOL_SIZE,
+    max_keepalive_connections=HTTP_POOL_SIZE,
+    keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+  )
+
+
+# ------------------------------------------------------------
+# get_session
+# - Satu client (connection pool) per proses, dipakai bersama oleh
+#   TokopediaScraper, scrape_page dan scraper kategori
+# - Dibuat ulang setelah fork (server.py memakai multiprocessing)
+# ------------------------------------------------------------
+def get_session() -> httpx.Client:
+  global _session, _session_pid
+  pid = os.getpid()
+  if _session is None or _session_pid != pid:
+    _session = httpx.Client(
+      headers=HEADERS,
+      timeout=HTTP_TIMEOUT_SECONDS,
+      limits=_limits(),
+      http2=HTTP2_ENABLED,
+      follow_redirects=True
+    )
+    _session_pid = pid
+    logger.info(f"HTTP session dibuat (pool={HTTP_POOL_SIZE}, http2={HTTP2_ENABLED}).")
+  return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+  """AsyncClient bersama untuk event loop yang sedang berjalan."""
+  loop = asyncio.get_running_loop()
+  key = (os.getpid(), id(loop))
+  client = _async_clients.get(key)
+  if client is None or client.is_closed:
+    client = httpx.AsyncClient(
+      headers=HEADERS,
+      timeout=HTTP_TIMEOUT_SECONDS,
+      limits=_limits(),
+      http2=HTTP2_ENABLED,
+      follow_redirects=True
+    )
+    _async_clients[key] = client
+  return client
+
+
+# ------------------------------------------------------------
+# fetch
+# - GET lewat session bersama, dibatasi rate limiter per host (dipakai
+#   bersama semua proses) dan di-retry untuk error sementara
+#   (429/5xx/timeout/koneksi) dengan exponential backoff + jitter
+# - Respons akhir dikembalikan apa adanya; raise_for_status tetap di pemanggil
+# ------------------------------------------------------------
+def fetch(url: str, max_retries: int = HTTP_MAX_RETRIES, **kwargs) -> httpx.Response:
+  limiter = get_rate_limiter()
+  for attempt in range(max_retries + 1):
+    limiter.acquire(url)
+    start = time.perf_counter()
+    try:
+      resp = get_session().get(url, **kwargs)
+    except httpx.TransportError as e:
+      limiter.record(url, error=e)
+      if attempt >= max_retries:
+        raise
+      delay = backoff_delay(attempt)
+      logger.warning(f"{type(e).__name__} pada {url}, retry {attempt + 1}/{max_retries} dalam {delay:.1f}s.")
+      time.sleep(delay)
+      continue
+
+    retry_after = retry_after_seconds(resp)
+    limiter.record(url, status=resp.status_code, latency=time.perf_counter() - start, retry_after=retry_after)
+    if not is_transient(resp.status_code) or attempt >= max_retries:
+      return resp
+    delay = max(backoff_delay(attempt), retry_after or 0)
+    logger.warning(f"HTTP {resp.status_code} pada {url}, retry {attempt + 1}/{max_retries} dalam {delay:.1f}s.")
+    time.sleep(delay)
+
+
+def close_session():
+  global _session
+  if _session is not None and _session_pid == os.getpid():
+    _session.close()
+  _session = None
@@ -0,0 +1,82 @@
+import os
+import json
+import logging
+from typing import Any, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# JSON BACKEND
+# - auto: orjson -> msgspec -> json (stdlib), mana yang terpasang
+# - Bisa dipaksa lewat env JSON_BACKEND=orjson|msgspec|json
+# - dumps() selalu mengembalikan str (siap dipakai sebagai parameter psycopg2)
+# ------------------------------------------------------------
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+BACKEND_PRIORITY = ["orjson", "msgspec", "json"]
+
+
+def _load_backend(name: str) -> Tuple[Callable[[Any], Any], Callable[[Any], str], Tuple[type, ...]]:
+  if name == "orjson":
+    import orjson
+
+    def dumps(obj):
+      return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    return orjson.loads, dumps, (orjson.JSONDecodeError,)
+
+  if name == "msgspec":
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder()
+
+    def dumps(obj):
+      return encoder.encode(obj).decode("utf-8")
+
+    return decoder.decode, dumps, (msgspec.DecodeError, json.JSONDecodeError)
+
+  if name == "json":
+    return json.loads, json.dumps, (json.JSONDecodeError,)
+
+  raise ValueError(f"JSON backend tidak dikenal: {name}")
+
+
+def available_backends():
+  names = []
+  for name in BACKEND_PRIORITY:
+    try:
+      _load_backend(name)
+      names.append(name)
+    except ImportError:
+      continue
+  return names
+
+
+def use_backend(name: str = "auto") -> str:
+  global BACKEND, _loads, _dumps, DecodeError
+  candidates = BACKEND_PRIORITY if name == "auto" else [name]
+  for candidate in candidates:
+    try:
+      _loads, _dumps, DecodeError = _load_backend(candidate)
+      BACKEND = candidate
+      return BACKEND
+    except ImportError:
+      if name != "auto":
+        logger.warning(f"JSON backend '{name}' tidak terpasang, pakai stdlib json.")
+        break
+  _loads, _dumps, DecodeError = _load_backend("json")
+  BACKEND = "json"
+  return BACKEND
+
+
+def loads(data):
+  return _loads(data)
+
+
+def dumps(obj) -> str:
+  return _dumps(obj)
+
+
+BACKEND = "json"
+_loads, _dumps, DecodeError = _load_backend("json")
+use_backend(JSON_BACKEND)
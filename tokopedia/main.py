@@ -1,24 +1,22 @@
 import time
-import random
 import psycopg2
-import requests
-import re
-import json
+import httpx
+import json_backend
 import os
 import logging
 from dotenv import load_dotenv
-from openai import OpenAI
-from product import TokopediaScraper
+from crawler import crawl_products
+from http_client import fetch
+from cache_extract import extract_cache_json
+from db_writer import ProductBulkWriter
+from facets import extract_facets
+from category_tree import CategoryTree
+from crawl_frontier import CrawlFrontier
+from embedding import openai_embed_batch, OPENAI_MAX_BATCH_SIZE, OPENAI_MAX_BATCH_TOKENS
 from product_name import classify_product
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-HEADERS = {
-  "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-  "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-}
 
 # ------------------------------------------------------------
 # POSTGRES CONNECTION
@@ -56,163 +54,88 @@ def ensure_connection():
 # EMBEDDING GENERATION
 # ------------------------------------------------------------
 def generate_embedding(text):
-  try:
-    response  = client.embeddings.create(
-      model="text-embedding-3-small",
-      input=text
-    )
+  return openai_embed_batch([text])[0]
 
-    embedding = response.data[0].embedding
-    return embedding
-
-  except Exception as e:
-    print("Embedding error:", e)
-    return None
+# ------------------------------------------------------------
+# BULK WRITER
+# - Produk dari banyak halaman produk ditampung, nama di-embed per batch,
+#   lalu ditulis dalam satu transaksi (COPY + merge set-based)
+# ------------------------------------------------------------
+product_writer = ProductBulkWriter(
+  ensure_connection,
+  openai_embed_batch,
+  max_batch_size=OPENAI_MAX_BATCH_SIZE,
+  max_batch_tokens=OPENAI_MAX_BATCH_TOKENS
+)
   
 # ------------------------------------------------------------
 # SAVE PRODUCT AND CHUNKS
 # ------------------------------------------------------------
-def save_product_and_chunks(products_data, l1, l2, l3):
+def save_product_and_chunks(products_data, l1, l2, l3, source_url=None):
   print(f"Saving {len(products_data)} products to database...")
 
-  conn = ensure_connection()
-  with conn.cursor() as cur:
-    product_id_first = None  
-    insert_query_base = """
-      INSERT INTO products (
-        ecommerce, 
-        category_id, 
-        shop_name, 
-        shop_location, 
-        name, 
-        url, 
-        price, 
-        stock, 
-        sold, 
-        variant_spec, 
-        detail, 
-        media, 
-        reviews, 
-        parent_id, 
-        is_parent, 
-        updated_at
-      ) VALUES (
-        %s, %s, %s, %s, %s, 
-        %s, %s, %s, %s, %s, 
-        %s, %s, %s, %s, %s, 
-        NOW()
-      ) ON CONFLICT (url) DO UPDATE SET
-          shop_name = EXCLUDED.shop_name,
-          shop_location = EXCLUDED.shop_location,
-          name = EXCLUDED.name,
-          price = EXCLUDED.price,
-          stock = EXCLUDED.stock,
-          sold = EXCLUDED.sold,
-          variant_spec = EXCLUDED.variant_spec,
-          detail = EXCLUDED.detail,
-          media = EXCLUDED.media,
-          reviews = EXCLUDED.reviews,
-          updated_at = NOW()
-        RETURNING id;
-    """
-    insert_chunk_query = """
-      INSERT INTO product_chunks (
-        product_id, 
-        chunk_text, 
-        embedding 
-      ) VALUES (
-        %s, %s, %s::VECTOR
-      );
-    """
-    delete_old_chunks_query = "DELETE FROM product_chunks WHERE product_id = %s;"
+  product_rows = []
+  chunk_rows = []
+  parent_url = None
     
-    for i, product_data in enumerate(products_data, start=0): 
-      current_parent_id = None
-      is_parent = False
-      
-      if i == 0:
-        if len(products_data) > 1:
-          is_parent = True
-      else:
-        current_parent_id = product_id_first
-
-      name = product_data.get('product_name', '')
-
-      print("*"*50)
-
-      cur.execute(insert_query_base, (
-        'tokopedia',
-        l3[0],
-        product_data.get('shop_name'),
-        None,
-        product_data.get('product_name'),
-        product_data.get('product_url'),
-        product_data.get('product_price'),
-        product_data.get('product_stock'),
-        product_data.get('product_sold'),
-        json.dumps(product_data.get('variant_spec', {})),
-        json.dumps(product_data.get('product_detail', {})),
-        json.dumps(product_data.get('product_media', {})),
-        json.dumps(product_data.get('product_reviews', {})),
-        current_parent_id,
-        is_parent
-      ))
-      product_id = cur.fetchone()[0]
-      if i == 0:
-        product_id_first = product_id
-        
-      print(f"Save product: {name}")
-      print("="*50)
+  for i, product_data in enumerate(products_data, start=0): 
+    is_parent = False
+    
+    if i == 0:
+      if len(products_data) > 1:
+        is_parent = True
+
+    name = product_data.get('product_name', '')
+    product_url = product_data.get('product_url')
+
+    print("*"*50)
+
+    product_rows.append({
+      'ecommerce': 'tokopedia',
+      'category_id': l3[0],
+      'shop_name': product_data.get('shop_name'),
+      'shop_location': None,
+      'name': product_data.get('product_name'),
+      'url': product_url,
+      'price': product_data.get('product_price'),
+      'stock': product_data.get('product_stock'),
+      'sold': product_data.get('product_sold'),
+      'variant_spec': json_backend.dumps(product_data.get('variant_spec', {})),
+      'detail': json_backend.dumps(product_data.get('product_detail', {})),
+      'media': json_backend.dumps(product_data.get('product_media', {})),
+      'reviews': json_backend.dumps(product_data.get('product_reviews', {})),
+      'is_parent': is_parent,
+      'parent_url': parent_url,
+      'search_text': None,
+      **extract_facets(product_data.get('variant_spec', {}), product_data.get('product_detail', {}), None)
+    })
+    if i == 0:
+      parent_url = product_url
       
-      # if current_parent_id is None:
-      cur.execute(delete_old_chunks_query, (product_id,))
-      if i == 0 :
-        if l3[1] == "Android OS" :
-          clean_name = classify_product(name, l3[1])
-          name = clean_name.get("normalized_name")
-        elif l3[1] == "iOS" :
-          clean_name = classify_product(name, l3[1])
-          name = clean_name.get("normalized_name")
-
-        embedding = generate_embedding(name)
-
-        if embedding:
-          embedding_str = f"[{','.join(map(str, embedding))}]"
-
-          cur.execute(
-            insert_chunk_query,
-            (
-              product_id,
-              name,
-              embedding_str
-            )
-          )
+    print(f"Save product: {name}")
+    print("="*50)
+    
+    if i == 0 :
+      if l3[1] == "Android OS" :
+        clean_name = classify_product(name, l3[1])
+        name = clean_name.get("normalized_name")
+      elif l3[1] == "iOS" :
+        clean_name = classify_product(name, l3[1])
+        name = clean_name.get("normalized_name")
+
+      if name:
+        chunk_rows.append({'url': product_url, 'chunk_text': name})
+
+  product_writer.add(product_rows, chunk_rows, key=source_url)
 
 # ------------------------------------------------------------
 # GET CATEGORY BY LEVEL
+# - Dari category tree di memori (dimuat sekali, refresh via TTL/watermark)
 # ------------------------------------------------------------
+category_tree = CategoryTree(ensure_connection)
+
 def get_categories(level, parent_id=None):
-  conn = ensure_connection()
-  with conn.cursor() as cur:
-    if parent_id:
-      cur.execute("""
-        SELECT id, name, url 
-        FROM categories
-        WHERE level = %s 
-          AND parent_id = %s
-          AND ecommerce = 'tokopedia'
-        ORDER BY name;
-      """, (level, parent_id))
-    else:
-      cur.execute("""
-        SELECT id, name, url 
-        FROM categories
-        WHERE level = %s
-          AND ecommerce = 'tokopedia'
-        ORDER BY name;
-      """, (level,))
-    
-    return cur.fetchall()
+  return category_tree.rows(level, parent_id)
 
 # ------------------------------------------------------------
 # PRINT CATEGORY LIST
@@ -234,77 +157,101 @@ def select_category(categories, level_name):
 
   return selected
 
-def scrape_page(url, l1_selected, l2_selected, l3_selected):
+# ------------------------------------------------------------
+# CRAWL FRONTIER
+# - Halaman & produk yang sudah di-checkpoint tidak di-fetch ulang saat
+#   program dijalankan lagi untuk kategori yang sama
+# ------------------------------------------------------------
+frontier = CrawlFrontier(ensure_connection)
+
+def scrape_page(url, l1_selected, l2_selected, l3_selected, page):
   L3_NAME = l3_selected[1]
+  category_id = l3_selected[0]
   try:
-    r = requests.get(url, headers=HEADERS, timeout=50)
+    r = fetch(url, timeout=50)
     r.raise_for_status()
     html_content = r.text
 
-    pattern = r'window.__cache\s*=\s*(\{.*?\})\s*;'
-    match = re.search(pattern, html_content, re.DOTALL)
-    if not match:
-      match = re.search(r'window.__cache\s*=\s*(\{.*\})\s*', html_content, re.DOTALL)
-    
-    json_string = None
-    if match:
-      json_string = match.group(1).strip()
-    else:
-      pattern_loose = r'window.__cache\s*=\s*(\{.*\})\s*'
-      match_loose = re.search(pattern_loose, html_content, re.DOTALL)
-      if match_loose:
-        json_string = match_loose.group(1).strip()
-      else:
-        print("Gagal menemukan pola 'window.__cache = {JSON}' dalam HTML. Melewati halaman.")
-        return
+    json_string = extract_cache_json(html_content)
+    if not json_string:
+      print("Gagal menemukan pola 'window.__cache = {JSON}' dalam HTML. Melewati halaman.")
+      frontier.fail_page(category_id, page, "window.__cache tidak ditemukan")
+      return
 
-    if json_string:
-      try:
-        json_data = json.loads(json_string)
-        json_root = json_data.get("ROOT_QUERY", {})
-      except json.JSONDecodeError as e:
-        print(f"Gagal mem-parsing JSON: {e}. Melewati halaman.")
-        return
+    try:
+      json_data = json_backend.loads(json_string)
+      json_root = json_data.get("ROOT_QUERY", {})
+    except json_backend.DecodeError as e:
+      print(f"Gagal mem-parsing JSON: {e}. Melewati halaman.")
+      frontier.fail_page(category_id, page, e)
+      return
 
-      try:
-        search_keys = [
-          key for key in json_root.keys() 
-          if "searchProduct" in key 
-        ]
-        if search_keys:
-          json_search = json_root[search_keys[0]]
-          search_id = json_search.get("id", None)
-          print("ID produk dari pencarian:", search_id)
-
-          json_search_product = json_data.get(search_id, {})
-          json_ace_product = json_search_product.get("products", [])
-
-          print(f"Jumlah produk ditemukan: {len(json_ace_product)}")
-
-          for idx in json_ace_product:
-            ace_product_id = idx.get("id", None)
-            product = json_data.get(ace_product_id, {})
-            product_url = product.get('url', '')
-            try:
-              scraper = TokopediaScraper()
-              results = scraper.scrape(product_url)
-
-              # save to json file
-              # file_path = "output"
-              # os.makedirs(file_path, exist_ok=True)
-              # with open(os.path.join(file_path, f"{ace_product_id}.json"), 'w', encoding='utf-8') as f:
-              #   json.dump(results, f, ensure_ascii=False, indent=2)
-
-              save_product_and_chunks(results, l1_selected, l2_selected, l3_selected)
-            except Exception as product_e:
-              logging.error(f"[{L3_NAME}] GAGAL SCRAPE PRODUK (URL: {product_url}): {product_e}. Lanjut ke produk berikutnya.")
+    try:
+      search_keys = [
+        key for key in json_root.keys() 
+        if "searchProduct" in key 
+      ]
+      if search_keys:
+        json_search = json_root[search_keys[0]]
+        search_id = json_search.get("id", None)
+        print("ID produk dari pencarian:", search_id)
+
+        json_search_product = json_data.get(search_id, {})
+        json_ace_product = json_search_product.get("products", [])
+
+        print(f"Jumlah produk ditemukan: {len(json_ace_product)}")
+
+        product_urls = []
+        for idx in json_ace_product:
+          ace_product_id = idx.get("id", None)
+          product = json_data.get(ace_product_id, {})
+          product_urls.append(product.get('url', ''))
+
+        # Produk yang sudah tersimpan / sedang dikerjakan proses lain dilewati
+        pending_urls = frontier.claim_products(category_id, page, product_urls)
+        print(f"Produk perlu di-crawl: {len(pending_urls)}")
+
+        def save_results(product_url, results):
+          if not results:
+            return
+          try:
+            # save to json file
+            # file_path = "output"
+            # os.makedirs(file_path, exist_ok=True)
+            # with open(os.path.join(file_path, f"{ace_product_id}.json"), 'w', encoding='utf-8') as f:
+            #   json.dump(results, f, ensure_ascii=False, indent=2)
+
+            save_product_and_chunks(results, l1_selected, l2_selected, l3_selected, source_url=product_url)
+          except Exception as product_e:
+            logging.error(f"[{L3_NAME}] GAGAL SCRAPE PRODUK (URL: {product_url}): {product_e}. Lanjut ke produk berikutnya.")
+
+        error = "fetch/parse/simpan produk gagal"
+        try:
+          crawl_products(pending_urls, save_results)
+          product_writer.flush()
+        except Exception as e:
+          error = e
+          raise
+        finally:
+          # Checkpoint hanya URL yang transaksinya sudah commit; sisanya (termasuk
+          # yang masih tertahan di buffer karena flush gagal) dilepas untuk dicoba lagi
+          committed = product_writer.take_committed()
+          frontier.finish_products(committed)
+          frontier.fail_products(set(pending_urls) - set(committed), error)
+
+        frontier.finish_page(category_id, page, len([u for u in product_urls if u]))
+      else:
+        frontier.fail_page(category_id, page, "searchProduct tidak ditemukan")
             
-      except Exception as e:
-        logging.error(f"[{L3_NAME}] Gagal memproses data produk dari JSON: {e}. Melewati halaman: {url}")
-  except requests.exceptions.RequestException as http_e:
+    except Exception as e:
+      logging.error(f"[{L3_NAME}] Gagal memproses data produk dari JSON: {e}. Melewati halaman: {url}")
+      frontier.fail_page(category_id, page, e)
+  except httpx.HTTPError as http_e:
     logging.error(f"[{L3_NAME}] ERROR HTTP/KONEKSI pada URL {url}: {http_e}. Melewati halaman.")
+    frontier.fail_page(category_id, page, http_e)
   except Exception as general_e:
     logging.error(f"[{L3_NAME}] ERROR UMUM tak terduga di scrape_page pada URL {url}: {general_e}. Melewati halaman.")
+    frontier.fail_page(category_id, page, general_e)
 # ------------------------------------------------------------
 # MAIN PROGRAM
 # ------------------------------------------------------------
@@ -427,14 +374,19 @@ if __name__ == "__main__":
       print(f"\nMulai scraping {total_pages} halaman...\n")
       logging.info(f"Scraping untuk setiap kategori {l1_selected[1]} setiap child kategori {total_pages} halaman.\n")
 
-      for page in range(1, total_pages + 1):
-        if "?" in selected_l3_url:
-          page_url = f"{selected_l3_url}&page={page}"
-        else:
-          page_url = f"{selected_l3_url}?page={page}"
-
-        print(f"Scraping halaman {page} → {page_url}")
-        scrape_page(page_url, l1_selected, l2_selected, selected_l3)
+      # Halaman yang sudah selesai di run sebelumnya dilewati (resume)
+      frontier.seed_pages([(selected_l3_id, selected_l3_url)], total_pages)
+      try:
+        while True:
+          claim = frontier.claim_page([selected_l3_id])
+          if claim is None:
+            break
+          _, page, page_url = claim
+
+          print(f"Scraping halaman {page} → {page_url}")
+          scrape_page(page_url, l1_selected, l2_selected, selected_l3, page)
+      finally:
+        frontier.release()
 
 
   finally:
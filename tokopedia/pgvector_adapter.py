@@ -0,0 +1,92 @@
+import io
+import struct
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from psycopg2.extensions import AsIs, QuotedString, new_type, register_adapter, register_type
+
+# ------------------------------------------------------------
+# pgvector <-> numpy float32
+# - Tulis (bulk): COPY ... WITH (FORMAT binary), vektor dikirim dalam format
+#   binary pgvector (int16 dim, int16 unused, float4 big-endian x dim)
+# - Parameter query: psycopg2 hanya punya protokol teks, jadi np.ndarray
+#   di-adapt jadi literal '[..]'::vector dengan repr float32 terpendek
+#   (~40% lebih kecil dari repr float Python)
+# - Baca: kolom vector di-parse langsung ke np.ndarray float32
+# ------------------------------------------------------------
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+
+def to_vector(embedding) -> Optional[np.ndarray]:
+  """List/array embedding -> np.ndarray float32 (None tetap None)."""
+  if embedding is None:
+    return None
+  return np.asarray(embedding, dtype=np.float32)
+
+
+def vector_text(vector) -> str:
+  return "[" + ",".join(to_vector(vector).astype(str)) + "]"
+
+
+def vector_binary(vector) -> bytes:
+  """Format binary pgvector (sama dengan vector_send/vector_recv)."""
+  vector = to_vector(vector)
+  return struct.pack(">HH", vector.shape[0], 0) + vector.astype(">f4", copy=False).tobytes()
+
+
+def parse_vector(value: Optional[str], cur=None) -> Optional[np.ndarray]:
+  if value is None:
+    return None
+  return np.array(value[1:-1].split(","), dtype=np.float32)
+
+
+def _adapt_ndarray(vector: np.ndarray):
+  return AsIs(f"{QuotedString(vector_text(vector)).getquoted().decode()}::vector")
+
+
+_registered_adapter = False
+
+
+def register_vector(conn):
+  """Daftarkan adapter np.ndarray (global) dan typecaster vector (per koneksi)."""
+  global _registered_adapter
+  if not _registered_adapter:
+    register_adapter(np.ndarray, _adapt_ndarray)
+    _registered_adapter = True
+
+  with conn.cursor() as cur:
+    cur.execute("SELECT 'vector'::regtype::oid;")
+    oid = cur.fetchone()[0]
+  register_type(new_type((oid,), "VECTOR", parse_vector), conn)
+  return conn
+
+
+# ------------------------------------------------------------
+# Binary COPY: kolom int4 + vector
+# ------------------------------------------------------------
+def binary_copy_buffer(rows: Iterable[Sequence]) -> io.BytesIO:
+  """Buffer COPY binary untuk baris (idx: int, vector). Vector None -> NULL."""
+  buf = io.BytesIO()
+  buf.write(PGCOPY_HEADER)
+  field_count = struct.pack(">h", 2)
+  for idx, vector in rows:
+    buf.write(field_count)
+    buf.write(struct.pack(">ii", 4, idx))
+    if vector is None:
+      buf.write(struct.pack(">i", -1))
+    else:
+      data = vector_binary(vector)
+      buf.write(struct.pack(">i", len(data)))
+      buf.write(data)
+  buf.write(PGCOPY_TRAILER)
+  buf.seek(0)
+  return buf
+
+
+def copy_vectors(cur, table: str, columns: List[str], rows: Iterable[Sequence]):
+  """COPY binary (idx, vector) ke `table`; columns = [nama kolom idx, nama kolom vector]."""
+  cur.copy_expert(
+    f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+    binary_copy_buffer(rows)
+  )
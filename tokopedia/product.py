@@ -1,9 +1,15 @@
-import requests
 import re
 import json
+import json_backend
 import os
+import time
 import logging
 from typing import Dict, List
+import httpx
+from http_client import HEADERS, get_session
+from rate_limiter import HTTP_MAX_RETRIES, backoff_delay, get_rate_limiter, is_transient, retry_after_seconds
+from cache_extract import CacheLocator, extract_cache_json
+from apollo_cache import ApolloCache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -11,11 +17,7 @@ logger = logging.getLogger(__name__)
 class TokopediaScraper:
   def __init__(self, output_dir: str = "data"):
     self.output_dir = output_dir
-    self.headers = {
-      "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-      "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    }
-    os.makedirs(self.output_dir, exist_ok=True)
+    self.headers = HEADERS
 
   def _clean_text(self, text: str) -> str:
     if not text:
@@ -33,18 +35,13 @@ class TokopediaScraper:
     key = key.replace(" ", "_")
     return re.sub(r'[^a-z0-9_]+', '', key)
 
-  def _resolve(self, data_cache: Dict, ref_id: str) -> Dict:
-    if not ref_id:
-      return {}
-    return data_cache.get(ref_id, {})
-
-  def _extract_media(self, data_cache: Dict, component_data: List) -> List[Dict]:
+  def _extract_media(self, cache: ApolloCache, component_data: List) -> List[Dict]:
     results = []
     for item in component_data:
-      media_group = self._resolve(data_cache, item.get("id"))
+      media_group = cache.resolve(item)
       media_list = media_group.get("media", [])
       for m_item in media_list:
-        m_obj = self._resolve(data_cache, m_item.get("id"))
+        m_obj = cache.resolve(m_item)
         results.append({
           "url_original": m_obj.get("URLOriginal"),
           "url_thumbnail": m_obj.get("URLThumbnail"),
@@ -55,13 +52,13 @@ class TokopediaScraper:
         })
     return results
 
-  def _extract_detail_specs(self, data_cache: Dict, component_data: List) -> Dict:
+  def _extract_detail_specs(self, cache: ApolloCache, component_data: List) -> Dict:
     specs = {}
     for item in component_data:
-      detail_group = self._resolve(data_cache, item.get("id"))
+      detail_group = cache.resolve(item)
       content_list = detail_group.get("content", [])
       for content_item in content_list:
-        c_obj = self._resolve(data_cache, content_item.get("id"))
+        c_obj = cache.resolve(content_item)
         title = c_obj.get("title")
         subtitle = c_obj.get("subtitle")
         
@@ -73,34 +70,33 @@ class TokopediaScraper:
             specs[clean_key] = subtitle
 
       if "productDetailDescription" in detail_group:
-        description_ref = detail_group.get("productDetailDescription", {})
-        description_obj = self._resolve(data_cache, description_ref.get("id"))
+        description_obj = cache.resolve_field(detail_group, "productDetailDescription")
         if description_obj:
           desc_text = description_obj.get("content", "")
           specs["deskripsi"] = self._clean_text(desc_text)
     return specs
 
-  def _extract_variants(self, data_cache: Dict, component_data: List) -> List[Dict]:
+  def _extract_variants(self, cache: ApolloCache, component_data: List) -> List[Dict]:
     variants = []
     variant_keys = []
 
     for item in component_data:
-      v_group = self._resolve(data_cache, item.get("id"))
+      v_group = cache.resolve(item)
       
       raw_variants = v_group.get("variants", [])
       for v_meta in raw_variants:
-        v_meta_obj = self._resolve(data_cache, v_meta.get("id"))
+        v_meta_obj = cache.resolve(v_meta)
         if v_meta_obj:
           variant_keys.append(self._normalize_key(v_meta_obj.get("name", "")))
 
       children = v_group.get("children", [])
       for child in children:
-        child_obj = self._resolve(data_cache, child.get("id"))
+        child_obj = cache.resolve(child)
         if not child_obj:
           continue
 
         stock_ref = child_obj.get("stock", {})
-        stock_obj = self._resolve(data_cache, stock_ref.get("id")) if isinstance(stock_ref, dict) else {}
+        stock_obj = cache.resolve(stock_ref) if isinstance(stock_ref, dict) else {}
 
         variant_map = {}
         option_names = child_obj.get("optionName", {}).get("json", [])
@@ -112,54 +108,42 @@ class TokopediaScraper:
           "name": child_obj.get("productName"),
           "url": child_obj.get("productURL"),
           "price": child_obj.get("price"),
-          "price_fmt": f"Rp {child_obj.get("price"):,.0f}".replace(",", "."),
+          "price_fmt": f"Rp {child_obj.get('price'):,.0f}".replace(",", "."),
           "stock": stock_obj.get("stock", 0),
           "variant_spec": variant_map,
           "is_cod": child_obj.get("isCOD")
         })
     return variants
 
-  def _extract_location(self, data_cache: Dict, components: List) -> str:
-    for comp in components:
-      c_obj = self._resolve(data_cache, comp.get("id"))
-      
-      if c_obj.get("name") == "shipment_v4":
-        level1_refs = c_obj.get("data", [])
-        
-        for l1_ref in level1_refs:
-          shipment_container = self._resolve(data_cache, l1_ref.get("id"))
-          level2_refs = shipment_container.get("data", [])
+  def _extract_location(self, cache: ApolloCache, shipment_components: List[Dict]) -> str:
+    for c_obj in shipment_components:
+      for shipment_container in cache.resolve_list(c_obj.get("data", [])):
+        for shipment_item in cache.resolve_list(shipment_container.get("data", [])):
+          wh_info = shipment_item.get("warehouse_info")
           
-          for l2_ref in level2_refs:
-            shipment_item = self._resolve(data_cache, l2_ref.get("id"))
-            wh_info = shipment_item.get("warehouse_info")
-            
-            if isinstance(wh_info, dict) and wh_info.get("type") == "id":
-              wh_obj = self._resolve(data_cache, wh_info.get("id"))
-              city = wh_obj.get("city_name")
-              if city:
-                return city
-            
-            elif isinstance(wh_info, dict):
-              city = wh_info.get("city_name")
-              if city:
-                return city
+          if isinstance(wh_info, dict) and wh_info.get("type") == "id":
+            wh_obj = cache.resolve(wh_info)
+            city = wh_obj.get("city_name")
+            if city:
+              return city
+          
+          elif isinstance(wh_info, dict):
+            city = wh_info.get("city_name")
+            if city:
+              return city
 
     return None
 
-  def _extract_reviews(self, data_cache: Dict) -> Dict:
-    root = data_cache.get("ROOT_QUERY", {})
-    review_key = next((k for k in root if k.startswith("productrevGetProductRatingAndTopics")), None)
+  def _extract_reviews(self, cache: ApolloCache) -> Dict:
+    review_container = cache.root_field("productrevGetProductRatingAndTopics")
     
-    if not review_key:
+    if not review_container:
       return {}
 
-    review_container = self._resolve(data_cache, root[review_key].get("id"))
-    rating_data = self._resolve(data_cache, review_container.get("rating", {}).get("id"))
+    rating_data = cache.resolve_field(review_container, "rating")
     
     topics_summary = {}
-    for t_ref in review_container.get("topics", []):
-      t_obj = self._resolve(data_cache, t_ref.get("id"))
+    for t_obj in cache.resolve_list(review_container.get("topics", [])):
       if t_obj:
         topics_summary[self._normalize_key(t_obj.get("formatted"))] = {
           "score": t_obj.get("rating"),
@@ -237,132 +221,156 @@ class TokopediaScraper:
   def scrape(self, url: str) -> List[Dict]:
     logger.info(f"URL: {url}")
     try:
-      resp = requests.get(url, headers=self.headers, timeout=20)
-      resp.raise_for_status()
-      html = resp.text
-      
-      # save to html
-      # debug_html_path = os.path.join(self.output_dir, f"debug_page.html")
-      # with open(debug_html_path, "w", encoding="utf-8") as f:
-      #   f.write(html)
-
-      pattern = r'window.__cache\s*=\s*(\{.*?\})\s*;'
-      match = re.search(pattern, html, re.DOTALL)
-      if not match:
-        match = re.search(r'window.__cache\s*=\s*(\{.*\})\s*', html, re.DOTALL)
-      
-      if not match:
-        logger.error("Gagal menemukan JSON cache di HTML.")
-        return []
+      # Stream body: cache di-scan per chunk sambil download berjalan
+      limiter = get_rate_limiter()
+      for attempt in range(HTTP_MAX_RETRIES + 1):
+        limiter.acquire(url)
+        locator = CacheLocator()
+        start = time.perf_counter()
+        try:
+          with get_session().stream("GET", url, headers=self.headers, timeout=20) as resp:
+            retry_after = retry_after_seconds(resp)
+            limiter.record(url, status=resp.status_code, latency=time.perf_counter() - start, retry_after=retry_after)
+            if not is_transient(resp.status_code) or attempt >= HTTP_MAX_RETRIES:
+              resp.raise_for_status()
+              for chunk in resp.iter_text():
+                if locator.done:
+                  # HTTP/1.1: habiskan sisa body agar koneksi keep-alive bisa dipakai ulang
+                  continue
+                locator.feed(chunk)
+                if locator.done and resp.http_version == "HTTP/2":
+                  break
+              return self.parse_cache_json(locator.result)
+        except httpx.TransportError as e:
+          limiter.record(url, error=e)
+          if attempt >= HTTP_MAX_RETRIES:
+            raise
+          retry_after = None
+
+        # 429/5xx/timeout: tunggu (backoff + jitter, atau Retry-After) lalu coba lagi
+        time.sleep(max(backoff_delay(attempt), retry_after or 0))
 
-      json_str = match.group(1).strip()
-      data = json.loads(json_str)
+    except Exception as e:
+      logger.error(f"Error scraping {url}: {str(e)}")
+      return []
 
-      # save for debugging
-      # debug_path = os.path.join(self.output_dir, f"debug_full_cache.json")
-      # with open(debug_path, "w", encoding="utf-8") as f:
-      #   json.dump(data, f, ensure_ascii=False, indent=2)
-      
-      root = data.get("ROOT_QUERY", {})
-      layout_key = next((k for k in root if k.startswith("pdpMainInfo")), None)
-      
-      if not layout_key:
-        logger.error("Layout key tidak ditemukan.")
-        return []
+  def parse(self, html: str) -> List[Dict]:
+    """Parse halaman PDP (HTML) menjadi list produk/varian, tanpa melakukan request."""
+    # save to html
+    # debug_html_path = os.path.join(self.output_dir, f"debug_page.html")
+    # with open(debug_html_path, "w", encoding="utf-8") as f:
+    #   f.write(html)
 
-      layout_container = self._resolve(data, root[layout_key].get("id"))
-      
-      # Basic Info
-      data_ref = layout_container.get("data", {})
-      basic_info_ref = self._resolve(data, data_ref.get("id"))
-      basic_info_id = basic_info_ref.get("basicInfo", {}).get("id")
-      basic_info = self._resolve(data, basic_info_id)
-      
-      # Stats
-      stats_ref = basic_info.get("txStats", {})
-      stats_info = self._resolve(data, stats_ref.get("id"))
+    return self.parse_cache_json(extract_cache_json(html))
 
-      # Components Iteration
-      components = layout_container.get("components", [])
-      
-      extracted_media = []
-      extracted_details = {}
-      extracted_variants = []
-      location = "N/A"
-
-      for comp in components:
-        comp_obj = self._resolve(data, comp.get("id"))
-        c_type = comp_obj.get("type")
-        c_data = comp_obj.get("data", [])
-
-        if c_type == "product_media":
-          extracted_media = self._extract_media(data, c_data)
-        elif c_type == "product_detail":
-          extracted_details = self._extract_detail_specs(data, c_data)
-        elif c_type == "variant":
-          extracted_variants = self._extract_variants(data, c_data)
-      
-      location = self._extract_location(data, components)
-      reviews = self._extract_reviews(data)
-
-      final_results = []
-      shop_info = {
-        "shop_name": basic_info.get("shopName"),
-        "shop_location": location,
-      }
-
-      def construct_item(core_product_data):
-        item = {}
-        item.update(shop_info)
-        item.update(core_product_data)
-        item["product_detail"] = extracted_details
-        item["product_media"] = extracted_media
-        item["product_reviews"] = reviews
-        return item
-      
-      if extracted_variants:
-        for variant in extracted_variants:
-          variant_data = {
-            "product_name": variant["name"],
-            "product_url": variant["url"],
-            "product_price": variant["price"],
-            "product_price_fmt": variant["price_fmt"],
-            "product_stock": variant["stock"],
-            "product_sold": stats_info.get("countSold"),
-            "variant_spec": variant["variant_spec"]
-          }
-          final_results.append(construct_item(variant_data))
-      else:
-        content_comp = next((self._resolve(data, c.get("id")) for c in components if self._resolve(data, c.get("id")).get("type") == "product_content"), None)
-        content_data = {}
-        if content_comp:
-          raw_content = content_comp.get("data", [])[0]
-          content_obj = self._resolve(data, raw_content.get("id"))
-          price_obj = self._resolve(data, content_obj.get("price", {}).get("id"))
-          stock_obj =  self._resolve(data, content_obj.get("stock", {}).get("id"))
-          
-          content_data = {
-            "product_name": content_obj.get("name") or basic_info.get("name"),
-            "product_url": basic_info.get("url"),
-            "product_price": price_obj.get("value"),
-            "product_price_fmt": price_obj.get("priceFmt"),
-            "product_stock": stock_obj.get("value"),
-            "product_sold": stats_info.get("countSold"),
-            "variant_spec": {}
-          }
-        final_results.append(construct_item(content_data))
-
-      return final_results
+  def parse_cache_json(self, json_str: str) -> List[Dict]:
+    if not json_str:
+      logger.error("Gagal menemukan JSON cache di HTML.")
+      return []
 
-    except Exception as e:
-      logger.error(f"Error scraping {url}: {str(e)}")
+    data = json_backend.loads(json_str)
+
+    # save for debugging
+    # debug_path = os.path.join(self.output_dir, f"debug_full_cache.json")
+    # with open(debug_path, "w", encoding="utf-8") as f:
+    #   json.dump(data, f, ensure_ascii=False, indent=2)
+    
+    cache = ApolloCache(data)
+    if cache.root_key("pdpMainInfo") is None:
+      logger.error("Layout key tidak ditemukan.")
       return []
 
+    layout_container = cache.root_field("pdpMainInfo")
+    
+    # Basic Info
+    basic_info_ref = cache.resolve_field(layout_container, "data")
+    basic_info = cache.resolve_field(basic_info_ref, "basicInfo")
+    
+    # Stats
+    stats_info = cache.resolve_field(basic_info, "txStats")
+
+    # Components Iteration (setiap component cukup di-resolve sekali)
+    components = cache.resolve_list(layout_container.get("components", []))
+    
+    extracted_media = []
+    extracted_details = {}
+    extracted_variants = []
+    content_comp = None
+    shipment_components = []
+
+    for comp_obj in components:
+      c_type = comp_obj.get("type")
+      c_data = comp_obj.get("data", [])
+
+      if c_type == "product_media":
+        extracted_media = self._extract_media(cache, c_data)
+      elif c_type == "product_detail":
+        extracted_details = self._extract_detail_specs(cache, c_data)
+      elif c_type == "variant":
+        extracted_variants = self._extract_variants(cache, c_data)
+      elif c_type == "product_content" and content_comp is None:
+        content_comp = comp_obj
+
+      if comp_obj.get("name") == "shipment_v4":
+        shipment_components.append(comp_obj)
+    
+    location = self._extract_location(cache, shipment_components)
+    reviews = self._extract_reviews(cache)
+
+    final_results = []
+    shop_info = {
+      "shop_name": basic_info.get("shopName"),
+      "shop_location": location,
+    }
+
+    def construct_item(core_product_data):
+      item = {}
+      item.update(shop_info)
+      item.update(core_product_data)
+      item["product_detail"] = extracted_details
+      item["product_media"] = extracted_media
+      item["product_reviews"] = reviews
+      return item
+    
+    if extracted_variants:
+      for variant in extracted_variants:
+        variant_data = {
+          "product_name": variant["name"],
+          "product_url": variant["url"],
+          "product_price": variant["price"],
+          "product_price_fmt": variant["price_fmt"],
+          "product_stock": variant["stock"],
+          "product_sold": stats_info.get("countSold"),
+          "variant_spec": variant["variant_spec"]
+        }
+        final_results.append(construct_item(variant_data))
+    else:
+      content_data = {}
+      if content_comp:
+        raw_content = content_comp.get("data", [])[0]
+        content_obj = cache.resolve(raw_content)
+        price_obj = cache.resolve_field(content_obj, "price")
+        stock_obj = cache.resolve_field(content_obj, "stock")
+        
+        content_data = {
+          "product_name": content_obj.get("name") or basic_info.get("name"),
+          "product_url": basic_info.get("url"),
+          "product_price": price_obj.get("value"),
+          "product_price_fmt": price_obj.get("priceFmt"),
+          "product_stock": stock_obj.get("value"),
+          "product_sold": stats_info.get("countSold"),
+          "variant_spec": {}
+        }
+      final_results.append(construct_item(content_data))
+
+    return final_results
+
   def save_results(self, data: List[Dict], filename_prefix: str = "result"):
     if not data:
       logger.warning("Tidak ada data untuk disimpan.")
       return
 
+    os.makedirs(self.output_dir, exist_ok=True)
     filepath = os.path.join(self.output_dir, f"{filename_prefix}_full.json")
     with open(filepath, "w", encoding="utf-8") as f:
       json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,338 @@
+import os
+import re
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# "sekitar 3 juta" -> harga_min/harga_max = 3 juta -/+ toleransi ini
+QUERY_PARSER_PRICE_TOLERANCE = float(os.getenv("QUERY_PARSER_PRICE_TOLERANCE", 0.15))
+
+
+# ------------------------------------------------------------
+# GAZETTEER
+# - Nilai filter ditulis seperti yang diketik pengguna (huruf kecil), sama
+#   seperti keluaran LLM: final_product_search memakai ILIKE ke variant_spec,
+#   detail.kondisi dan shop_location
+# - Hanya singkatan / ejaan lain yang dipetakan ke nama baku
+# ------------------------------------------------------------
+CITIES = {
+  "jakarta": "jakarta", "jakarta barat": "jakarta barat", "jakarta timur": "jakarta timur",
+  "jakarta selatan": "jakarta selatan", "jakarta utara": "jakarta utara", "jakarta pusat": "jakarta pusat",
+  "jakbar": "jakarta barat", "jaktim": "jakarta timur", "jaksel": "jakarta selatan",
+  "jakut": "jakarta utara", "jakpus": "jakarta pusat", "jkt": "jakarta",
+  "bogor": "bogor", "depok": "depok", "tangerang": "tangerang", "tangerang selatan": "tangerang selatan",
+  "tangsel": "tangerang selatan", "bekasi": "bekasi", "bandung": "bandung", "cimahi": "cimahi",
+  "cirebon": "cirebon", "sukabumi": "sukabumi", "tasikmalaya": "tasikmalaya", "karawang": "karawang",
+  "garut": "garut", "serang": "serang", "cilegon": "cilegon",
+  "semarang": "semarang", "solo": "surakarta", "surakarta": "surakarta", "yogyakarta": "yogyakarta",
+  "jogja": "yogyakarta", "jogjakarta": "yogyakarta", "yogya": "yogyakarta", "jogya": "yogyakarta",
+  "sleman": "sleman", "bantul": "bantul", "magelang": "magelang", "salatiga": "salatiga",
+  "pekalongan": "pekalongan", "tegal": "tegal", "purwokerto": "purwokerto", "kudus": "kudus",
+  "jepara": "jepara", "klaten": "klaten",
+  "surabaya": "surabaya", "sidoarjo": "sidoarjo", "gresik": "gresik", "malang": "malang",
+  "kediri": "kediri", "madiun": "madiun", "jember": "jember", "mojokerto": "mojokerto",
+  "pasuruan": "pasuruan", "probolinggo": "probolinggo", "banyuwangi": "banyuwangi",
+  "bali": "bali", "denpasar": "denpasar", "badung": "badung", "gianyar": "gianyar",
+  "mataram": "mataram", "kupang": "kupang",
+  "medan": "medan", "binjai": "binjai", "pematangsiantar": "pematangsiantar", "padang": "padang",
+  "bukittinggi": "bukittinggi", "pekanbaru": "pekanbaru", "batam": "batam", "tanjung pinang": "tanjung pinang",
+  "jambi": "jambi", "palembang": "palembang", "bengkulu": "bengkulu", "lampung": "lampung",
+  "bandar lampung": "bandar lampung", "pangkal pinang": "pangkal pinang", "banda aceh": "banda aceh",
+  "pontianak": "pontianak", "banjarmasin": "banjarmasin", "banjarbaru": "banjarbaru",
+  "balikpapan": "balikpapan", "samarinda": "samarinda", "palangkaraya": "palangkaraya", "tarakan": "tarakan",
+  "makassar": "makassar", "manado": "manado", "palu": "palu", "kendari": "kendari", "gorontalo": "gorontalo",
+  "ambon": "ambon", "ternate": "ternate", "jayapura": "jayapura", "sorong": "sorong", "merauke": "merauke",
+}
+
+# Nama kota yang juga kata/produk biasa ("palu", "nasi padang", "gitar solo"):
+# hanya dianggap lokasi kalau didahului kata penunjuk lokasi ("di", "kota", ...)
+AMBIGUOUS_CITIES = {"palu", "padang", "malang", "solo", "serang", "tegal", "badung", "lampung"}
+
+COLORS = {
+  "hitam", "putih", "merah", "merah muda", "biru", "biru muda", "biru dongker", "dongker", "navy",
+  "hijau", "hijau army", "army", "kuning", "ungu", "pink", "abu-abu", "abu abu", "abu", "coklat",
+  "cokelat", "emas", "gold", "rose gold", "silver", "perak", "oranye", "orange", "jingga", "cream",
+  "krem", "tosca", "toska", "maroon", "marun", "mint", "lilac", "salem", "peach", "khaki", "beige",
+  "black", "white", "red", "blue", "green", "yellow", "purple", "grey", "gray", "space gray",
+  "brown", "midnight", "starlight", "graphite",
+}
+
+CONDITIONS = {
+  "baru": "baru", "new": "baru", "bnib": "baru", "bnob": "baru", "segel": "baru",
+  "bekas": "bekas", "second": "bekas", "seken": "bekas", "2nd": "bekas", "preloved": "bekas",
+  "used": "bekas", "copotan": "bekas",
+}
+
+RAM_SIZES = {1, 2, 3, 4, 6, 8, 12, 16, 18, 24, 32, 64}
+STORAGE_SIZES = {4, 8, 16, 32, 64, 128, 256, 512, 1000, 1024, 2048}
+
+FILTER_KEYS = ("harga_min", "harga_max", "storage", "ram", "color", "location", "condition")
+
+
+def _alternation(words) -> str:
+  # Frasa terpanjang dulu supaya "jakarta selatan" menang atas "jakarta"
+  return "|".join(r"\s+".join(map(re.escape, w.split())) for w in sorted(words, key=len, reverse=True))
+
+
+# ------------------------------------------------------------
+# POLA
+# - Harga: angka + satuan (juta/jt/ribu/rb/k) atau awalan rp; angka polos
+#   hanya dianggap harga kalau >= 1000
+# - Setiap pola ikut memakan kata pengantarnya ("harga", "warna", "di", ...)
+#   supaya sisa kueri bersih untuk embedding
+# ------------------------------------------------------------
+_NUMBER = r"\d+(?:[.,]\d+)*"
+_UNIT = r"juta|jt|ribu|rebu|rb|k"
+_MONEY = rf"(?:\brp\.?\s*(?=\d)|\b){_NUMBER}\s*(?:{_UNIT})?\b"
+_PRICE_PREFIX = r"(?:\b(?:harga|budget|bujet|dana)\s*)?"
+
+MONEY_RE = re.compile(rf"(?P<rp>rp\.?\s*)?(?P<num>{_NUMBER})\s*(?P<unit>{_UNIT})?$")
+
+PRICE_RANGE_RE = re.compile(
+  rf"{_PRICE_PREFIX}(?:\bantara\s+)?(?P<a>{_MONEY})\s*(?:-|–|s/d|s\.d\.?|\bsampai\b|\bsampe\b|\bhingga\b|\bdan\b)\s*(?P<b>{_MONEY})"
+)
+PRICE_BAND_RE = re.compile(rf"{_PRICE_PREFIX}(?:\b(?P<n>\d+)\s*(?:jutaan|jt-?an)|\b(?P<ratusan>ratusan\s+ribu(?:an)?))\b")
+PRICE_MAX_RE = re.compile(
+  rf"{_PRICE_PREFIX}(?:\bdi\s*bawah|\bkurang\s+dari|\bmaks(?:imal|imum)?\.?|\bmax(?:imal)?\b|\bunder\b|<=?|"
+  rf"\b(?:tidak|gak|ga|nggak)\s+lebih\s+dari|\bsampai|\bhingga)\s*(?P<a>{_MONEY})"
+)
+PRICE_MIN_RE = re.compile(
+  rf"{_PRICE_PREFIX}(?:\bdi\s*atas|\blebih\s+dari|\bmin(?:imal|imum)?\.?|\bmulai(?:\s+dari)?|\bover\b|>=?)\s*(?P<a>{_MONEY})"
+)
+PRICE_AROUND_RE = re.compile(rf"{_PRICE_PREFIX}(?:\bsekitar|\bkisaran|\bkurang\s+lebih|\bkurleb|±|\+-)\s*(?P<a>{_MONEY})")
+PRICE_BARE_RE = re.compile(rf"{_PRICE_PREFIX}(?P<a>{_MONEY})")
+
+RAM_STORAGE_RE = re.compile(r"\b(?P<ram>\d{1,2})\s*(?:gb)?\s*/\s*(?P<rom>\d{1,4})\s*(?P<unit>gb|tb)?\b")
+RAM_RE = re.compile(r"\bram\s*(?P<n>\d{1,2})\s*(?:gb|g)?\b|\b(?P<m>\d{1,2})\s*gb\s*ram\b")
+STORAGE_RE = re.compile(
+  r"\b(?:rom|internal|memori|memory|storage|penyimpanan)\s*(?P<n>\d{1,4})\s*(?P<unit>gb|tb)?\b"
+  r"|\b(?P<m>\d{1,4})\s*(?P<unit2>gb|tb)\s*(?:rom|internal|storage)\b"
+)
+SIZE_RE = re.compile(r"\b(?P<n>\d{1,4})\s*(?P<unit>gb|tb)\b")
+
+CONDITION_RE = re.compile(
+  rf"(?:\bkondisi\s+)?\b(?P<w>{_alternation(set(CONDITIONS) - {'new'})}|new(?!\s+(?:balance|era)))\b"
+)
+COLOR_RE = re.compile(rf"(?:\bwarna\s+)?\b(?P<w>{_alternation(COLORS)})\b")
+CITY_RE = re.compile(
+  rf"(?:\b(?P<cue>di|daerah|area|kota|kab(?:upaten)?\.?|lokasi|dari|wilayah)\s+)?\b(?P<w>{_alternation(CITIES)})\b"
+)
+
+# Sisa kueri yang masih tampak berisi filter -> serahkan ke LLM
+LEFTOVER_RE = re.compile(
+  rf"\d\s*(?:{_UNIT}|gb|tb)\b|\b(?:rp|harga|budget|juta|ribu|warna|kondisi|ram|rom|lokasi|daerah|kota|"
+  r"dibawah|diatas|bawah|atas)\b|\bdi\s+(?!jual\b)[a-z]{3,}"
+)
+
+
+# ------------------------------------------------------------
+# HELPER
+# ------------------------------------------------------------
+def _money(text: str) -> Optional[int]:
+  """'5 juta' -> 5000000, 'rp 1.500.000' -> 1500000, '150rb' -> 150000; None kalau bukan harga."""
+  match = MONEY_RE.match(text.strip())
+  if not match:
+    return None
+  num, unit = match.group("num"), match.group("unit")
+  separators = re.findall(r"[.,]", num)
+  if unit and len(separators) == 1:
+    value = float(num.replace(",", "."))
+  else:
+    value = float(re.sub(r"[.,]", "", num))
+
+  if unit in ("juta", "jt"):
+    value *= 1_000_000
+  elif unit in ("ribu", "rebu", "rb"):
+    value *= 1_000
+  elif unit == "k":
+    # "4k" / "8k" biasanya resolusi layar, bukan harga
+    if value < 10:
+      return None
+    value *= 1_000
+  elif not match.group("rp") and value < 1000:
+    return None
+  return int(round(value))
+
+
+def _size(n: str, unit: Optional[str]) -> str:
+  return f"{int(n)}{(unit or 'gb').upper()}"
+
+
+class _Cursor:
+  """Teks kueri yang bagian-bagiannya 'dimakan' (diganti spasi) setelah dikenali."""
+
+  def __init__(self, text: str):
+    self.text = text
+
+  def take(self, match: re.Match):
+    start, end = match.span()
+    self.text = self.text[:start] + " " * (end - start) + self.text[end:]
+
+
+# ------------------------------------------------------------
+# EXTRACTOR
+# - Urutan penting: harga dulu (angka + satuan), lalu RAM/storage (GB/TB),
+#   baru kata-kata gazetteer
+# ------------------------------------------------------------
+def _extract_price(cur: _Cursor, filters: Dict):
+  for match in PRICE_RANGE_RE.finditer(cur.text):
+    a_text, b_text = match.group("a"), match.group("b")
+    b = _money(b_text)
+    if b is None:
+      continue
+    b_unit = MONEY_RE.match(b_text.strip()).group("unit")
+    a_unit = MONEY_RE.match(a_text.strip()).group("unit")
+    # "1-2 juta": satuan angka pertama ikut angka kedua
+    a = _money(a_text + (b_unit if b_unit and not a_unit else ""))
+    if a is None:
+      continue
+    filters["harga_min"], filters["harga_max"] = min(a, b), max(a, b)
+    cur.take(match)
+    return
+
+  match = PRICE_BAND_RE.search(cur.text)
+  if match:
+    if match.group("ratusan"):
+      filters["harga_min"], filters["harga_max"] = 100_000, 999_999
+    else:
+      n = int(match.group("n"))
+      filters["harga_min"], filters["harga_max"] = n * 1_000_000, (n + 1) * 1_000_000 - 1
+    cur.take(match)
+    return
+
+  for pattern, keys in ((PRICE_MAX_RE, ("harga_max",)), (PRICE_MIN_RE, ("harga_min",))):
+    for match in pattern.finditer(cur.text):
+      value = _money(match.group("a"))
+      if value is not None:
+        filters[keys[0]] = value
+        cur.take(match)
+        break
+  if "harga_min" in filters or "harga_max" in filters:
+    return
+
+  for match in PRICE_AROUND_RE.finditer(cur.text):
+    value = _money(match.group("a"))
+    if value is not None:
+      filters["harga_min"] = int(value * (1 - QUERY_PARSER_PRICE_TOLERANCE))
+      filters["harga_max"] = int(value * (1 + QUERY_PARSER_PRICE_TOLERANCE))
+      cur.take(match)
+      return
+
+  # Harga polos ("hp 2 juta") dibaca sebagai budget
+  for match in PRICE_BARE_RE.finditer(cur.text):
+    a_text = match.group("a").strip()
+    money = MONEY_RE.match(a_text)
+    if not (money.group("unit") or money.group("rp") or match.group(0).strip() != a_text):
+      continue
+    value = _money(a_text)
+    if value is not None:
+      filters["harga_max"] = value
+      cur.take(match)
+      return
+
+
+def _extract_memory(cur: _Cursor, filters: Dict):
+  for match in RAM_STORAGE_RE.finditer(cur.text):
+    ram, rom, unit = int(match.group("ram")), int(match.group("rom")), match.group("unit")
+    if ram in RAM_SIZES and (rom in STORAGE_SIZES or unit == "tb") and (unit == "tb" or rom > ram):
+      filters["ram"], filters["storage"] = _size(ram, "gb"), _size(rom, unit)
+      cur.take(match)
+      break
+
+  if "ram" not in filters:
+    match = RAM_RE.search(cur.text)
+    if match:
+      filters["ram"] = _size(match.group("n") or match.group("m"), "gb")
+      cur.take(match)
+
+  if "storage" not in filters:
+    match = STORAGE_RE.search(cur.text)
+    if match:
+      filters["storage"] = _size(match.group("n") or match.group("m"), match.group("unit") or match.group("unit2"))
+      cur.take(match)
+
+  # "128gb" / "8gb" polos: TB atau >= 32GB dianggap storage, sisanya RAM.
+  # Salah tebak berarti filter exact ke kolom facet yang salah (storage_gb vs
+  # ram_gb) dan hasilnya kosong, jadi ambang ini sengaja konservatif
+  for match in SIZE_RE.finditer(cur.text):
+    n, unit = int(match.group("n")), match.group("unit")
+    key = "storage" if unit == "tb" or n >= 32 else "ram"
+    if key not in filters:
+      filters[key] = _size(n, unit)
+      cur.take(match)
+
+
+def _extract_words(cur: _Cursor, filters: Dict):
+  match = CONDITION_RE.search(cur.text)
+  if match:
+    filters["condition"] = CONDITIONS[re.sub(r"\s+", " ", match.group("w"))]
+    cur.take(match)
+
+  match = COLOR_RE.search(cur.text)
+  if match:
+    filters["color"] = re.sub(r"\s+", " ", match.group("w"))
+    cur.take(match)
+
+  for match in CITY_RE.finditer(cur.text):
+    city = re.sub(r"\s+", " ", match.group("w"))
+    if city in AMBIGUOUS_CITIES and not match.group("cue"):
+      continue
+    filters["location"] = CITIES[city]
+    cur.take(match)
+    break
+
+
+# ------------------------------------------------------------
+# API
+# ------------------------------------------------------------
+def parse_query(query: str) -> Dict:
+  """
+  Parser kueri berbasis aturan (tanpa LLM). Return dict:
+    filters       : subset FILTER_KEYS, format sama dengan keluaran ai_understand
+    semantic_query: sisa kueri setelah filter dikeluarkan (untuk embedding)
+    needs_llm     : True kalau sisa kueri masih tampak berisi filter yang
+                    tidak dikenali (mis. kota di luar gazetteer)
+  """
+  cur = _Cursor(" ".join(query.lower().split()))
+  filters: Dict = {}
+  _extract_price(cur, filters)
+  _extract_memory(cur, filters)
+  _extract_words(cur, filters)
+
+  rest = " ".join(re.sub(r"\s[,/\-]+(?=\s|$)", " ", f" {cur.text} ").split())
+  return {
+    "filters": filters,
+    "semantic_query": rest or query.strip(),
+    "needs_llm": bool(LEFTOVER_RE.search(rest)),
+  }
+
+
+def _llm_value(key: str, value):
+  """Nilai filter dari LLM -> int (harga) / str; None kalau bukan skalar yang bisa dipakai."""
+  if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+    return None
+  if key in ("harga_min", "harga_max"):
+    digits = re.sub(r"[^\d]", "", str(int(value)) if isinstance(value, float) else str(value))
+    return int(digits) if digits else None
+  return " ".join(str(value).split()) or None
+
+
+def merge_filters(rule_filters: Dict, llm_filters) -> Dict:
+  """
+  Gabungkan filter: hasil aturan menang, LLM hanya mengisi yang kosong.
+  Nilai LLM dinormalisasi dulu (harga -> int, lainnya -> str); list/dict/bool
+  dan key di luar FILTER_KEYS dibuang supaya filter_clause tidak crash.
+  """
+  merged = {}
+  if isinstance(llm_filters, dict):
+    for key, value in llm_filters.items():
+      value = _llm_value(key, value) if key in FILTER_KEYS else None
+      if value is not None:
+        merged[key] = value
+  merged.update(rule_filters)
+  return merged
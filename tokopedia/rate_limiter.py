@@ -0,0 +1,242 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+# Bucket per host disimpan di Postgres supaya semua proses/mesin berbagi
+# satu batas; 0 = bucket lokal per proses
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "1") == "1"
+RATE_LIMIT_INITIAL_RPS = float(os.getenv("RATE_LIMIT_INITIAL_RPS", 4))
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", 0.2))
+RATE_LIMIT_MAX_RPS = float(os.getenv("RATE_LIMIT_MAX_RPS", 20))
+# Request yang boleh langsung jalan setelah host lama diam
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 4))
+# AIMD: naik sedikit per respons sehat, turun kali-lipat saat host memberi sinyal
+RATE_LIMIT_INCREASE_RPS = float(os.getenv("RATE_LIMIT_INCREASE_RPS", 0.05))
+RATE_LIMIT_THROTTLE_FACTOR = float(os.getenv("RATE_LIMIT_THROTTLE_FACTOR", 0.5))
+RATE_LIMIT_ERROR_FACTOR = float(os.getenv("RATE_LIMIT_ERROR_FACTOR", 0.8))
+RATE_LIMIT_SLOW_FACTOR = float(os.getenv("RATE_LIMIT_SLOW_FACTOR", 0.9))
+# Respons lebih lambat dari ini dianggap tanda host mulai kewalahan
+RATE_LIMIT_SLOW_SECONDS = float(os.getenv("RATE_LIMIT_SLOW_SECONDS", 5))
+# Jeda seluruh host setelah 429/503 tanpa header Retry-After
+RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv("RATE_LIMIT_COOLDOWN_SECONDS", 30))
+# Kenaikan rate dikirim ke Postgres per sekian respons sehat (bukan per request)
+RATE_LIMIT_FEEDBACK_EVERY = int(os.getenv("RATE_LIMIT_FEEDBACK_EVERY", 10))
+
+# Retry per URL
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", 1))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", 60))
+
+THROTTLE_STATUS = {429, 503}
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+CREATE_RATE_LIMIT_TABLE = """
+  CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+    host       TEXT PRIMARY KEY,
+    rate       DOUBLE PRECISION NOT NULL,
+    next_at    DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+  );
+"""
+
+# Token bucket dalam bentuk jadwal (GCRA): tiap request memesan slot berikutnya
+# secara atomik; bucket penuh (burst) = slot boleh mundur sampai burst/rate detik
+# ke belakang. Return = detik yang harus ditunggu sebelum request dikirim.
+RESERVE_SLOT = """
+  INSERT INTO rate_limits AS r (host, rate, next_at)
+  VALUES (%(host)s, %(rate)s, EXTRACT(EPOCH FROM NOW()) + 1.0 / %(rate)s)
+  ON CONFLICT (host) DO UPDATE SET
+    next_at = GREATEST(r.next_at, EXTRACT(EPOCH FROM NOW()) - %(burst)s / r.rate) + 1.0 / r.rate
+  RETURNING GREATEST(0, r.next_at - 1.0 / r.rate - EXTRACT(EPOCH FROM NOW()));
+"""
+
+ADJUST_RATE = """
+  UPDATE rate_limits SET
+    rate = LEAST(%(max_rate)s, GREATEST(%(min_rate)s, rate * %(factor)s + %(add)s)),
+    next_at = GREATEST(next_at, EXTRACT(EPOCH FROM NOW()) + %(pause)s),
+    updated_at = NOW()
+  WHERE host = %(host)s;
+"""
+
+
+def host_of(url: str) -> str:
+  return urlsplit(url).netloc or url
+
+
+def backoff_delay(attempt: int, base: float = HTTP_BACKOFF_BASE_SECONDS, cap: float = HTTP_BACKOFF_MAX_SECONDS) -> float:
+  """Exponential backoff dengan full jitter: acak 0..min(cap, base * 2^attempt)."""
+  return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(response) -> Optional[float]:
+  """Header Retry-After (format detik); None kalau tidak ada / tidak terbaca."""
+  value = response.headers.get("Retry-After") if response is not None else None
+  try:
+    return max(0.0, float(value)) if value else None
+  except ValueError:
+    return None
+
+
+def is_transient(status: Optional[int] = None, error: Optional[BaseException] = None) -> bool:
+  if error is not None:
+    return isinstance(error, httpx.TransportError)
+  return status in TRANSIENT_STATUS
+
+
+# ------------------------------------------------------------
+# RateLimiter
+# - acquire(url) / await acquire_async(url) sebelum setiap request
+# - record(url, status, latency) setelahnya:
+#   - 429/503     -> rate x THROTTLE_FACTOR, host dijeda (Retry-After / COOLDOWN)
+#   - 5xx/timeout -> rate x ERROR_FACTOR
+#   - lambat      -> rate x SLOW_FACTOR
+#   - sehat       -> rate + INCREASE (dikumpulkan, dikirim per FEEDBACK_EVERY)
+# - Shared: state di tabel rate_limits (koneksi sendiri per proses);
+#   kalau Postgres tidak bisa dipakai, sementara memakai bucket lokal
+# ------------------------------------------------------------
+class RateLimiter:
+  def __init__(
+    self,
+    shared: bool = RATE_LIMIT_SHARED,
+    initial_rps: float = RATE_LIMIT_INITIAL_RPS,
+    min_rps: float = RATE_LIMIT_MIN_RPS,
+    max_rps: float = RATE_LIMIT_MAX_RPS,
+    burst: float = RATE_LIMIT_BURST
+  ):
+    self.shared = shared
+    self.initial_rps = initial_rps
+    self.min_rps = min_rps
+    self.max_rps = max_rps
+    self.burst = burst
+    self._lock = threading.Lock()
+    self._local: Dict[str, list] = {}
+    self._healthy: Dict[str, int] = {}
+    self._conn = None
+    self._retry_shared_at = 0.0
+
+  # ---------------- slot ----------------
+  def reserve(self, url: str) -> float:
+    """Pesan slot request untuk host URL; return detik tunggu."""
+    host = host_of(url)
+    if self.shared:
+      wait = self._shared(RESERVE_SLOT, {"host": host, "rate": self.initial_rps, "burst": self.burst}, fetch=True)
+      if wait is not None:
+        return float(wait)
+    return self._local_reserve(host)
+
+  def acquire(self, url: str) -> float:
+    wait = self.reserve(url)
+    if wait > 0:
+      time.sleep(wait)
+    return wait
+
+  async def acquire_async(self, url: str) -> float:
+    wait = await asyncio.to_thread(self.reserve, url) if self.shared else self.reserve(url)
+    if wait > 0:
+      await asyncio.sleep(wait)
+    return wait
+
+  # ---------------- feedback ----------------
+  def record(self, url: str, status: Optional[int] = None, latency: Optional[float] = None,
+             error: Optional[BaseException] = None, retry_after: Optional[float] = None):
+    host = host_of(url)
+    if status in THROTTLE_STATUS:
+      pause = retry_after if retry_after is not None else RATE_LIMIT_COOLDOWN_SECONDS
+      logger.warning(f"Rate limit {host}: HTTP {status}, rate x{RATE_LIMIT_THROTTLE_FACTOR}, jeda {pause:.0f}s.")
+      self._adjust(host, factor=RATE_LIMIT_THROTTLE_FACTOR, pause=pause)
+    elif error is not None or (status is not None and status >= 500):
+      self._adjust(host, factor=RATE_LIMIT_ERROR_FACTOR)
+    elif latency is not None and latency > RATE_LIMIT_SLOW_SECONDS:
+      self._adjust(host, factor=RATE_LIMIT_SLOW_FACTOR)
+    elif status is not None and status < 400:
+      with self._lock:
+        healthy = self._healthy.get(host, 0) + 1
+        self._healthy[host] = 0 if healthy >= RATE_LIMIT_FEEDBACK_EVERY else healthy
+      if healthy >= RATE_LIMIT_FEEDBACK_EVERY:
+        self._adjust(host, add=RATE_LIMIT_INCREASE_RPS * healthy)
+
+  def rate(self, host: str) -> float:
+    with self._lock:
+      return self._local.get(host, [self.initial_rps])[0]
+
+  def _adjust(self, host: str, factor: float = 1.0, add: float = 0.0, pause: float = 0.0):
+    self._local_adjust(host, factor, add, pause)
+    if self.shared:
+      self._shared(ADJUST_RATE, {
+        "host": host, "factor": factor, "add": add, "pause": pause,
+        "min_rate": self.min_rps, "max_rate": self.max_rps
+      })
+
+  # ---------------- bucket lokal ----------------
+  def _local_reserve(self, host: str) -> float:
+    with self._lock:
+      now = time.time()
+      state = self._local.setdefault(host, [self.initial_rps, now])
+      rate, next_at = state
+      slot = max(next_at, now - self.burst / rate)
+      state[1] = slot + 1.0 / rate
+      return max(0.0, slot - now)
+
+  def _local_adjust(self, host: str, factor: float, add: float, pause: float):
+    with self._lock:
+      state = self._local.setdefault(host, [self.initial_rps, time.time()])
+      state[0] = min(self.max_rps, max(self.min_rps, state[0] * factor + add))
+      state[1] = max(state[1], time.time() + pause)
+
+  # ---------------- postgres ----------------
+  def _shared(self, sql: str, params: Dict, fetch: bool = False):
+    if time.monotonic() < self._retry_shared_at:
+      return None
+    with self._lock:
+      try:
+        if self._conn is None or self._conn.closed:
+          self._conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            dbname=os.getenv("DB_NAME"),
+            connect_timeout=5
+          )
+          self._conn.autocommit = True
+          with self._conn.cursor() as cur:
+            cur.execute(CREATE_RATE_LIMIT_TABLE)
+        with self._conn.cursor() as cur:
+          cur.execute(sql, params)
+          return cur.fetchone()[0] if fetch else True
+      except psycopg2.Error as e:
+        logger.warning(f"Rate limiter Postgres tidak bisa dipakai, sementara pakai bucket lokal: {e}")
+        if self._conn is not None:
+          self._conn.close()
+        self._conn = None
+        self._retry_shared_at = time.monotonic() + 60
+        return None
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_pid: Optional[int] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+  """Limiter per proses (koneksi Postgres-nya tidak dibawa lintas fork)."""
+  global _limiter, _limiter_pid
+  if _limiter is None or _limiter_pid != os.getpid():
+    _limiter = RateLimiter()
+    _limiter_pid = os.getpid()
+  return _limiter
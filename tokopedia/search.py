@@ -8,35 +8,23 @@ Jalankan:
 
 import os
 import json
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 from openai import OpenAI
+from embedding import openai_embed_batch
+from db_pool import execute_prepared, pooled_connection
+from pgvector_adapter import to_vector
+from vector_index import VectorIndexManager
+from query_parser import parse_query, merge_filters
+from facets import normalize_city
 
 load_dotenv()
 
 # ENV VARS
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "db_ecommerce")
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "admin")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-# =============================
-# Connection
-# =============================
-def connect_db():
-  return psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    dbname=DB_NAME
-  )
-
 
 # =============================
 # AI Query Understanding
@@ -87,65 +75,56 @@ def ai_understand(query: str) -> str:
 # Embedding Generator
 # =============================
 def generate_embedding(text: str):
-  resp = client.embeddings.create(
-    model="text-embedding-3-small",
-    input=text
-  )
-  return resp.data[0].embedding
+  embedding = openai_embed_batch([text])[0]
+  if embedding is None:
+    raise RuntimeError("Gagal membuat embedding query.")
+  return to_vector(embedding)
 
 
 # =============================
 # SEMANTIC SEARCH
 # =============================
-def semantic_search(user_query: str, top_k=10):
-  conn = connect_db()
-  cur = conn.cursor(cursor_factory=RealDictCursor)
-
-  # Query Understanding
-  parsed_query = ai_understand(user_query)
-  understood = parsed_query.get("semantic_query")
-  filters = parsed_query.get("filters", {})
+def semantic_search(user_query: str, top_k=10, recall=None):
+  # Query Understanding: parser aturan dulu, LLM hanya kalau ada sisa filter
+  parsed_query = parse_query(user_query)
+  understood = parsed_query["semantic_query"]
+  filters = parsed_query["filters"]
+  if parsed_query["needs_llm"]:
+    ai_query = ai_understand(user_query)
+    understood = ai_query.get("semantic_query") or understood
+    filters = merge_filters(filters, ai_query.get("filters"))
   print("\n🧠 AI Pahami Query (Semantic) →", understood)
   print("🔎 Filter Absolut →", filters)
 
   # Buat embedding query
   emb = generate_embedding(understood)
-  emb_str = "[" + ",".join(map(str, emb)) + "]"
 
-  # pgvector search
-  base_sql = """
-    SELECT
+  # pgvector search (kandidat ANN dari produk yang lolos filter)
+  select_sql = """
       pc.product_id,
       p.name AS product_name,
       p.price AS product_price,
       p.url AS product_url,
       pc.chunk_text,
-      (pc.embedding <=> %s::vector) AS distance
-    FROM products p 
-    JOIN product_chunks pc ON p.id = pc.product_id
+      pc.distance
   """
   where_clause = " WHERE 1=1 "
   filter_params = []
 
   if filters.get("location"):
-    where_clause += " AND p.shop_location ILIKE %s "
-    filter_params.append(f"%{filters['location']}%")
+    where_clause += " AND p.city ILIKE %s "
+    filter_params.append(f"%{normalize_city(filters['location'])}%")
 
   if filters.get("color"):
-    where_clause += " AND p.variant_spec ->> 'warna' ILIKE %s "
-    filter_params.append(f"%{filters['color']}%")
-
-  final_sql = base_sql + where_clause + """
-    ORDER BY pc.embedding <=> %s::vector
-    LIMIT %s;
-  """
-
-  params = [emb_str] + filter_params + [emb_str, top_k]
+    where_clause += " AND p.color ILIKE %s "
+    filter_params.append(f"%{filters['color'].strip().lower()}%")
 
-  cur.execute(final_sql, tuple(params))
-  rows = cur.fetchall()
+  # Koneksi dipinjam dari pool hanya untuk query vektor
+  with pooled_connection() as conn:
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+      index_manager = VectorIndexManager(conn)
+      rows = index_manager.search(cur, select_sql, where_clause, emb, filter_params, top_k, recall)
 
-  conn.close()
   filtered = [r for r in rows if float(r["distance"]) <= 0.3]
   return filtered
 
@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+import json_backend
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+# Jumlah entri maksimum per layer di memori proses (LRU)
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 2000))
+SEARCH_CACHE_INTENT_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_INTENT_TTL_SECONDS", 3600))
+SEARCH_CACHE_EMBEDDING_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_EMBEDDING_TTL_SECONDS", 86400))
+SEARCH_CACHE_RESULT_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_RESULT_TTL_SECONDS", 600))
+# Tabel search_cache di Postgres sebagai layer kedua, dipakai bersama antar proses/mesin
+SEARCH_CACHE_PG = os.getenv("SEARCH_CACHE_PG", "0") == "1"
+
+MISS = object()
+
+# Generasi per kategori: dinaikkan writer produk di transaksi yang sama,
+# hasil pencarian yang disimpan dengan generasi lama otomatis dianggap basi
+CREATE_GENERATION_TABLE = """
+  CREATE TABLE IF NOT EXISTS search_cache_generations (
+    category_id TEXT PRIMARY KEY,
+    generation  BIGINT NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP DEFAULT NOW()
+  );
+"""
+
+BUMP_GENERATIONS = """
+  INSERT INTO search_cache_generations AS g (category_id, generation)
+  SELECT category_id, 1 FROM unnest(%s::text[]) AS category_id
+  ON CONFLICT (category_id) DO UPDATE SET
+    generation = g.generation + 1,
+    updated_at = NOW();
+"""
+
+SELECT_GENERATION = """
+  SELECT COALESCE(MAX(generation), 0) AS generation
+  FROM search_cache_generations
+  WHERE category_id = %s;
+"""
+
+CREATE_SHARED_TABLE = """
+  CREATE UNLOGGED TABLE IF NOT EXISTS search_cache (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      JSONB NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (namespace, key)
+  );
+"""
+
+
+# Nilai tanpa padanan JSON (NUMERIC, TIMESTAMP, numpy, tuple) disimpan bertag di
+# layer Postgres, supaya baris yang dibaca balik bertipe sama dengan hasil query langsung
+TYPE_TAG = "__search_cache_type__"
+
+
+def encode_value(value: Any) -> Any:
+  """Nilai Python -> struktur JSON; tipe yang tidak dikenal -> TypeError (tidak di-share)."""
+  if value is None or isinstance(value, (str, bool, int, float)):
+    return value
+  if isinstance(value, dict):
+    return {key: encode_value(item) for key, item in value.items()}
+  if isinstance(value, list):
+    return [encode_value(item) for item in value]
+  if isinstance(value, tuple):
+    return {TYPE_TAG: "tuple", "v": [encode_value(item) for item in value]}
+  if isinstance(value, Decimal):
+    return {TYPE_TAG: "decimal", "v": str(value)}
+  if isinstance(value, datetime):
+    return {TYPE_TAG: "datetime", "v": value.isoformat()}
+  if isinstance(value, date):
+    return {TYPE_TAG: "date", "v": value.isoformat()}
+  if isinstance(value, np.ndarray):
+    return {TYPE_TAG: "ndarray", "dtype": value.dtype.str, "v": value.tolist()}
+  if isinstance(value, np.generic):
+    return {TYPE_TAG: "numpy", "dtype": value.dtype.str, "v": value.item()}
+  raise TypeError(f"Tipe {type(value).__name__} tidak bisa disimpan di search cache bersama")
+
+
+def decode_value(value: Any) -> Any:
+  if isinstance(value, list):
+    return [decode_value(item) for item in value]
+  if not isinstance(value, dict):
+    return value
+  kind = value.get(TYPE_TAG)
+  if kind is None:
+    return {key: decode_value(item) for key, item in value.items()}
+  if kind == "tuple":
+    return tuple(decode_value(item) for item in value["v"])
+  if kind == "decimal":
+    return Decimal(value["v"])
+  if kind == "datetime":
+    return datetime.fromisoformat(value["v"])
+  if kind == "date":
+    return date.fromisoformat(value["v"])
+  if kind == "ndarray":
+    return np.asarray(value["v"], dtype=np.dtype(value["dtype"]))
+  if kind == "numpy":
+    return np.dtype(value["dtype"]).type(value["v"])
+  raise ValueError(f"Tag search cache tidak dikenal: {kind}")
+
+
+def normalize_query(query: str) -> str:
+  return re.sub(r"\s+", " ", (query or "").lower()).strip()
+
+
+def _hash(*parts) -> str:
+  payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+  return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def vector_hash(vector) -> str:
+  return hashlib.sha256(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()[:32]
+
+
+def invalidate_categories(cur, category_ids: Iterable):
+  """
+  Naikkan generasi kategori yang produknya berubah. Dipanggil di dalam
+  transaksi writer, jadi hasil cache baru basi begitu data ter-commit.
+  """
+  ids = sorted({str(category_id) for category_id in category_ids if category_id})
+  if ids:
+    cur.execute(BUMP_GENERATIONS, (ids,))
+
+
+# ------------------------------------------------------------
+# LRUCache
+# - OrderedDict + TTL per entri, aman dipakai lintas thread
+# ------------------------------------------------------------
+class LRUCache:
+  def __init__(self, max_entries: int, ttl: float):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self._data: "OrderedDict[str, tuple]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key: str) -> Any:
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is None or entry[0] < time.monotonic():
+        if entry is not None:
+          del self._data[key]
+        self.misses += 1
+        return MISS
+      self._data.move_to_end(key)
+      self.hits += 1
+      return entry[1]
+
+  def put(self, key: str, value: Any, ttl: Optional[float] = None):
+    with self._lock:
+      self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.max_entries:
+        self._data.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+
+# ------------------------------------------------------------
+# SearchCache
+# - intent   : kueri ternormalisasi (+ watermark tree kategori) -> hasil
+#              parser/router/LLM (semantic_query, L3, filters)
+# - embedding: teks kueri -> vektor float32 (hanya lokal; layer persisten
+#              sudah ada di EmbeddingCache)
+# - result   : (l3_id, filters, hash vektor, top_k, recall, opsi) -> baris hasil,
+#              valid selama generasi kategori belum dinaikkan writer
+# - get_conn : callable context manager koneksi untuk layer Postgres (opsional)
+# ------------------------------------------------------------
+class SearchCache:
+  def __init__(self, get_conn: Optional[Callable] = None, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+    self.get_conn = get_conn
+    self.intents = LRUCache(max_entries, SEARCH_CACHE_INTENT_TTL_SECONDS)
+    self.embeddings = LRUCache(max_entries, SEARCH_CACHE_EMBEDDING_TTL_SECONDS)
+    self.results = LRUCache(max_entries, SEARCH_CACHE_RESULT_TTL_SECONDS)
+    self.shared_hits = 0
+    self._schema_ready = False
+    self._shared_ready = False
+    self._shared_puts = 0
+
+  def stats(self) -> Dict:
+    return {
+      name: {"hits": layer.hits, "misses": layer.misses, "entries": len(layer._data)}
+      for name, layer in (("intent", self.intents), ("embedding", self.embeddings), ("result", self.results))
+    } | {"shared_hits": self.shared_hits}
+
+  def clear(self):
+    for layer in (self.intents, self.embeddings, self.results):
+      layer.clear()
+
+  # ---------------- intent ----------------
+  def get_intent(self, query: str, watermark=None) -> Optional[Dict]:
+    key = _hash(normalize_query(query), watermark)
+    intent = self._get("intent", self.intents, key)
+    return None if intent is MISS else intent
+
+  def put_intent(self, query: str, intent: Dict, watermark=None):
+    key = _hash(normalize_query(query), watermark)
+    self._put("intent", self.intents, key, intent)
+
+  # ---------------- embedding ----------------
+  def embedding(self, text: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+    key = " ".join(text.split())
+    vector = self.embeddings.get(key)
+    if vector is MISS:
+      vector = compute(text)
+      self.embeddings.put(key, vector)
+    return vector
+
+  # ---------------- result ----------------
+  def generation(self, cur, category_id) -> int:
+    if not self._schema_ready:
+      cur.execute(CREATE_GENERATION_TABLE)
+      self._schema_ready = True
+    cur.execute(SELECT_GENERATION, (str(category_id),))
+    row = cur.fetchone()
+    return row["generation"] if isinstance(row, dict) else row[0]
+
+  def search_results(self, cur, l3_id, filters: Dict, query_vector, top_k: int, recall, compute: Callable[[], list], options: Optional[Dict] = None) -> list:
+    """
+    Hasil final_product_search dari cache kalau generasi kategori masih sama; kalau tidak, compute().
+    `options` = opsi lain yang mengubah hasil (mis. mode hybrid), ikut jadi bagian key.
+    """
+    generation = self.generation(cur, l3_id)
+    key = _hash(str(l3_id), filters or {}, vector_hash(query_vector), top_k, recall, options or {})
+    entry = self._get("result", self.results, key)
+    if entry is not MISS and entry.get("generation") == generation:
+      return entry["rows"]
+
+    rows = compute()
+    self._put("result", self.results, key, {"generation": generation, "rows": rows})
+    return rows
+
+  # ---------------- layer lokal + postgres ----------------
+  def _get(self, namespace: str, layer: LRUCache, key: str) -> Any:
+    value = layer.get(key)
+    if value is MISS and self.get_conn:
+      value = self._shared_get(namespace, key)
+      if value is not MISS:
+        self.shared_hits += 1
+        layer.put(key, value)
+    return value
+
+  def _put(self, namespace: str, layer: LRUCache, key: str, value: Any):
+    layer.put(key, value)
+    if self.get_conn:
+      self._shared_put(namespace, key, value, layer.ttl)
+
+  def _shared(self, cur):
+    if not self._shared_ready:
+      cur.execute(CREATE_SHARED_TABLE)
+      self._shared_ready = True
+
+  def _shared_get(self, namespace: str, key: str) -> Any:
+    try:
+      with self.get_conn() as conn:
+        with conn.cursor() as cur:
+          self._shared(cur)
+          cur.execute(
+            "SELECT value FROM search_cache WHERE namespace = %s AND key = %s AND expires_at > NOW();",
+            (namespace, key)
+          )
+          row = cur.fetchone()
+      value = row[0] if row else MISS
+      return MISS if value is MISS else decode_value(json_backend.loads(value) if isinstance(value, str) else value)
+    except Exception as e:
+      logger.warning(f"Search cache Postgres tidak bisa dibaca: {e}")
+      return MISS
+
+  def _shared_put(self, namespace: str, key: str, value: Any, ttl: float):
+    try:
+      with self.get_conn() as conn:
+        with conn.cursor() as cur:
+          self._shared(cur)
+          cur.execute("""
+            INSERT INTO search_cache (namespace, key, value, expires_at)
+            VALUES (%s, %s, %s::jsonb, NOW() + %s * INTERVAL '1 second')
+            ON CONFLICT (namespace, key) DO UPDATE SET
+              value = EXCLUDED.value,
+              expires_at = EXCLUDED.expires_at;
+          """, (namespace, key, json_backend.dumps(encode_value(value)), ttl))
+          self._shared_puts += 1
+          if self._shared_puts % 500 == 0:
+            cur.execute("DELETE FROM search_cache WHERE expires_at < NOW();")
+    except Exception as e:
+      logger.warning(f"Search cache Postgres tidak bisa ditulis: {e}")
+
+
+_cache: Optional[SearchCache] = None
+_cache_pid: Optional[int] = None
+
+
+def get_search_cache() -> Optional[SearchCache]:
+  """Cache per proses; None kalau dimatikan."""
+  global _cache, _cache_pid
+  if not SEARCH_CACHE_ENABLED:
+    return None
+  if _cache is None or _cache_pid != os.getpid():
+    get_conn = None
+    if SEARCH_CACHE_PG:
+      from db_pool import pooled_connection
+      get_conn = pooled_connection
+    _cache = SearchCache(get_conn)
+    _cache_pid = os.getpid()
+  return _cache
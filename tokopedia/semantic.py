@@ -1,33 +1,43 @@
 import os
 import json
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 from openai import OpenAI
+from embedding import openai_embed_batch
+from db_pool import execute_prepared, pooled_connection
+from pgvector_adapter import to_vector
+from vector_index import VectorIndexManager
+from category_tree import get_category_tree
+from category_router import get_category_router
+from query_parser import parse_query, merge_filters
+from search_cache import get_search_cache
+from facets import normalize_city, normalize_condition, size_gb
 
 load_dotenv()
 
 # ENV VARS
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "db_ecommerce")
-DB_USER = os.getenv("DB_USER", "admin")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "admin")
+# Default mode hybrid (leksikal search_tsv/trigram + vektor, digabung RRF)
+SEARCH_HYBRID = os.getenv("SEARCH_HYBRID", "0") == "1"
+# > 0: hasil di-collapse jadi produk unik, maksimal N varian per parent (0 = baris per chunk)
+SEARCH_PER_GROUP = int(os.getenv("SEARCH_PER_GROUP", 0))
+# Thread untuk panggilan LLM yang dijalankan paralel dengan embedding
+SEARCH_LLM_WORKERS = int(os.getenv("SEARCH_LLM_WORKERS", 8))
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-# =============================
-# Connection
-# =============================
-def connect_db():
-  return psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    dbname=DB_NAME
-  )
+_llm_executor = None
+_llm_executor_pid = None
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+  """Executor per proses (thread tidak ikut ter-fork)."""
+  global _llm_executor, _llm_executor_pid
+  if _llm_executor is None or _llm_executor_pid != os.getpid():
+    _llm_executor = ThreadPoolExecutor(max_workers=SEARCH_LLM_WORKERS, thread_name_prefix="llm")
+    _llm_executor_pid = os.getpid()
+  return _llm_executor
 
 
 # =============================
@@ -113,68 +123,49 @@ def ai_select_best_l3(query: str, l3_categories: list) -> dict:
 # Embedding Generator
 # =============================
 def generate_embedding(text: str):
-  resp = client.embeddings.create(
-    model="text-embedding-3-small",
-    input=text
-  )
-  return resp.data[0].embedding
-
-def final_product_search(cur, query_vector, l3_category_id, top_k=50, filters=None):
-  base_sql = """
-    SELECT
-      pc.product_id,
-      p.name AS product_name,
-      p.price AS product_price,
-      p.url AS product_url,
-      p.stock,
-      p.sold,
-      p.reviews,
-      pc.chunk_text,
-      (pc.embedding <=> %s::vector) AS distance
-    FROM products p 
-    JOIN product_chunks pc ON p.id = pc.product_id
-  """
-  where_clause = f" WHERE 1=1 AND p.category_id = '{l3_category_id}' "
+  embedding = openai_embed_batch([text])[0]
+  if embedding is None:
+    raise RuntimeError("Gagal membuat embedding query.")
+  return to_vector(embedding)
+
+def filter_clause(category_id, filters: dict):
+  """WHERE (alias `p` = products) + parameternya untuk kategori L3 dan dict filter."""
+  where_clause = " WHERE 1=1 "
   filter_params = []
+  if category_id:
+    where_clause += " AND p.category_id = %s "
+    filter_params.append(category_id)
 
-  # print(filters)
+  # Filter memakai kolom facet ter-index (lihat facets.py), bukan jsonb_each_text per baris
   if filters.get("location"):
-    where_clause += " AND p.shop_location ILIKE %s "
-    filter_params.append(f"%{filters['location']}%")
+    where_clause += " AND p.city ILIKE %s "
+    filter_params.append(f"%{normalize_city(filters['location'])}%")
 
   if filters.get("color"):
-    where_clause += """
-      AND EXISTS (
-          SELECT 1
-          FROM jsonb_each_text(p.variant_spec) AS kv
-          WHERE kv.value ILIKE %s
-      )
-      """
-    filter_params.append(f"%{filters['color']}%")
-  
-  if filters.get("storage"):
-    where_clause += """
-      AND EXISTS (
-          SELECT 1
-          FROM jsonb_each_text(p.variant_spec) AS kv
-          WHERE kv.value ILIKE %s
-      )
-      """
-    filter_params.append(f"%{filters['storage']}%")
-
-  if filters.get("ram"):
-    where_clause += """
-      AND EXISTS (
-          SELECT 1
-          FROM jsonb_each_text(p.variant_spec) AS kv
-          WHERE kv.value ILIKE %s
-      )
-      """
-    filter_params.append(f"%{filters['ram']}%")
+    where_clause += " AND p.color ILIKE %s "
+    filter_params.append(f"%{filters['color'].strip().lower()}%")
+
+  for key, column in (("storage", "storage_gb"), ("ram", "ram_gb")):
+    if not filters.get(key):
+      continue
+    size = size_gb(filters[key])
+    if size is not None:
+      where_clause += f" AND p.{column} = %s "
+      filter_params.append(size)
+    else:
+      # Nilai bebas dari LLM (mis. "128 GB ke atas"): cara lama lewat variant_spec
+      where_clause += """
+        AND EXISTS (
+            SELECT 1
+            FROM jsonb_each_text(p.variant_spec) AS kv
+            WHERE kv.value ILIKE %s
+        )
+        """
+      filter_params.append(f"%{filters[key]}%")
 
   if filters.get("condition"):
-    where_clause += " AND p.detail ->> 'kondisi' ILIKE %s "
-    filter_params.append(f"%{filters['condition']}%")
+    where_clause += " AND p.condition = %s "
+    filter_params.append(normalize_condition(filters['condition']))
   
   harga_min_val = filters.get("harga_min")
   harga_max_val = filters.get("harga_max")
@@ -192,36 +183,57 @@ def final_product_search(cur, query_vector, l3_category_id, top_k=50, filters=No
     where_clause += " AND p.price <= %s "
     filter_params.append(harga_max_val)
 
-  final_sql = base_sql + where_clause + """
-    ORDER BY pc.embedding <=> %s::vector
-    LIMIT %s;
-  """
+  return where_clause, filter_params
 
-  params = [query_vector] + filter_params + [query_vector, top_k]
+def filter_products(cur, category_id, filters=None, limit=50, offset=0):
+  """Produk berdasarkan kategori + filter saja (tanpa vektor), urut terlaris."""
+  where_clause, filter_params = filter_clause(category_id, filters or {})
+  execute_prepared(cur, f"""
+    SELECT
+      p.id AS product_id,
+      p.name AS product_name,
+      p.price AS product_price,
+      p.url AS product_url,
+      p.stock,
+      p.sold,
+      p.reviews
+    FROM products p
+    {where_clause}
+    ORDER BY p.sold DESC NULLS LAST, p.id
+    LIMIT %s OFFSET %s;
+  """, filter_params + [limit, offset])
+  return cur.fetchall()
 
-  cur.execute(final_sql, tuple(params))
+def final_product_search(cur, query_vector, l3_category_id, top_k=50, filters=None, recall=None, hybrid_text=None, per_group=None):
+  select_sql = """
+      pc.product_id,
+      p.name AS product_name,
+      p.price AS product_price,
+      p.url AS product_url,
+      p.stock,
+      p.sold,
+      p.reviews,
+      pc.chunk_text,
+      pc.distance
+  """
+  where_clause, filter_params = filter_clause(l3_category_id, filters or {})
 
-  return cur.fetchall()
+  # Produk difilter dulu, kandidat ANN (index HNSW/IVFFlat) hanya dari produk yang lolos filter
+  index_manager = VectorIndexManager(cur.connection)
+  if hybrid_text:
+    # Nomor model / kata persis ("LG OLED55C4PSA") ketemu lewat index leksikal
+    return index_manager.hybrid_search(cur, select_sql, where_clause, query_vector, hybrid_text, filter_params, top_k, recall, per_group)
+  return index_manager.search(cur, select_sql, where_clause, query_vector, filter_params, top_k, recall, per_group)
 
 # =============================
-# SEMANTIC SEARCH
+# LLM ROUTING (fallback router lokal)
 # =============================
-def semantic_search(user_query: str, top_k=50):
-  conn = connect_db()
-  cur = conn.cursor(cursor_factory=RealDictCursor)
-
-  products_results = []
-  best_l3_category = None
-  # Query Understanding
-  cur.execute("""
-    SELECT
-      c.id as level_2_id,
-      c.name as level_2_name
-    FROM categories c 
-    WHERE 
-      "level" = 2;
-  """)
-  categories_level_2 = cur.fetchall()
+def llm_route(user_query: str, category_tree):
+  """Dua panggilan LLM: pilih L2 + filter, lalu pilih L3. Return (kategori L3 | None, filters)."""
+  categories_level_2 = [
+    {"level_2_id": c.id, "level_2_name": c.name}
+    for c in category_tree.level(2)
+  ]
 
   parsed_query = ai_understand(user_query, categories_level_2)
 
@@ -233,54 +245,150 @@ def semantic_search(user_query: str, top_k=50):
     if cat['level_2_name'] in matched_l2_names:
       matched_l2_ids.append(cat['level_2_id'])
 
-  final_l3_categories = []
-  if matched_l2_ids:
-    print(f"✅ Ditemukan kecocokan Kategori Level 2: {matched_l2_names}")
-    l2_ids_str = ", ".join([f"'{id}'" for id in matched_l2_ids])
-    cur.execute(f"""
-      SELECT
-        c.id as level_3_id,
-        c.name as level_3_name,
-        c.parent_id as level_2_parent_id
-      FROM categories c 
-      WHERE 
-        c.parent_id IN ({l2_ids_str}) AND c."level" = 3;
-    """)
-    final_l3_categories = cur.fetchall()
-    if final_l3_categories:
-      ai_result = ai_select_best_l3(user_query, final_l3_categories)
-      best_l3_name = ai_result.get('best_l3_match')
-      
-      if best_l3_name:
-        for cat in final_l3_categories:
-          if cat['level_3_name'] == best_l3_name:
-            best_l3_category = cat
-            break
-        
-        if best_l3_category:
-          l3_id = best_l3_category['level_3_id']
-          print(f"🔎 Memulai Pencarian Vektor Produk dengan Filter Kategori: {best_l3_category['level_3_name']}")
-          
-          try:
-            query_vector = generate_embedding(user_query)
-            products_results = final_product_search(cur, query_vector, l3_id, top_k, filtered_query)
-            
-            if products_results:
-              print(f"🎉 Ditemukan {len(products_results)} produk yang paling relevan.")
-            else:
-              print("⚠️ Tidak ada produk ditemukan di kategori L3 tersebut.")
-          except Exception as e:
-            print(f"🛑 Error saat mencari produk: {e}")
-        else:
-          print("⚠️ Kategori yang dipilih AI tidak ditemukan dalam daftar L3.")
-      else:
-        print("⚠️ AI tidak dapat memilih kategori Level 3 yang paling cocok.")
-    else:
-      print("⚠️ Tidak ditemukan Kategori Level 3 di bawah kategori yang cocok.")
-  else:
+  if not matched_l2_ids:
     print("❌ Tidak ditemukan Kategori Level 2 yang cocok. Melanjutkan dengan pencarian umum.")
+    return None, filtered_query
+
+  print(f"✅ Ditemukan kecocokan Kategori Level 2: {matched_l2_names}")
+  final_l3_categories = [
+    {"level_3_id": c.id, "level_3_name": c.name, "level_2_parent_id": c.parent_id}
+    for l2_id in matched_l2_ids
+    for c in category_tree.children(l2_id)
+    if c.level == 3
+  ]
+  if not final_l3_categories:
+    print("⚠️ Tidak ditemukan Kategori Level 3 di bawah kategori yang cocok.")
+    return None, filtered_query
+
+  ai_result = ai_select_best_l3(user_query, final_l3_categories)
+  best_l3_name = ai_result.get('best_l3_match')
+  if not best_l3_name:
+    print("⚠️ AI tidak dapat memilih kategori Level 3 yang paling cocok.")
+    return None, filtered_query
+
+  for cat in final_l3_categories:
+    if cat['level_3_name'] == best_l3_name:
+      return cat, filtered_query
+
+  print("⚠️ Kategori yang dipilih AI tidak ditemukan dalam daftar L3.")
+  return None, filtered_query
+
+# =============================
+# QUERY UNDERSTANDING (router lokal, LLM sebagai fallback)
+# =============================
+def understand_query(user_query: str, parsed: dict, query_vector, category_tree, llm_filters=None):
+  """
+  Return (kategori L3 | None, filters, complete) dari hasil parse_query + router
+  kategori; complete=False kalau filter dari LLM gagal diambil (jangan di-cache).
+  llm_filters: Future ai_understand untuk sisa filter yang sudah dijalankan
+  paralel dengan embedding (lihat semantic_search).
+  """
+  route = get_category_router().route(query_vector)
+  if route["confident"]:
+    best_l3 = route["l3"]
+    best_l3_category = {"level_3_id": best_l3.id, "level_3_name": best_l3.name, "level_2_parent_id": best_l3.parent_id}
+    print(f"✅ Router kategori: {' > '.join(best_l3.path)} (skor {route['score']:.3f}, margin {route['margin']:.3f})")
+    # LLM hanya untuk sisa filter yang tidak dikenali parser aturan; kalau LLM /
+    # jaringan error, pencarian tetap jalan dengan filter dari parser aturan
+    extra_filters, complete = None, True
+    try:
+      if llm_filters is not None:
+        extra_filters = llm_filters.result()
+      elif parsed["needs_llm"]:
+        extra_filters = ai_understand(user_query, []).get('filters')
+    except Exception as e:
+      print(f"⚠️ Filter dari AI gagal, memakai filter parser saja: {e}")
+      complete = False
+    return best_l3_category, merge_filters(parsed["filters"], extra_filters), complete
+
+  if llm_filters is not None:
+    llm_filters.cancel()
+
+  print(f"🤔 Router kategori ragu (skor {route['score']:.3f}, margin {route['margin']:.3f}), memakai AI.")
+  try:
+    best_l3_category, llm_filters = llm_route(user_query, category_tree)
+  except Exception as e:
+    print(f"⚠️ Routing AI gagal, lanjut tanpa kategori dengan filter parser saja: {e}")
+    return None, parsed["filters"], False
+  return best_l3_category, merge_filters(parsed["filters"], llm_filters), True
+
+# =============================
+# SEMANTIC SEARCH
+# =============================
+def semantic_search(user_query: str, top_k=50, recall=None, hybrid=None, per_group=None, raise_errors=False):
+  """
+  raise_errors=True (dipakai API): error embedding / DB dilempar ke pemanggil,
+  bukan dicetak lalu return [] yang tidak bisa dibedakan dari "tidak ada produk".
+  """
+  products_results = []
+  hybrid = SEARCH_HYBRID if hybrid is None else hybrid
+  per_group = SEARCH_PER_GROUP if per_group is None else per_group
+  category_tree = get_category_tree()
+  cache = get_search_cache()
+
+  # Intent (semantic_query, L3, filter) dari cache kalau kueri yang sama pernah dipahami
+  intent = cache.get_intent(user_query, category_tree.watermark) if cache else None
+  if intent:
+    print("⚡ Intent kueri dari cache →", intent["filters"])
+    parsed = None
+    semantic_query = intent["semantic_query"]
+  else:
+    # Filter harga/storage/RAM/warna/lokasi/kondisi diambil parser aturan (tanpa LLM);
+    # sisa kueri yang sudah bersih dari filter dipakai untuk embedding
+    parsed = parse_query(user_query)
+    semantic_query = parsed["semantic_query"]
+    print("🔎 Filter (parser aturan) →", parsed["filters"])
+
+  # Ekstraksi sisa filter oleh LLM tidak butuh embedding: jalan paralel dengannya
+  llm_filters = None
+  if parsed and parsed["needs_llm"]:
+    llm_filters = get_llm_executor().submit(lambda: ai_understand(user_query, []).get('filters'))
+
+  # Embedding query dibuat sekali: dipakai router kategori dan pencarian produk
+  try:
+    query_vector = cache.embedding(semantic_query, generate_embedding) if cache else generate_embedding(semantic_query)
+  except Exception as e:
+    print(f"🛑 Error saat membuat embedding query: {e}")
+    if llm_filters is not None:
+      llm_filters.cancel()
+    if raise_errors:
+      raise
+    return products_results
+
+  if intent is None:
+    best_l3_category, filtered_query, complete = understand_query(user_query, parsed, query_vector, category_tree, llm_filters)
+    intent = {"semantic_query": semantic_query, "l3": best_l3_category, "filters": filtered_query or {}}
+    # Kueri tanpa L3 / dengan filter LLM yang gagal tidak disimpan: bisa jadi LLM sedang gagal
+    if cache and best_l3_category and complete:
+      cache.put_intent(user_query, intent, category_tree.watermark)
+
+  best_l3_category, filtered_query = intent["l3"], intent["filters"]
+  if best_l3_category:
+    l3_id = best_l3_category['level_3_id']
+    print(f"🔎 Memulai Pencarian Vektor Produk dengan Filter Kategori: {best_l3_category['level_3_name']}")
+
+    try:
+      with pooled_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+          hybrid_text = semantic_query if hybrid else None
+          search = lambda: final_product_search(cur, query_vector, l3_id, top_k, filtered_query, recall, hybrid_text, per_group)
+          if cache:
+            products_results = cache.search_results(
+              cur, l3_id, filtered_query, query_vector, top_k, recall, search,
+              {"hybrid": hybrid_text, "per_group": per_group}
+            )
+          else:
+            products_results = search()
+
+      if products_results:
+        print(f"🎉 Ditemukan {len(products_results)} produk yang paling relevan.")
+      else:
+        print("⚠️ Tidak ada produk ditemukan di kategori L3 tersebut.")
+    except Exception as e:
+      print(f"🛑 Error saat mencari produk: {e}")
+      if raise_errors:
+        raise
 
-  conn.close()
   return products_results
 
 # =============================
@@ -1,123 +1,93 @@
 import time
-import random
 import psycopg2
-import requests
-import re
-import json
-from product import TokopediaScraper
+import json_backend
+from crawler import crawl_products
+from http_client import fetch
+from cache_extract import extract_cache_json
+from db_writer import ProductBulkWriter
+from facets import extract_facets
+from category_tree import CategoryTree
+from crawl_frontier import CrawlFrontier
+from embedding import ollama_embed_batch, OLLAMA_MAX_BATCH_SIZE, OLLAMA_MAX_BATCH_TOKENS
 from dotenv import load_dotenv
 import os
+import sys
+import argparse
 from multiprocessing import Process
 
 load_dotenv()
 
-HEADERS = {
-  "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-  "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-}
 
 # ------------------------------------------------------------
 # POSTGRES CONNECTION
+# - Satu koneksi per proses, dibuat saat pertama dipakai: worker hasil fork
+#   tidak ikut memakai koneksi milik proses induk
 # ------------------------------------------------------------
-# Pastikan detail koneksi ini sudah sesuai dengan server Anda
-conn = psycopg2.connect(
-  host=os.getenv("DB_HOST"),
-  port=os.getenv("DB_PORT"),
-  user=os.getenv("DB_USER"),
-  password=os.getenv("DB_PASSWORD"),
-  dbname=os.getenv("DB_NAME")
-)
-conn.autocommit = True
+_conn = None
+_conn_pid = None
+
+def get_connection():
+  global _conn, _conn_pid
+  if _conn is None or _conn.closed or _conn_pid != os.getpid():
+    # Pastikan detail koneksi ini sudah sesuai dengan server Anda
+    _conn = psycopg2.connect(
+      host=os.getenv("DB_HOST"),
+      port=os.getenv("DB_PORT"),
+      user=os.getenv("DB_USER"),
+      password=os.getenv("DB_PASSWORD"),
+      dbname=os.getenv("DB_NAME")
+    )
+    _conn.autocommit = True
+    _conn_pid = os.getpid()
+  return _conn
 
 # ------------------------------------------------------------
 # KONFIGURASI OTOMATIS
 # ------------------------------------------------------------
 # Jumlah halaman yang akan di-scrape untuk SETIAP kategori L3
 MAX_PAGES_PER_CATEGORY = 50 
-# Jeda antar halaman (untuk menghindari banned)
-SCRAPE_DELAY_SECONDS = 1 
+# Worker per mesin (override dengan --workers); jalankan server.py di mesin lain
+# dengan DB yang sama untuk menambah worker
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", os.cpu_count() or 4))
+# Jumlah task produk yang di-claim sekaligus oleh satu worker
+CRAWL_WORKER_PRODUCT_BATCH = int(os.getenv("CRAWL_WORKER_PRODUCT_BATCH", 20))
+# Jeda polling saat antrean kosong (mode --forever)
+CRAWL_WORKER_IDLE_SECONDS = float(os.getenv("CRAWL_WORKER_IDLE_SECONDS", 30))
 
 # ------------------------------------------------------------
 # EMBEDDING GENERATION (SAMA)
 # ------------------------------------------------------------
 def generate_embedding(text):
-  try:
-    response = requests.post(
-      "http://localhost:11434/api/embed",
-      json={"model": "all-minilm:l6-v2", "input": text},
-      timeout=20
-    )
-    if response.status_code != 200:
-      print("HTTP Error:", response.status_code)
-      return None
-
-    res = response.json()
-    if 'embeddings' in res and isinstance(res['embeddings'], list) and len(res['embeddings']) > 0:
-      embedding = res["embeddings"][0]
-      return embedding
-    else:
-      print("Respons embedding tidak valid.")
-      return None
+  return ollama_embed_batch([text])[0]
 
-  except Exception as e:
-    print(f"Embedding error: {e}")
-    return None
+# ------------------------------------------------------------
+# BULK WRITER
+# - Produk + chunk dari banyak halaman produk ditampung, embedding dibuat
+#   per batch, lalu ditulis dalam satu transaksi (COPY + merge set-based)
+# ------------------------------------------------------------
+product_writer = ProductBulkWriter(
+  get_connection,
+  ollama_embed_batch,
+  max_batch_size=OLLAMA_MAX_BATCH_SIZE,
+  max_batch_tokens=OLLAMA_MAX_BATCH_TOKENS
+)
 
 # ------------------------------------------------------------
 # SAVE PRODUCT AND CHUNKS (SAMA - Sudah mengandung UPSERT)
 # ------------------------------------------------------------
-def save_product_and_chunks(products_data, category_id, full_category_path):
-  with conn.cursor() as cur:
-      product_id_first = None  
-      
-      insert_query_base = """
-        INSERT INTO products (
-          ecommerce, category_id, shop_name, shop_location, name, url, 
-          price, stock, sold, variant_spec, detail, media, reviews, 
-          parent_id, is_parent, search_tsv, updated_at
-        ) VALUES (
-          %s, %s, %s, %s, %s, 
-          %s, %s, %s, %s, %s, 
-          %s, %s, %s, %s, %s, 
-          to_tsvector('indonesian', %s),
-          NOW()
-        ) 
-        ON CONFLICT (url) DO UPDATE SET
-          shop_name = EXCLUDED.shop_name,
-          shop_location = EXCLUDED.shop_location,
-          name = EXCLUDED.name,
-          price = EXCLUDED.price,
-          stock = EXCLUDED.stock,
-          sold = EXCLUDED.sold,
-          variant_spec = EXCLUDED.variant_spec,
-          detail = EXCLUDED.detail,
-          media = EXCLUDED.media,
-          reviews = EXCLUDED.reviews,
-          search_tsv = EXCLUDED.search_tsv,
-          updated_at = NOW()
-        RETURNING id;
-      """
-      
-      insert_chunk_query = """
-        INSERT INTO product_chunks (
-          product_id, chunk_text, chunk_type, embedding, chunk_meta
-        ) VALUES (
-          %s, %s, %s, %s::VECTOR, %s
-        );
-      """
-
-      delete_old_chunks_query = "DELETE FROM product_chunks WHERE product_id = %s;"
+def save_product_and_chunks(products_data, category_id, full_category_path, source_url=None):
+      product_rows = []
+      chunk_rows = []
+      parent_url = None
 
       for i, product_data in enumerate(products_data, start=0): 
-        current_parent_id = None
         is_parent = False
         
         if i == 0:
           if len(products_data) > 1:
             is_parent = True
-        else:
-          current_parent_id = product_id_first
 
+        product_url = product_data.get('product_url')
         shop_name = product_data.get('shop_name', '')
         shop_location = product_data.get('shop_location', '')
         name = product_data.get('product_name', '')
@@ -139,33 +109,28 @@ def save_product_and_chunks(products_data, category_id, full_category_path):
 
         search_text = f"{name} {shop_name} {shop_location} {description}"
 
-        cur.execute(insert_query_base, (
-          'tokopedia',
-          category_id,
-          shop_name,
-          shop_location,
-          name,
-          product_data.get('product_url'),
-          product_data.get('product_price'),
-          product_data.get('product_stock'),
-          product_data.get('product_sold'),
-          json.dumps(variant_spec),
-          json.dumps(detail),
-          json.dumps(product_data.get('product_media', {})),
-          json.dumps(reviews),
-          current_parent_id,
-          is_parent,
-          search_text
-        ))
-        
-        product_id = cur.fetchone()[0]
+        product_rows.append({
+          'ecommerce': 'tokopedia',
+          'category_id': category_id,
+          'shop_name': shop_name,
+          'shop_location': shop_location,
+          'name': name,
+          'url': product_url,
+          'price': price_val,
+          'stock': stock_val,
+          'sold': sold_val,
+          'variant_spec': json_backend.dumps(variant_spec),
+          'detail': json_backend.dumps(detail),
+          'media': json_backend.dumps(product_data.get('product_media', {})),
+          'reviews': json_backend.dumps(reviews),
+          'is_parent': is_parent,
+          'parent_url': parent_url,
+          'search_text': search_text,
+          **extract_facets(variant_spec, detail, shop_location)
+        })
         
         if i == 0:
-          product_id_first = product_id
-        
-        print(f"✅ Product saved/updated (ID: {product_id}).")
-
-        cur.execute(delete_old_chunks_query, (product_id,))
+          parent_url = product_url
 
         name_chunk_text = f"Nama: {name} (Toko: {shop_name}) (Kategori: {full_category_path})"
         total_reviews = reviews.get('total_rating', 0)
@@ -183,18 +148,21 @@ def save_product_and_chunks(products_data, category_id, full_category_path):
           summary_parts.append("Teks ulasan meliputi: " + review_samples)
         review_summary = " ".join(summary_parts)
 
+        # Harga/stok/terjual dipisah: ikut di teks chunk, tapi tidak masuk
+        # fingerprint supaya perubahan angka saja tidak memicu re-embedding
+        numeric_attributes = []
         detail_attributes = []
         detail_meta = {}
         if price_num > 0:
           price_fmt = f"Rp{price_num:,}".replace(",", ".")
-          detail_attributes.append(f"Harga produk adalah {price_fmt}")
+          numeric_attributes.append(f"Harga produk adalah {price_fmt}")
           detail_meta['harga'] = price_num
         if stock_num is not None:
           status = f"Status stok: Tersedia sebanyak {stock_num} unit." if stock_num > 0 else "Status stok: Habis."
-          detail_attributes.append(status)
+          numeric_attributes.append(status)
           detail_meta['stock'] = stock_num
         if sold_num > 0:
-          detail_attributes.append(f"Produk ini telah terjual sebanyak {sold_num} unit.")
+          numeric_attributes.append(f"Produk ini telah terjual sebanyak {sold_num} unit.")
           detail_meta['sold'] = sold_num
         
         if detail and isinstance(detail, dict):
@@ -206,7 +174,8 @@ def save_product_and_chunks(products_data, category_id, full_category_path):
                   detail_meta[key] = value
               else:
                 detail_attributes.append(f"{key}: {str(value)}")
-        detail_text = ". ".join(detail_attributes)
+        detail_text = ". ".join(numeric_attributes + detail_attributes)
+        detail_fingerprint_text = ". ".join(detail_attributes)
 
         variant_text = ''
         if variant_spec and isinstance(variant_spec, dict):
@@ -229,178 +198,222 @@ def save_product_and_chunks(products_data, category_id, full_category_path):
         
         for chunk_type, chunk_text, meta_dict in chunks_to_create:
             if chunk_text and chunk_text.strip(): 
-              embedding = generate_embedding(chunk_text)
-              chunk_meta_json = json.dumps(meta_dict)
-              
-              if embedding:
-                embedding_str = f"[{','.join(map(str, embedding))}]"
-                cur.execute(insert_chunk_query, (
-                  product_id,
-                  chunk_text,
-                  chunk_type,
-                  embedding_str,
-                  chunk_meta_json
-                ))
-              else:
-                print(f"   ❌ Gagal membuat embedding untuk '{chunk_type}'.")
+              chunk = {
+                'url': product_url,
+                'chunk_text': chunk_text,
+                'chunk_type': chunk_type,
+                'chunk_meta': json_backend.dumps(meta_dict)
+              }
+              if chunk_type == 'detail':
+                chunk['fingerprint_text'] = detail_fingerprint_text
+              chunk_rows.append(chunk)
+
+      product_writer.add(product_rows, chunk_rows, key=source_url)
+      print(f"✅ Product ditampung untuk disimpan ({len(product_rows)} baris).")
 
 
 # ------------------------------------------------------------
-# GET CATEGORY BY LEVEL (SAMA)
+# GET CATEGORY BY LEVEL
+# - Dari category tree di memori (dimuat sekali, refresh via TTL/watermark)
 # ------------------------------------------------------------
+category_tree = CategoryTree(get_connection)
+
 def get_categories(level, parent_id=None):
-  with conn.cursor() as cur:
-      if parent_id:
-        cur.execute("""
-          SELECT id, name, url 
-          FROM categories
-          WHERE level = %s 
-            AND parent_id = %s
-            AND ecommerce = 'tokopedia'
-          ORDER BY name;
-        """, (level, parent_id))
-      else:
-        cur.execute("""
-          SELECT id, name, url 
-          FROM categories
-          WHERE level = %s
-            AND ecommerce = 'tokopedia'
-          ORDER BY name;
-        """, (level,))
-      
-      return cur.fetchall()
+  return category_tree.rows(level, parent_id)
 
 
 # ------------------------------------------------------------
-# SCRAPE PAGE (SAMA)
+# CRAWL FRONTIER (ANTREAN BERSAMA)
+# - Task halaman (L3, page) dan task URL produk di Postgres; worker di mesin
+#   mana pun mengambil task berikutnya dengan FOR UPDATE SKIP LOCKED
+# - Proses yang mati dilanjutkan dari halaman/produk yang belum di-checkpoint
+# ------------------------------------------------------------
+frontier = CrawlFrontier(get_connection)
+
+
 # ------------------------------------------------------------
-def scrape_page(url, l1_tuple, l2_tuple, l3_tuple):
-  # l1_tuple: (id, name, url), l2_tuple: (id, name, url), l3_tuple: (id, name, url)
+# TASK HALAMAN
+# - Ambil daftar produk dari halaman pencarian, masukkan ke antrean produk
+# ------------------------------------------------------------
+def scrape_page(url, category_id, page):
   try:
-      # Jeda sebelum memulai scraping (menghindari diblokir)
-      time.sleep(random.uniform(SCRAPE_DELAY_SECONDS, SCRAPE_DELAY_SECONDS + 1))
-      
-      r = requests.get(url, headers=HEADERS, timeout=50)
+      # Jeda/retry diatur rate limiter bersama (adaptif terhadap 429/5xx/latensi)
+      r = fetch(url, timeout=50)
       r.raise_for_status()
       html_content = r.text
 
-      pattern = r'window.__cache\s*=\s*(\{.*?\})\s*;'
-      match = re.search(pattern, html_content, re.DOTALL)
-      if not match:
-        match = re.search(r'window.__cache\s*=\s*(\{.*\})\s*', html_content, re.DOTALL)
-      
-      if match:
-        json_string = match.group(1).strip()
-      else:
-        pattern_loose = r'window.__cache\s*=\s*(\{.*\})\s*'
-        match_loose = re.search(pattern_loose, html_content, re.DOTALL)
-        if match_loose:
-          json_string = match_loose.group(1).strip()
-        else:
-          print("❌ Gagal menemukan pola 'window.__cache' dalam HTML.")
-          return 
+      json_string = extract_cache_json(html_content)
+      if not json_string:
+        print("❌ Gagal menemukan pola 'window.__cache' dalam HTML.")
+        frontier.fail_page(category_id, page, "window.__cache tidak ditemukan")
+        return 
           
-      if json_string:
-        json_data = json.loads(json_string)
-        json_root = json_data.get("ROOT_QUERY", {})
+      json_data = json_backend.loads(json_string)
+      json_root = json_data.get("ROOT_QUERY", {})
+
+      search_keys = [
+        key for key in json_root.keys() 
+        if "searchProduct" in key 
+      ]
+      if search_keys:
+        json_search = json_root[search_keys[0]]
+        search_id = json_search.get("id", None)
+        print(f"   [INFO] ID produk dari pencarian: {search_id}")
+
+        json_search_product = json_data.get(search_id, {})
+        json_ace_product = json_search_product.get("products", [])
+
+        print(f"   [INFO] Jumlah produk ditemukan di halaman: {len(json_ace_product)}")
+
+        product_urls = []
+        for idx in json_ace_product:
+          ace_product_id = idx.get("id", None)
+          product = json_data.get(ace_product_id, {})
+          product_url = product.get('url', '')
+            
+          if not product_url: 
+              continue
 
-        search_keys = [
-          key for key in json_root.keys() 
-          if "searchProduct" in key 
-        ]
-        if search_keys:
-          json_search = json_root[search_keys[0]]
-          search_id = json_search.get("id", None)
-          print(f"   [INFO] ID produk dari pencarian: {search_id}")
+          product_urls.append(product_url)
 
-          json_search_product = json_data.get(search_id, {})
-          json_ace_product = json_search_product.get("products", [])
+        # Produk yang sudah tersimpan / sudah di antrean tidak ditambahkan lagi
+        queued = frontier.enqueue_products(category_id, page, product_urls)
+        print(f"   [INFO] {queued} produk baru masuk antrean.")
+        frontier.finish_page(category_id, page, len(product_urls))
+      else:
+        frontier.fail_page(category_id, page, "searchProduct tidak ditemukan")
 
-          print(f"   [INFO] Jumlah produk ditemukan di halaman: {len(json_ace_product)}")
+  except Exception as e:
+    print(f"❌ Gagal memproses halaman: {e}")
+    frontier.fail_page(category_id, page, e)
 
-          for idx in json_ace_product:
-            ace_product_id = idx.get("id", None)
-            product = json_data.get(ace_product_id, {})
-            product_url = product.get('url', '')
-            
-            if not product_url: 
-                continue
 
-            scraper = TokopediaScraper()
-            results = scraper.scrape(product_url)
-            
-            if results:
-                category_id = l3_tuple[0]
-                full_category_path = f"{l1_tuple[1]} > {l2_tuple[1]} > {l3_tuple[1]}"
-                
-                save_product_and_chunks(results, category_id, full_category_path)
+# ------------------------------------------------------------
+# TASK PRODUK
+# - Batch URL produk (boleh lintas kategori) di-fetch concurrent, disimpan,
+#   lalu URL yang sudah commit di-checkpoint (product_writer.take_committed)
+# ------------------------------------------------------------
+def scrape_products(tasks):
+  categories = dict(tasks)
+
+  def save_results(product_url, results):
+    if not results:
+        return
+    category_id = categories[product_url]
+    save_product_and_chunks(results, category_id, category_tree.full_path(category_id), source_url=product_url)
 
+  error = "fetch/parse/simpan produk gagal"
+  try:
+    crawl_products(list(categories), save_results)
+    product_writer.flush()
   except Exception as e:
-    print(f"❌ Gagal memproses halaman/produk: {e}")
-    # Tambahkan jeda yang lebih panjang setelah error
-    time.sleep(10)
+    print(f"❌ Gagal menyimpan batch produk: {e}")
+    error = e
+  finally:
+    # Checkpoint hanya URL yang transaksinya sudah commit; sisanya (termasuk
+    # yang masih tertahan di buffer karena flush gagal) dilepas untuk dicoba lagi
+    committed = product_writer.take_committed()
+    failed = set(categories) - set(committed)
+    frontier.finish_products(committed)
+    frontier.fail_products(failed, error)
+  print(f"✅ Batch produk: {len(categories) - len(failed)} tersimpan, {len(failed)} gagal.")
+
 
 # ------------------------------------------------------------
-# MAIN PROGRAM (OTOMATIS)
+# WORKER
+# - Ambil task produk dulu (antrean produk tetap pendek), kalau kosong
+#   ambil task halaman berikutnya; berhenti saat dua-duanya kosong
+#   (atau tunggu task baru kalau forever=True)
+# - category_ids: batasi ke L3 tertentu (None = semua)
 # ------------------------------------------------------------
-def run_category_l1(l1_selected):
-  l1_selected_id, l1_selected_name, l1_selected_url = l1_selected
-
-  l2_categories = get_categories(level=2, parent_id=l1_selected_id)
-  if not l2_categories:
-    print(f"[SKIP] L1 '{l1_selected_name}': Tidak ada L2.")
-    return
+def run_worker(category_ids=None, forever=False):
+  print(f"🚀 Worker {frontier.worker} mulai.")
+  try:
+    while True:
+      tasks = frontier.claim_product_batch(CRAWL_WORKER_PRODUCT_BATCH, category_ids)
+      if tasks:
+        scrape_products(tasks)
+        continue
+
+      claim = frontier.claim_page(category_ids)
+      if claim is not None:
+        category_id, page, page_url = claim
+        print(f"[{category_tree.full_path(category_id)}] [HALAMAN {page}] Scraping URL: {page_url}")
+        scrape_page(page_url, category_id, page)
+        continue
+
+      if not forever:
+        break
+      time.sleep(CRAWL_WORKER_IDLE_SECONDS)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    # Berhenti paksa: claim dikembalikan supaya langsung diambil worker lain
+    frontier.release()
+    if _conn is not None and _conn_pid == os.getpid():
+      _conn.close()
+    print(f"Worker {frontier.worker} selesai.")
 
-  for l2_selected in l2_categories:
-    l2_selected_id, l2_selected_name, l2_selected_url = l2_selected
 
-    l3_categories = get_categories(level=3, parent_id=l2_selected_id)
-    if not l3_categories:
-      print(f"[SKIP] L2 '{l2_selected_name}': Tidak ada L3.")
+# ------------------------------------------------------------
+# SEED
+# - Daftarkan halaman semua L3 (di bawah L1 terpilih) ke frontier; aman
+#   dijalankan ulang / dari banyak mesin (halaman yang sudah ada tidak berubah)
+# ------------------------------------------------------------
+def l3_categories(l1_names=None):
+  l3 = []
+  for l1_id, l1_name, _ in get_categories(level=1):
+    if l1_names and l1_name not in l1_names:
       continue
+    for l2_id, _, _ in get_categories(level=2, parent_id=l1_id):
+      l3.extend(get_categories(level=3, parent_id=l2_id))
+  return l3
 
-    for l3_selected in l3_categories:
-      l3_selected_id, l3_selected_name, l3_selected_url = l3_selected
 
-      print("\n" + "=" * 60)
-      print(f"➡️ MEMULAI: {l1_selected_name} > {l2_selected_name} > {l3_selected_name}")
-      print(f"   URL Dasar: {l3_selected_url}")
-      print(f"   Target Halaman: 1 sampai {MAX_PAGES_PER_CATEGORY}")
-      print("=" * 60)
+def seed_frontier(l3, max_pages=MAX_PAGES_PER_CATEGORY):
+  seeded = frontier.seed_pages([(l3_id, l3_url) for l3_id, _, l3_url in l3], max_pages)
+  print(f"Frontier: {seeded} halaman baru dari {len(l3)} kategori L3 ({max_pages} halaman per kategori).")
 
-      for page in range(1, MAX_PAGES_PER_CATEGORY + 1):
-        if "?" in l3_selected_url:
-          page_url = f"{l3_selected_url}&page={page}"
-        else:
-          page_url = f"{l3_selected_url}?page={page}"
 
-        print(f"[{l1_selected_name}] [HALAMAN {page}] Scraping URL: {page_url}")
-        scrape_page(page_url, l1_selected, l2_selected, l3_selected)
+# ------------------------------------------------------------
+# MAIN PROGRAM (OTOMATIS)
+# ------------------------------------------------------------
+def parse_args():
+  parser = argparse.ArgumentParser(description="Crawler Tokopedia berbasis antrean Postgres.")
+  parser.add_argument("l1", nargs="*", help="Nama kategori L1 (kosong = semua)")
+  parser.add_argument("--workers", type=int, default=CRAWL_WORKERS, help="Jumlah proses worker di mesin ini")
+  parser.add_argument("--pages", type=int, default=MAX_PAGES_PER_CATEGORY, help="Halaman per kategori L3")
+  parser.add_argument("--no-seed", action="store_true", help="Jangan seed halaman, hanya kerjakan antrean")
+  parser.add_argument("--forever", action="store_true", help="Tetap jalan menunggu task baru")
+  return parser.parse_args()
+
 
 if __name__ == "__main__":
+  args = parse_args()
   try:
     print("-" * 20 + " [ SCRAPER OTOMATIS DIMULAI ] " + "-" * 20)
-    print(f"Target: Semua kategori L3, {MAX_PAGES_PER_CATEGORY} halaman per kategori.")
+    print(f"Target: {', '.join(args.l1) or 'Semua kategori'} L3, {args.pages} halaman per kategori, {args.workers} worker.")
 
-    # 1. Ambil SEMUA kategori Level 1
-    l1_categories = get_categories(level=1)
-    
-    if not l1_categories:
-        print("Tidak ada kategori Level 1 ditemukan. Hentikan program.")
-        exit()
+    l3 = l3_categories(args.l1)
+    if not l3:
+        print("Tidak ada kategori L3 ditemukan. Hentikan program.")
+        sys.exit()
 
-    processes = []
+    if not args.no_seed:
+      seed_frontier(l3, args.pages)
+    category_ids = [l3_id for l3_id, _, _ in l3] if args.l1 else None
 
-    for l1_selected in l1_categories:
-      p = Process(target=run_category_l1, args=(l1_selected,))
+    # Koneksi induk ditutup sebelum fork; tiap worker membuat koneksinya sendiri
+    get_connection().close()
+
+    processes = []
+    for _ in range(max(1, args.workers)):
+      p = Process(target=run_worker, args=(category_ids, args.forever))
       p.start()
       processes.append(p)
-      print(f"🚀 L1 '{l1_selected[1]}' berjalan di proses PID {p.pid}")
 
     for p in processes:
       p.join()
 
   finally:
-    if conn:
-      conn.close()
-    print("\n" + "-" * 20 + " [ SCRAPER SELESAI ] " + "-" * 20)
\ No newline at end of file
+    print("\n" + "-" * 20 + " [ SCRAPER SELESAI ] " + "-" * 20)
@@ -0,0 +1,604 @@
+"""
+Manajemen index ANN (HNSW / IVFFlat) untuk product_chunks.embedding
+
+Jalankan (dari folder tokopedia/):
+  python vector_index.py ensure     # buat index yang belum ada (per chunk_type, product_id, leksikal)
+  python vector_index.py maintain   # rebuild IVFFlat yang lists-nya sudah tidak cocok + ANALYZE
+  python vector_index.py drop       # hapus semua index yang dikelola modul ini
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+from db_pool import execute_prepared
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------
+# KONFIGURASI
+# ------------------------------------------------------------
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw")
+# Dimensi vektor yang di-index/dicari (embedding query dari OpenAI = 1536).
+# Dipakai kalau kolom embedding tidak punya dimensi tetap (campuran model).
+VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", 1536))
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 64))
+# fast | balanced | accurate
+SEARCH_RECALL = os.getenv("SEARCH_RECALL", "balanced")
+
+# ef_search / probes = lebar pencarian index; candidates = kelipatan top_k yang
+# diambil dari index. Query dengan filter: produk difilter dulu (CTE), kandidat
+# ANN di-join ke hasilnya, dan di pgvector >= 0.8 index discan iteratif sampai
+# kandidat yang lolos filter cukup (max_scan_tuples / max_probes = batas scan).
+# Exact hanya dipakai kalau scan itu terpotong sebelum semua kandidat terbaca
+RECALL_PROFILES = {
+  "fast":     {"ef_search": 40,  "probes": 4,  "candidates": 4,  "max_scan_tuples": 10000, "max_probes": 40},
+  "balanced": {"ef_search": 100, "probes": 10, "candidates": 8,  "max_scan_tuples": 20000, "max_probes": 100},
+  "accurate": {"ef_search": 300, "probes": 32, "candidates": 20, "max_scan_tuples": 50000, "max_probes": 300},
+}
+MAX_EF_SEARCH = 1000
+# Iterative index scan (hnsw/ivfflat.iterative_scan) tersedia sejak pgvector 0.8.0
+ITERATIVE_SCAN_VERSION = (0, 8, 0)
+# Hybrid (leksikal + vektor): konstanta k reciprocal-rank fusion, dan jumlah
+# kandidat per sisi sebagai kelipatan top_k
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 4))
+INDEX_PREFIX = "product_chunks_ann"
+INDEXED_TYPES_TTL_SECONDS = 300
+
+# Pencarian exact untuk query dengan filter hanya membaca chunk milik produk
+# yang lolos filter (product_chunks.product_id), bukan seluruh tabel
+FILTER_INDEX = "CREATE INDEX CONCURRENTLY IF NOT EXISTS product_chunks_product_id_idx ON product_chunks (product_id);"
+
+# Index sisi leksikal hybrid search (products.search_tsv ditulis db_writer)
+LEXICAL_INDEXES = [
+  "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+  "CREATE INDEX CONCURRENTLY IF NOT EXISTS products_search_tsv_idx ON products USING gin (search_tsv);",
+  "CREATE INDEX CONCURRENTLY IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops);",
+]
+
+
+def recall_profile(recall: Optional[str] = None) -> Dict:
+  return RECALL_PROFILES.get(recall or SEARCH_RECALL, RECALL_PROFILES["balanced"])
+
+
+def has_filter(where_sql: str) -> bool:
+  """where_sql berisi kondisi selain 'WHERE 1=1' (filter_clause tanpa filter)."""
+  return " ".join(where_sql.split()).upper() not in ("", "WHERE 1=1")
+
+
+def ivfflat_lists(rows: int) -> int:
+  # Rekomendasi pgvector: rows/1000 sampai 1 juta baris, sqrt(rows) di atasnya
+  if rows <= 1_000_000:
+    return max(1, rows // 1000)
+  return int(math.sqrt(rows))
+
+
+# ------------------------------------------------------------
+# VectorIndexManager
+# - Satu partial index per chunk_type (index lebih kecil, dan pencarian per
+#   tipe bisa digabung dengan UNION ALL di query)
+# - Kolom tanpa dimensi tetap -> expression index embedding::vector(N)
+#   dengan predikat vector_dims(embedding) = N
+# ------------------------------------------------------------
+class VectorIndexManager:
+  _indexed_cache: Dict[Tuple, Tuple[float, List[Optional[str]]]] = {}
+  _column_dims_cache: Dict[str, int] = {}
+  _version_cache: Dict[str, Tuple[int, ...]] = {}
+
+  def __init__(self, conn, method: str = VECTOR_INDEX_METHOD, dimensions: int = VECTOR_DIMENSIONS):
+    if method not in ("hnsw", "ivfflat"):
+      raise ValueError(f"Metode index tidak dikenal: {method}")
+    self.conn = conn
+    self.method = method
+    self.dimensions = dimensions
+    self.last_path: Optional[str] = None
+
+  # ---------------- SQL fragments ----------------
+  def column_dimensions(self) -> int:
+    """Dimensi tetap kolom embedding (0 kalau kolom `vector` tanpa dimensi)."""
+    dims = self._column_dims_cache.get(self.conn.dsn)
+    if dims is None:
+      with self.conn.cursor() as cur:
+        cur.execute("""
+          SELECT atttypmod FROM pg_attribute
+          WHERE attrelid = 'product_chunks'::regclass AND attname = 'embedding';
+        """)
+        dims = max(cur.fetchone()[0], 0)
+      self._column_dims_cache[self.conn.dsn] = dims
+    return dims
+
+  def pgvector_version(self) -> Tuple[int, ...]:
+    version = self._version_cache.get(self.conn.dsn)
+    if version is None:
+      with self.conn.cursor() as cur:
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+        row = cur.fetchone()
+      version = tuple(int(part) for part in re.findall(r"\d+", row[0])) if row else ()
+      self._version_cache[self.conn.dsn] = version
+    return version
+
+  def iterative_scan(self) -> bool:
+    return self.pgvector_version() >= ITERATIVE_SCAN_VERSION
+
+  def vector_expr(self, alias: Optional[str] = "pc") -> str:
+    column = f"{alias}.embedding" if alias else "embedding"
+    if self.column_dimensions():
+      return column
+    return f"({column}::vector({self.dimensions}))"
+
+  def predicate(self, chunk_type: Optional[str], alias: Optional[str] = "pc") -> str:
+    prefix = f"{alias}." if alias else ""
+    parts = []
+    if chunk_type is None:
+      parts.append(f"{prefix}chunk_type IS NULL")
+    else:
+      parts.append(f"{prefix}chunk_type = {self._quote(chunk_type)}")
+    if not self.column_dimensions():
+      parts.append(f"vector_dims({prefix}embedding) = {self.dimensions}")
+    return " AND ".join(parts)
+
+  def index_name(self, chunk_type: Optional[str]) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", (chunk_type or "untyped").lower()).strip("_")
+    return f"{INDEX_PREFIX}_{self.method}_{slug}"[:63]
+
+  def _quote(self, value: str) -> str:
+    with self.conn.cursor() as cur:
+      return cur.mogrify("%s", (value,)).decode()
+
+  # ---------------- inspeksi ----------------
+  def chunk_types(self) -> List[Optional[str]]:
+    with self.conn.cursor() as cur:
+      cur.execute("SELECT DISTINCT chunk_type FROM product_chunks;")
+      return [row[0] for row in cur.fetchall()]
+
+  def existing_indexes(self) -> Dict[str, str]:
+    with self.conn.cursor() as cur:
+      cur.execute("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = 'product_chunks' AND indexname LIKE %s;
+      """, (f"{INDEX_PREFIX}_%",))
+      return dict(cur.fetchall())
+
+  def indexed_chunk_types(self) -> List[Optional[str]]:
+    """chunk_type yang punya index valid untuk metode ini (di-cache beberapa menit)."""
+    key = (self.conn.dsn, self.method, self.dimensions)
+    cached = self._indexed_cache.get(key)
+    if cached and time.monotonic() - cached[0] < INDEXED_TYPES_TTL_SECONDS:
+      return cached[1]
+
+    # Dibaca dari definisi index (bukan DISTINCT atas tabel) supaya murah di jalur query
+    types = []
+    for name, indexdef in self.existing_indexes().items():
+      if not name.startswith(f"{INDEX_PREFIX}_{self.method}_"):
+        continue
+      if not self.column_dimensions() and f"vector({self.dimensions})" not in indexdef:
+        continue
+      match = re.search(r"chunk_type = '((?:[^']|'')*)'", indexdef)
+      if match:
+        types.append(match.group(1).replace("''", "'"))
+      elif "chunk_type IS NULL" in indexdef:
+        types.append(None)
+    self._indexed_cache[key] = (time.monotonic(), types)
+    return types
+
+  # ---------------- DDL ----------------
+  def _index_sql(self, chunk_type: Optional[str], rows: int) -> str:
+    if self.method == "hnsw":
+      options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+      options = f"lists = {ivfflat_lists(rows)}"
+    return f"""
+      CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.index_name(chunk_type)}
+      ON product_chunks USING {self.method} ({self.vector_expr(alias=None)} vector_cosine_ops)
+      WITH ({options})
+      WHERE {self.predicate(chunk_type, alias=None)};
+    """
+
+  def _count(self, cur, chunk_type: Optional[str]) -> int:
+    cur.execute(f"SELECT COUNT(*) FROM product_chunks WHERE {self.predicate(chunk_type, alias=None)};")
+    return cur.fetchone()[0]
+
+  def ensure_indexes(self, chunk_types: Optional[List[Optional[str]]] = None):
+    """Buat index yang belum ada. CONCURRENTLY, jadi crawler tetap bisa menulis."""
+    autocommit = self.conn.autocommit
+    self.conn.autocommit = True
+    try:
+      existing = self.existing_indexes()
+      with self.conn.cursor() as cur:
+        for chunk_type in (chunk_types if chunk_types is not None else self.chunk_types()):
+          name = self.index_name(chunk_type)
+          if name in existing:
+            continue
+          rows = self._count(cur, chunk_type)
+          if self.method == "ivfflat" and rows == 0:
+            # IVFFlat butuh data untuk menentukan centroid
+            print(f"[SKIP] {name}: belum ada data.")
+            continue
+          start = time.perf_counter()
+          cur.execute(self._index_sql(chunk_type, rows))
+          print(f"✅ Index {name} dibuat ({rows} baris, {time.perf_counter() - start:.1f}s).")
+    finally:
+      self.conn.autocommit = autocommit
+    self._indexed_cache.clear()
+
+  def ensure_filter_index(self):
+    """Index product_chunks(product_id) untuk pencarian exact atas produk hasil filter."""
+    autocommit = self.conn.autocommit
+    self.conn.autocommit = True
+    try:
+      with self.conn.cursor() as cur:
+        # Lewati kalau sudah ada index lain yang diawali product_id (mis. dibuat manual)
+        cur.execute("""
+          SELECT 1 FROM pg_indexes
+          WHERE schemaname = current_schema() AND tablename = 'product_chunks'
+            AND indexdef ~ '\\(product_id[,)]';
+        """)
+        if cur.fetchone() is None:
+          cur.execute(FILTER_INDEX)
+    finally:
+      self.conn.autocommit = autocommit
+
+  def ensure_lexical_indexes(self):
+    """GIN tsvector + trigram di products untuk sisi leksikal hybrid_search."""
+    autocommit = self.conn.autocommit
+    self.conn.autocommit = True
+    try:
+      with self.conn.cursor() as cur:
+        for statement in LEXICAL_INDEXES:
+          cur.execute(statement)
+    finally:
+      self.conn.autocommit = autocommit
+
+  def maintain(self, drift: float = 2.0):
+    """IVFFlat: rebuild kalau jumlah baris sudah jauh dari `lists` saat dibuat. Lalu ANALYZE."""
+    autocommit = self.conn.autocommit
+    self.conn.autocommit = True
+    try:
+      existing = self.existing_indexes()
+      with self.conn.cursor() as cur:
+        if self.method == "ivfflat":
+          for chunk_type in self.chunk_types():
+            name = self.index_name(chunk_type)
+            match = re.search(r"lists='?(\d+)", existing.get(name, ""))
+            if not match:
+              continue
+            built_lists = int(match.group(1))
+            target = ivfflat_lists(self._count(cur, chunk_type))
+            if max(target, built_lists) / max(1, min(target, built_lists)) >= drift:
+              print(f"🔁 Rebuild {name}: lists {built_lists} -> {target}")
+              cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+              cur.execute(self._index_sql(chunk_type, self._count(cur, chunk_type)))
+        cur.execute("ANALYZE product_chunks;")
+    finally:
+      self.conn.autocommit = autocommit
+    self.ensure_indexes()
+
+  def drop_indexes(self):
+    autocommit = self.conn.autocommit
+    self.conn.autocommit = True
+    try:
+      with self.conn.cursor() as cur:
+        for name in self.existing_indexes():
+          cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+          print(f"🗑️ Index {name} dihapus.")
+    finally:
+      self.conn.autocommit = autocommit
+    self._indexed_cache.clear()
+
+  # ---------------- query ----------------
+  def set_search_params(self, cur, candidates: int, recall: Optional[str] = None, filtered: bool = False):
+    """
+    Lebar pencarian index untuk transaksi ini saja (set_config is_local).
+    filtered=True: scan iteratif (pgvector >= 0.8) supaya index terus dibaca
+    sampai `candidates` baris lolos filter; versi lama memakai ef_search maksimal.
+    """
+    profile = recall_profile(recall)
+    settings = []
+    if self.method == "hnsw":
+      # Tanpa scan iteratif HNSW tidak pernah mengembalikan lebih dari ef_search baris
+      ef_search = min(MAX_EF_SEARCH, max(profile["ef_search"], candidates))
+      if filtered and not self.iterative_scan():
+        ef_search = MAX_EF_SEARCH
+      settings.append(("hnsw.ef_search", ef_search))
+      if filtered and self.iterative_scan():
+        settings += [("hnsw.iterative_scan", "relaxed_order"), ("hnsw.max_scan_tuples", profile["max_scan_tuples"])]
+    else:
+      settings.append(("ivfflat.probes", profile["probes"]))
+      if filtered and self.iterative_scan():
+        settings += [("ivfflat.iterative_scan", "relaxed_order"), ("ivfflat.max_probes", profile["max_probes"])]
+    for name, value in settings:
+      execute_prepared(cur, "SELECT set_config(%s, %s, true);", (name, str(value)))
+
+  def candidates_sql(self, candidates: Optional[int], filtered: bool = False) -> str:
+    """
+    Kandidat chunk terdekat dari vektor di CTE `q`: top `candidates` per
+    chunk_type lewat index (UNION ALL), atau semua chunk kalau None (exact).
+    filtered=True: hanya chunk milik produk di CTE `fp` (lihat _prefix_sql),
+    jadi filter ikut membatasi scan index, bukan diterapkan setelahnya.
+    """
+    distance = f"{self.vector_expr()} <=> (SELECT v FROM q)"
+    source = "product_chunks pc JOIN fp ON fp.id = pc.product_id" if filtered else "product_chunks pc"
+    if candidates is None:
+      dims_filter = "" if self.column_dimensions() else f"WHERE vector_dims(pc.embedding) = {self.dimensions}"
+      return f"""
+        SELECT pc.product_id, pc.chunk_type, pc.chunk_text, {distance} AS distance
+        FROM {source}
+        {dims_filter}
+      """
+    # relaxed_order: urutan dari scan iteratif bisa sedikit meleset, hasil
+    # CTE candidates selalu diurutkan ulang dengan distance asli di luar
+    return " UNION ALL ".join(f"""
+        (SELECT pc.product_id, pc.chunk_type, pc.chunk_text, {distance} AS distance
+        FROM {source}
+        WHERE {self.predicate(chunk_type)}
+        ORDER BY {distance}
+        LIMIT {int(candidates)})
+      """ for chunk_type in self.indexed_chunk_types())
+
+  def scan_sql(self, candidates: int, filtered: bool = False) -> str:
+    """
+    Satu baris `exhausted`: true kalau tiap cabang ANN di CTE candidates sudah
+    mengembalikan semua chunk yang bisa dicapai (produk lolos filter, chunk_type
+    itu). Jumlah yang bisa dicapai dihitung dengan LIMIT candidates + 1, jadi
+    murah; cabang yang penuh (= candidates) tidak pernah dianggap exhausted.
+    """
+    source = "product_chunks pc JOIN fp ON fp.id = pc.product_id" if filtered else "product_chunks pc"
+    branches = []
+    for chunk_type in self.indexed_chunk_types():
+      same_type = "c.chunk_type IS NULL" if chunk_type is None else f"c.chunk_type = {self._quote(chunk_type)}"
+      branches.append(f"""
+        SELECT
+          (SELECT COUNT(*) FROM candidates c WHERE {same_type}) AS got,
+          (SELECT COUNT(*) FROM (SELECT 1 FROM {source} WHERE {self.predicate(chunk_type)} LIMIT {int(candidates) + 1}) r) AS reach
+      """)
+    return f"SELECT bool_and(got = reach) AS exhausted FROM ({' UNION ALL '.join(branches)}) branches"
+
+  def _prefix_sql(self, where_sql: str, candidates: Optional[int], scan_check: bool = False) -> Tuple[str, str]:
+    """
+    CTE pembuka (q, fp kalau ada filter, candidates) + WHERE untuk join kandidat
+    ke products. Dengan filter, where_sql hanya muncul di fp; posisi parameternya
+    tetap sama (setelah vektor query), jadi urutan parameter pemanggil tidak berubah.
+    scan_check=True menambah CTE `scan` (lihat scan_sql).
+    """
+    filtered = has_filter(where_sql)
+    fp = f"fp AS MATERIALIZED (SELECT p.id FROM products p {where_sql})," if filtered else ""
+    scan = f",\n      scan AS ({self.scan_sql(candidates, filtered)})" if scan_check and candidates is not None else ""
+    prefix = f"""
+      WITH q AS MATERIALIZED (SELECT %s::vector AS v),
+      {fp}
+      candidates AS MATERIALIZED ({self.candidates_sql(candidates, filtered)}){scan}
+    """
+    return prefix, ("" if filtered else where_sql)
+
+  def ann_query(self, select_sql: str, where_sql: str, candidates: Optional[int], scan_check: bool = False) -> str:
+    """
+    Query ANN: kandidat terdekat per chunk_type diambil lewat index
+    (UNION ALL) dari produk yang lolos filter, lalu di-join ke products dan diurutkan.
+
+    `select_sql`/`where_sql` memakai alias `pc` (kandidat: product_id,
+    chunk_type, chunk_text, distance) dan `p` (products). Parameter: vektor
+    query, parameter filter, lalu top_k. candidates=None -> pencarian exact
+    (hanya chunk produk yang lolos filter, tanpa index ANN). scan_check=True
+    menambah kolom terakhir ann_exhausted (lihat scan_sql).
+    """
+    prefix, where_sql = self._prefix_sql(where_sql, candidates, scan_check)
+    return f"""
+      {prefix}
+      SELECT {self._with_scan(select_sql, scan_check and candidates is not None)}
+      FROM candidates pc
+      JOIN products p ON p.id = pc.product_id
+      {where_sql}
+      ORDER BY pc.distance
+      LIMIT %s;
+    """
+
+  def collapsed_query(self, select_sql: str, where_sql: str, candidates: Optional[int], scan_check: bool = False) -> str:
+    """
+    Seperti ann_query, tapi hasilnya produk unik: chunk terdekat per produk
+    (DISTINCT ON), lalu maksimal N produk per grup parent (varian dari satu
+    parent, atau produk itu sendiri kalau tidak punya parent) lewat
+    row_number(). Parameter: vektor query, parameter filter, N per grup, top_k.
+    """
+    prefix, where_sql = self._prefix_sql(where_sql, candidates, scan_check)
+    return f"""
+      {prefix},
+      filtered AS (
+        SELECT pc.product_id, pc.chunk_type, pc.chunk_text, pc.distance, COALESCE(p.parent_id, p.id) AS group_id
+        FROM candidates pc
+        JOIN products p ON p.id = pc.product_id
+        {where_sql}
+      ),
+      best AS (
+        SELECT DISTINCT ON (product_id) *
+        FROM filtered
+        ORDER BY product_id, distance
+      ),
+      ranked AS (
+        SELECT best.*, row_number() OVER (PARTITION BY group_id ORDER BY distance) AS group_rank
+        FROM best
+      )
+      SELECT {self._with_scan(select_sql, scan_check and candidates is not None)}
+      FROM ranked pc
+      JOIN products p ON p.id = pc.product_id
+      WHERE pc.group_rank <= %s
+      ORDER BY pc.distance
+      LIMIT %s;
+    """
+
+  @staticmethod
+  def _with_scan(select_sql: str, scan_check: bool) -> str:
+    if not scan_check:
+      return select_sql
+    return f"{select_sql.rstrip()},\n  (SELECT exhausted FROM scan) AS ann_exhausted\n"
+
+  @staticmethod
+  def _pop_scan(rows: List) -> Tuple[List, bool]:
+    """Buang kolom ann_exhausted (RealDictCursor atau tuple) dan kembalikan nilainya."""
+    if not rows:
+      return rows, False
+    if isinstance(rows[0], dict):
+      exhausted = bool(rows[0]["ann_exhausted"])
+      for row in rows:
+        del row["ann_exhausted"]
+      return rows, exhausted
+    return [row[:-1] for row in rows], bool(rows[0][-1])
+
+  def search(self, cur, select_sql: str, where_sql: str, query_vector, filter_params: List, top_k: int, recall: Optional[str] = None, per_group: Optional[int] = None):
+    """
+    Jalankan pencarian ANN; jatuh ke pencarian exact atas produk yang lolos
+    filter hanya kalau belum ada index, atau hasilnya kurang dari top_k dan
+    scan index terpotong (batas scan iteratif / ef_search tercapai sebelum
+    semua chunk yang bisa dicapai terbaca, lihat scan_sql). Kategori kecil
+    yang memang punya kurang dari top_k produk tetap dilayani satu query ANN.
+    per_group -> hasil di-collapse per produk dan per parent (lihat
+    collapsed_query), jadi top_k = jumlah produk unik. Jalur yang dipakai
+    dicatat di self.last_path ("ann" / "exact").
+    """
+    if per_group:
+      build = self.collapsed_query
+      params = [query_vector] + list(filter_params) + [per_group, top_k]
+    else:
+      build = self.ann_query
+      params = [query_vector] + list(filter_params) + [top_k]
+
+    if self.indexed_chunk_types():
+      candidates = min(MAX_EF_SEARCH, top_k * recall_profile(recall)["candidates"])
+      self.set_search_params(cur, candidates, recall, filtered=has_filter(where_sql))
+      execute_prepared(cur, build(select_sql, where_sql, candidates, scan_check=True), params)
+      # Hasil kosong tidak membawa kolom scan -> dianggap terpotong (exact atas
+      # filter yang tidak menyisakan produk tetap murah)
+      rows, exhausted = self._pop_scan(cur.fetchall())
+      if len(rows) >= top_k or exhausted:
+        self.last_path = "ann"
+        return rows
+
+    self.last_path = "exact"
+    execute_prepared(cur, build(select_sql, where_sql, None), params)
+    return cur.fetchall()
+
+  def hybrid_query(self, select_sql: str, where_sql: str, candidates: Optional[int], side_limit: int) -> str:
+    """
+    Hybrid search: kandidat vektor (ANN, satu baris per produk) dan kandidat
+    leksikal (search_tsv @@ tsquery atau trigram nama) diambil dalam satu
+    query, lalu digabung dengan reciprocal-rank fusion: skor = sum 1/(k + rank).
+
+    `select_sql`/`where_sql` sama dengan ann_query. Produk yang hanya ketemu
+    dari sisi leksikal mendapat distance chunk terdekatnya; maksimal N produk
+    per grup parent seperti collapsed_query. Parameter: vektor query,
+    parameter filter, teks query, parameter filter (lagi), N per grup, top_k.
+    """
+    dims_filter = "" if self.column_dimensions() else f"AND vector_dims(c.embedding) = {self.dimensions}"
+    prefix, vec_where_sql = self._prefix_sql(where_sql, candidates)
+    return f"""
+      {prefix},
+      vec AS (
+        SELECT best.*, row_number() OVER (ORDER BY best.distance) AS rnk
+        FROM (
+          SELECT DISTINCT ON (pc.product_id) pc.product_id, pc.chunk_type, pc.chunk_text, pc.distance
+          FROM candidates pc
+          JOIN products p ON p.id = pc.product_id
+          {vec_where_sql}
+          ORDER BY pc.product_id, pc.distance
+        ) best
+        ORDER BY best.distance
+        LIMIT {int(side_limit)}
+      ),
+      lq AS MATERIALIZED (
+        SELECT t AS txt, websearch_to_tsquery('indonesian', t) AS tsq
+        FROM (SELECT %s::text AS t) s
+      ),
+      lex AS (
+        SELECT scored.product_id, row_number() OVER (ORDER BY scored.score DESC) AS rnk
+        FROM (
+          SELECT p.id AS product_id,
+            ts_rank_cd(p.search_tsv, (SELECT tsq FROM lq)) + word_similarity((SELECT txt FROM lq), p.name) AS score
+          FROM products p
+          {where_sql}
+            AND (p.search_tsv @@ (SELECT tsq FROM lq) OR (SELECT txt FROM lq) <%% p.name)
+          ORDER BY score DESC
+          LIMIT {int(side_limit)}
+        ) scored
+      ),
+      fused AS (
+        SELECT ranks.product_id, SUM(1.0 / ({HYBRID_RRF_K} + ranks.rnk)) AS rrf
+        FROM (SELECT product_id, rnk FROM vec UNION ALL SELECT product_id, rnk FROM lex) ranks
+        GROUP BY ranks.product_id
+      ),
+      top AS (
+        SELECT grouped.* FROM (
+          SELECT fused.*, row_number() OVER (PARTITION BY COALESCE(p.parent_id, p.id) ORDER BY fused.rrf DESC) AS group_rank
+          FROM fused
+          JOIN products p ON p.id = fused.product_id
+        ) grouped
+        WHERE grouped.group_rank <= %s
+        ORDER BY grouped.rrf DESC
+        LIMIT %s
+      )
+      SELECT {select_sql}
+      FROM top f
+      JOIN products p ON p.id = f.product_id
+      LEFT JOIN vec vr ON vr.product_id = f.product_id
+      CROSS JOIN LATERAL (
+        SELECT f.product_id, vr.chunk_type, COALESCE(vr.chunk_text, p.name) AS chunk_text,
+          COALESCE(vr.distance, (
+            SELECT MIN({self.vector_expr("c")} <=> (SELECT v FROM q))
+            FROM product_chunks c
+            WHERE c.product_id = f.product_id {dims_filter}
+          )) AS distance
+      ) pc
+      ORDER BY f.rrf DESC;
+    """
+
+  def hybrid_search(self, cur, select_sql: str, where_sql: str, query_vector, query_text: str, filter_params: List, top_k: int, recall: Optional[str] = None, per_group: Optional[int] = None):
+    """Leksikal + ANN digabung RRF (selalu produk unik). Tanpa index ANN, sisi vektor memakai pencarian exact."""
+    candidates = None
+    if self.indexed_chunk_types():
+      candidates = min(MAX_EF_SEARCH, top_k * recall_profile(recall)["candidates"])
+      self.set_search_params(cur, candidates, recall, filtered=has_filter(where_sql))
+    params = [query_vector] + list(filter_params) + [query_text] + list(filter_params) + [per_group or top_k, top_k]
+    execute_prepared(cur, self.hybrid_query(select_sql, where_sql, candidates, top_k * HYBRID_CANDIDATES), params)
+    return cur.fetchall()
+
+
+def connect_db():
+  return psycopg2.connect(
+    host=os.getenv("DB_HOST"),
+    port=os.getenv("DB_PORT"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD"),
+    dbname=os.getenv("DB_NAME")
+  )
+
+
+def main():
+  command = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+  conn = connect_db()
+  try:
+    manager = VectorIndexManager(conn)
+    if command == "ensure":
+      manager.ensure_indexes()
+      manager.ensure_filter_index()
+      manager.ensure_lexical_indexes()
+    elif command == "maintain":
+      manager.maintain()
+    elif command == "drop":
+      manager.drop_indexes()
+    else:
+      print(__doc__)
+  finally:
+    conn.close()
+
+
+if __name__ == "__main__":
+  main()